@@ -0,0 +1,64 @@
+"""Benchmark the time taken to import nglextras.
+
+Each measurement is made in a fresh interpreter so that nothing is
+already imported. Run as:
+
+    python bench/import_time.py [repeats]
+
+"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import subprocess
+import sys
+
+
+# Statements to time, from importing the package alone to using the plotting
+# functions (which requires importing Ngl).
+_statements = (
+        ('import', 'import nglextras'),
+        ('defaults', "import nglextras; nglextras.ngldefaults['font']"),
+        ('plotting', 'import nglextras; nglextras.contour_map'),
+)
+
+_timer = '''
+from timeit import default_timer
+start = default_timer()
+%s
+print(default_timer() - start)
+'''
+
+
+def time_statement(statement, repeats):
+    """Return the best time in seconds to run a statement."""
+    times = list()
+    for i in range(repeats):
+        output = subprocess.check_output(
+                [sys.executable, '-c', _timer % statement])
+        times.append(float(output))
+    return min(times)
+
+
+def main(repeats=5):
+    for name, statement in _statements:
+        print('%-10s %8.2f ms' % (name,
+                1000. * time_statement(statement, repeats)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
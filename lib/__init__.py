@@ -17,25 +17,87 @@
 # along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import modifiers
-import modification
+import importlib
+import sys
+import types
 
-from plotting import PanelPlot
-from plotting import xy, y
-from plotting import map
-from plotting import contour, contour_map
-from plotting import streamline, streamline_map
-from plotting import streamline_scalar, streamline_scalar_map
-from plotting import vector, vector_map
-from plotting import vector_scalar, vector_scalar_map
-from plotting import histogram
+from defaults import ngldefaults
 
-from resources import Resources, MapResources
 
-from defaults import ngldefaults
+# Importing Ngl is slow, so the modules that need it are not imported until
+# one of the objects they define is first used. These are the submodules that
+# are imported when they are first accessed as attributes of the package,
+# followed by a map of the names of the objects available at the top-level to
+# the modules they are defined in.
+_lazy_modules = (
+        'modification',
+        'modifiers',
+        'instrumentation',
+        'plotting',
+        'resources',
+        'retained',
+        'batch',
+        'shared',
+        'workstations',
+        'server',
+        'decimation',
+        'grids',
+        'quantiles',
+)
+_lazy_objects = {
+        'PanelPlot': 'plotting',
+        'PanelLayout': 'plotting',
+        'xy': 'plotting',
+        'y': 'plotting',
+        'map': 'plotting',
+        'contour': 'plotting',
+        'contour_map': 'plotting',
+        'streamline': 'plotting',
+        'streamline_map': 'plotting',
+        'streamline_scalar': 'plotting',
+        'streamline_scalar_map': 'plotting',
+        'vector': 'plotting',
+        'vector_map': 'plotting',
+        'vector_scalar': 'plotting',
+        'vector_scalar_map': 'plotting',
+        'histogram': 'plotting',
+        'histogram_from_counts': 'plotting',
+        'multi_histogram': 'plotting',
+        'RetainedPlot': 'retained',
+        'MapBase': 'retained',
+        'Frame': 'batch',
+        'FrameResult': 'batch',
+        'render_batch': 'batch',
+        'SharedArray': 'shared',
+        'SharedArrays': 'shared',
+        'WorkstationPool': 'workstations',
+        'RenderServer': 'server',
+        'RenderClient': 'server',
+        'Resources': 'resources',
+        'MapResources': 'resources',
+}
 
 
-# Create a dictionary of default values for Ngl plotting.
+class _LazyPackage(types.ModuleType):
+    """Package module that imports its contents on first access."""
+
+    def __getattr__(self, name):
+        # Only called for names that have not been resolved yet.
+        if name in _lazy_modules:
+            value = importlib.import_module('.' + name, __name__)
+        elif name in _lazy_objects:
+            module = importlib.import_module('.' + _lazy_objects[name],
+                    __name__)
+            value = getattr(module, name)
+        else:
+            raise AttributeError("'module' object has no attribute '%s'" %
+                    name)
+        # Store the object so that later accesses are direct.
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(__all__))
 
 
 __all__ = [
@@ -43,10 +105,12 @@ __all__ = [
         # advanced use so are left as top-level modules.
         'modification',
         'modifiers',
+        'instrumentation',
 
         # Customized plotting classes and routines. These are imported
         # directly and are accessible from the top-level package.
         'PanelPlot',
+        'PanelLayout',
         'xy',
         'y',
         'map',
@@ -60,6 +124,19 @@ __all__ = [
         'vector_map',
         'vector_scalar',
         'vector_scalar_map',
+        'histogram',
+        'histogram_from_counts',
+        'multi_histogram',
+        'RetainedPlot',
+        'MapBase',
+        'Frame',
+        'FrameResult',
+        'render_batch',
+        'SharedArray',
+        'SharedArrays',
+        'WorkstationPool',
+        'RenderServer',
+        'RenderClient',
 
         # Overridden resource objects, available directly at the top-level.
         'Resources',
@@ -69,3 +146,10 @@ __all__ = [
         'ngldefaults',
 ]
 
+
+# Replace this module with a lazy version of itself. A reference to the
+# original module is kept since the code above uses its namespace.
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+_package._original_module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,246 @@
+"""rendering many independent frames with a pool of processes"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import namedtuple
+import multiprocessing
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+import traceback
+from timeit import default_timer
+
+import plotting
+from defaults import ngldefaults
+from instrumentation import stats
+from shared import resolve
+from workstations import WorkstationPool
+
+
+class Frame(object):
+    """Specification of a single frame to be rendered.
+
+    A frame is drawn by calling a plotting function with a workstation
+    followed by the data arguments and resources. The function is
+    expected to advance the frame itself (i.e., nglFrame should not be
+    set to False).
+
+    """
+
+    def __init__(self, plot, args=(), res=None, name=None):
+        """Create a frame specification.
+
+        Arguments:
+        plot -- The plotting function. Either the name of a function in
+            nglextras.plotting (e.g., 'contour_map') or a callable that
+            can be pickled (i.e., a function defined at the top-level of
+            a module) taking a workstation as its first argument.
+
+        Optional arguments:
+        args -- Sequence of data arguments to the plotting function.
+            Large arrays can be given as SharedArray handles so that
+            they are not copied to the worker processes.
+        res -- Resources for the plotting function. Resources may also
+            be SharedArray handles.
+        name -- Name of the output file, without the extension. If not
+            given a name is generated from the position of the frame in
+            the batch.
+
+        """
+        self.plot = plot
+        self.args = tuple(args)
+        self.res = res
+        self.name = name
+
+    def plot_function(self):
+        """Return the plotting function for the frame."""
+        if callable(self.plot):
+            return self.plot
+        try:
+            return getattr(plotting, self.plot)
+        except AttributeError:
+            raise ValueError("unknown plotting function '%s'" % self.plot)
+
+
+# The outcome of rendering a frame. The error is None if the frame was
+# rendered, otherwise it is the formatted traceback of the exception raised.
+FrameResult = namedtuple('FrameResult',
+        ('index', 'name', 'path', 'seconds', 'error'))
+
+
+# Settings of a worker process, set up when the worker starts.
+_worker = dict()
+
+
+def _frame_name(prefix, index):
+    """Deterministic name of a frame in a batch."""
+    return '%s_%06d' % (prefix, index)
+
+
+def _init_worker(settings, defaults, modifiers):
+    """Set up a worker process."""
+    _worker.update(settings)
+    # Each worker keeps its workstations open for the whole batch.
+    pool = WorkstationPool(directory=settings['scratch'])
+    multiprocessing.util.Finalize(pool, pool.close, exitpriority=10)
+    _worker['workstations'] = pool
+    # Use the defaults of the parent process rather than reading the rc file
+    # again in every worker.
+    ngldefaults.freeze(defaults)
+    if modifiers:
+        plotting.add_modifiers(*modifiers)
+
+
+def _draw_frame(wks, frame):
+    """Draw a frame on a workstation."""
+    # Shared arrays are attached rather than being sent with the frame.
+    args = list(resolve(frame.args))
+    if frame.res is not None:
+        args.append(resolve(frame.res))
+    frame.plot_function()(wks, *args)
+
+
+def _frame_output(settings, index, frame):
+    """Name of a frame and its output file, with and without extension."""
+    name = frame.name
+    if name is None:
+        name = _frame_name(settings['prefix'], index)
+    base = os.path.join(settings['directory'], name)
+    return name, base, '%s.%s' % (base, settings['wks_type'])
+
+
+def _render_frame(job):
+    """Render a single frame in a worker process."""
+    index, frame = job
+    name, base, path = _frame_output(_worker, index, frame)
+    start = default_timer()
+    error = None
+    try:
+        with _worker['workstations'].workstation(base, _worker['wks_type'],
+                _worker['wks_res']) as wks:
+            with stats.timer('batch.frame'):
+                _draw_frame(wks, frame)
+    except Exception:
+        # The error is reported rather than raised so that the rest of the
+        # batch is still rendered.
+        error = traceback.format_exc()
+    return FrameResult(index, name, path, default_timer() - start, error)
+
+
+def _deadline(timeout):
+    """Time by which a wait of timeout seconds ends, or None."""
+    if timeout is None:
+        return None
+    return default_timer() + timeout
+
+
+def _frame_result(settings, job, result, deadline, timeout):
+    """
+    Wait for the result of a frame until a deadline.
+
+    A frame that does not finish in time is reported as failed. This
+    includes frames whose worker process died while rendering them,
+    since their results never arrive. A result that is ready is
+    collected even after the deadline has passed. The timeout the
+    deadline was set from is only used to describe the failure.
+
+    """
+    start = default_timer()
+    wait = None
+    if deadline is not None:
+        wait = max(deadline - start, 0.)
+    try:
+        return result.get(wait)
+    except multiprocessing.TimeoutError:
+        index, frame = job
+        name, _, path = _frame_output(settings, index, frame)
+        stats.count('batch_timeouts')
+        return FrameResult(index, name, path, default_timer() - start,
+                'frame was not rendered within %g seconds (the worker '
+                'process may have crashed)' % timeout)
+
+
+def render_batch(frames, directory='.', wks_type='png', wks_res=None,
+        prefix='frame', processes=None, modifiers=(), timeout=300.):
+    """Render independent frames in parallel.
+
+    Each frame is rendered to its own output file by a pool of worker
+    processes. Every worker keeps its own pool of workstations, which
+    are reused from frame to frame when possible. Failures are
+    reported in the results; they do not stop the other frames from
+    being rendered.
+
+    Arguments:
+    frames -- Sequence of Frame objects.
+
+    Optional arguments:
+    directory -- Directory to write the output files to. Defaults to
+        the current directory.
+    wks_type -- Ngl workstation type. Defaults to 'png'.
+    wks_res -- Resources for opening workstations.
+    prefix -- Prefix of the names of frames without an explicit name.
+        The name of such a frame is the prefix followed by the position
+        of the frame in the batch. Defaults to 'frame'.
+    processes -- Number of worker processes. Defaults to the number of
+        CPUs.
+    modifiers -- Plot modifiers to add to the plotting functions in each
+        worker, as for plotting.add_modifiers. They must be picklable.
+    timeout -- Time in seconds allowed for the whole batch. Frames
+        that have not been rendered by then, for example because the
+        worker process rendering them crashed, are reported as failed.
+        If None there is no limit, and a crashed worker stops the batch
+        from finishing. Defaults to 300 seconds.
+
+    Returns a list of FrameResult objects in the order of the frames.
+
+    """
+    # Workstations write to a scratch directory next to the output files
+    # so that their output can be moved into place cheaply.
+    scratch = tempfile.mkdtemp(prefix='.nglextras-', dir=directory)
+    settings = dict(directory=directory, wks_type=wks_type,
+            wks_res=wks_res, prefix=prefix, scratch=scratch)
+    jobs = list(enumerate(frames))
+    pool = multiprocessing.Pool(processes, _init_worker,
+            (settings, ngldefaults.snapshot(), tuple(modifiers)))
+    try:
+        with stats.timer('batch.render'):
+            deadline = _deadline(timeout)
+            pending = [(job, pool.apply_async(_render_frame, (job,)))
+                    for job in jobs]
+            results = [_frame_result(settings, job, result, deadline,
+                    timeout) for job, result in pending]
+        if all(result.ready() for _, result in pending):
+            pool.close()
+        else:
+            # Workers still rendering frames that timed out are stopped.
+            pool.terminate()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        shutil.rmtree(scratch, ignore_errors=True)
+    stats.count('batch_frames', len(results))
+    stats.count('batch_failures',
+            sum(1 for result in results if result.error is not None))
+    return results
+
+
+if __name__ == '__main__':
+    pass
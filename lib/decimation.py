@@ -0,0 +1,203 @@
+"""reducing the number of points in line plots"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+
+def _working_values(y, missing=None):
+    """
+    Floating point copy of 2-D data with missing values set to NaN.
+
+    Only copies the data if it is not already floating point without
+    missing values.
+
+    """
+    values = np.ma.getdata(y)
+    mask = np.ma.getmask(y)
+    if missing is not None:
+        mask = np.logical_or(mask, values == missing)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+    if np.any(mask):
+        values = np.where(mask, np.nan, values)
+    return values
+
+
+def minmax_indices(y, nbins):
+    """Indices of the points in a per-bin min/max envelope.
+
+    The points of each curve are split into nbins bins of (nearly) equal
+    length, and the points with the smallest and largest values in each
+    bin are kept, along with the first and last points. Drawn at the
+    resolution of one bin per pixel the envelope looks the same as the
+    full curve.
+
+    Arguments:
+    y -- 2-D array of curves, one curve per row, with missing values
+        set to NaN.
+    nbins -- Number of bins.
+
+    Returns a 2-D integer array of indices, sorted along each row.
+
+    """
+    ncurves, npts = y.shape
+    size = -(-npts // nbins)
+    nbins = -(-npts // size)
+    # Pad the curves so that they divide exactly into bins.
+    padded = np.empty((ncurves, nbins * size), dtype=y.dtype)
+    padded[:, :npts] = y
+    padded[:, npts:] = np.nan
+    nan = np.isnan(padded)
+    if nan.any():
+        low = np.where(nan, np.inf, padded)
+        high = np.where(nan, -np.inf, padded)
+    else:
+        low = high = padded
+    low = low.reshape(ncurves, nbins, size)
+    high = high.reshape(ncurves, nbins, size)
+    offsets = np.arange(nbins) * size
+    indices = np.empty((ncurves, 2 * nbins + 2), dtype=np.intp)
+    indices[:, 0] = 0
+    indices[:, 1:nbins + 1] = low.argmin(axis=2) + offsets
+    indices[:, nbins + 1:-1] = high.argmax(axis=2) + offsets
+    indices[:, -1] = npts - 1
+    # An all-missing final bin may select a padding point.
+    np.minimum(indices, npts - 1, out=indices)
+    indices.sort(axis=1)
+    return indices
+
+
+def _bucket_mean(values):
+    """Mean along the last axis ignoring NaNs (NaN if all are NaN)."""
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=-1)
+    total = np.where(valid, values, 0.).sum(axis=-1)
+    return total / np.where(count == 0, np.nan, count)
+
+
+def lttb_indices(x, y, npoints):
+    """Indices of the points selected by largest-triangle-three-buckets.
+
+    The first and last points are kept and the remaining points are
+    divided into npoints - 2 buckets. From each bucket the point forming
+    the largest triangle with the point selected from the previous
+    bucket and the mean of the next bucket is kept. This preserves the
+    visual shape of a curve better than a min/max envelope for a given
+    number of points. The buckets are processed in sequence but all the
+    curves are processed together.
+
+    Arguments:
+    x -- 2-D array of x coordinates, either one row or one row per
+        curve.
+    y -- 2-D array of curves, one curve per row, with missing values
+        set to NaN.
+    npoints -- Number of points to keep in each curve.
+
+    Returns a 2-D integer array of indices, sorted along each row.
+
+    """
+    ncurves, npts = y.shape
+    if npoints >= npts or npoints < 3:
+        return np.tile(np.arange(npts), (ncurves, 1))
+    x = np.broadcast_to(x, y.shape)
+    rows = np.arange(ncurves)
+    edges = np.linspace(1, npts - 1, npoints - 1).astype(np.intp)
+    indices = np.empty((ncurves, npoints), dtype=np.intp)
+    indices[:, 0] = 0
+    indices[:, -1] = npts - 1
+    ax, ay = x[:, 0], y[:, 0]
+    for bucket in range(npoints - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # The third point of the triangle is the mean of the next bucket.
+        if bucket < npoints - 3:
+            following = slice(stop, edges[bucket + 2])
+            cx = _bucket_mean(x[:, following])
+            cy = _bucket_mean(y[:, following])
+        else:
+            cx, cy = x[:, -1], y[:, -1]
+        bx, by = x[:, start:stop], y[:, start:stop]
+        area = np.abs((ax - cx)[:, np.newaxis] * (by - ay[:, np.newaxis]) -
+                (ax[:, np.newaxis] - bx) * (cy - ay)[:, np.newaxis])
+        area[np.isnan(area)] = -1.
+        selected = start + area.argmax(axis=1)
+        indices[:, bucket + 1] = selected
+        ax, ay = x[rows, selected], y[rows, selected]
+    return indices
+
+
+def decimate(x, y, npoints, method='minmax', missing=None):
+    """Reduce the number of points in one or more curves.
+
+    Arguments:
+    x -- 1-D array of x coordinates, or a 2-D array with one row per
+        curve, or None to use the indices of the points. The x
+        coordinates should be monotonic.
+    y -- 1-D array for a single curve, or a 2-D array with one curve
+        per row. May be a masked array.
+    npoints -- Approximate number of points to keep in each curve.
+
+    Optional arguments:
+    method -- 'minmax' for a per-bin min/max envelope, or 'lttb' for
+        largest-triangle-three-buckets. Defaults to 'minmax'.
+    missing -- Value marking missing points in y, in addition to masked
+        points and NaNs.
+
+    Returns the x and y coordinates of the points kept, both with the
+    shape of the reduced y. Different points may be kept from each
+    curve, so a 1-D x becomes 2-D when there is more than one curve. If
+    x was None the indices of the points kept are returned as x. The
+    original arrays are returned if they have no more than npoints
+    points.
+
+    """
+    y = np.asanyarray(y)
+    single = y.ndim == 1
+    curves = y.reshape(1, -1) if single else y
+    ncurves, npts = curves.shape
+    if npts <= npoints:
+        return x, y
+    if x is not None:
+        x = np.asanyarray(x)
+        xcurves = x.reshape(1, -1) if x.ndim == 1 else x
+    values = _working_values(curves, missing)
+    if method == 'minmax':
+        indices = minmax_indices(values, max(npoints // 2 - 1, 1))
+    elif method == 'lttb':
+        if x is None:
+            xvalues = np.arange(npts, dtype=np.float64)[np.newaxis]
+        else:
+            xvalues = _working_values(xcurves)
+        indices = lttb_indices(xvalues, values, npoints)
+    else:
+        raise ValueError("unknown decimation method '%s'" % method)
+    rows = np.arange(ncurves)[:, np.newaxis]
+    ynew = curves[rows, indices]
+    if x is None:
+        xnew = indices
+    elif xcurves.shape[0] == 1:
+        xnew = xcurves[0][indices]
+    else:
+        xnew = xcurves[rows, indices]
+    if single:
+        return xnew[0], ynew[0]
+    return xnew, ynew
+
+
+if __name__ == '__main__':
+    pass
@@ -17,8 +17,14 @@
 # along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import copy
 import os
 import re
+from timeit import default_timer
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
 
 # Define default values. These will be used when the user does not have a
@@ -47,9 +53,16 @@ _default_values = {
 }
 
 
+# Name of the environment variable that can be used to specify the rc file.
+_rc_environment_variable = 'NGLRC'
+
+# Regular expression matching a comment in an rc file line.
+_rc_comment = re.compile('#.*$')
+
+
 def _strip_rc_comments(line):
     """Remove comments from a line."""
-    line = re.sub(re.compile('#.*?\n'), '', line)
+    line = _rc_comment.sub('', line)
     return line
 
 
@@ -63,20 +76,30 @@ def _handle_value(value, category, option):
     return float(value)
 
 
-def _parse_nglrc():
+def _rc_path(path=None):
+    """Work out which rc file to read.
+
+    An explicitly given path is used first, then the path in the NGLRC
+    environment variable, and finally ~/.nglrc.
+
+    """
+    if path is None:
+        path = os.environ.get(_rc_environment_variable, '~/.nglrc')
+    return os.path.expanduser(path)
+
+
+def _parse_nglrc(rcfilename=None):
     """Read defaults from an Ngl rc file."""
-    rcfilename = os.path.expanduser('~/.nglrc')
+    rcfilename = _rc_path(rcfilename)
     if not os.path.exists(rcfilename):
-        # Just return an empty dictionary when no ~/.nglrc file is found.
+        # Just return an empty dictionary when no rc file is found.
         return dict()
     with open(rcfilename, 'r') as rcfile:
         # Read every line in the file.
         rclines = rcfile.readlines()
-    # Remove whitespace and blank lines.
-    rclines = [line.strip() for line in rclines]
+    # Strip comments from lines, then remove whitespace and blank lines.
+    rclines = [_strip_rc_comments(line).strip() for line in rclines]
     rclines = [line for line in rclines if line]
-    # Strip comments from lines.
-    rclines = map(_strip_rc_comments, rclines)
     # Now each line should be an rc assignment.
     # - split on = sign (stripping whitespace
     # - split lhs on dots to get dict path.
@@ -107,21 +130,236 @@ def _update_defaults_dict(defaults, updates):
         defaults[category].update(updates[category])
 
 
-def _setup_defaults():
+def _setup_defaults(rcfilename=None):
     defaults = dict()
     # Update this dictionary with the default values.
     _update_defaults_dict(defaults, _default_values)
     # Get default values specified in the user's rc file.
-    rcdefaults = _parse_nglrc()
+    rcdefaults = _parse_nglrc(rcfilename)
     # Update the defaults file with the user's settings.
     _update_defaults_dict(defaults, rcdefaults)
     return defaults
 
 
-# Create a dictionary of defaults.
-ngldefaults = _setup_defaults()
+def _rc_state(rcfilename):
+    """Identify the version of an rc file by its modification time.
+
+    Returns None if the file does not exist.
+
+    """
+    try:
+        info = os.stat(rcfilename)
+    except OSError:
+        return None
+    return (info.st_mtime, info.st_size)
+
+
+class _Category(dict):
+    """A category of defaults that records changes made to it in place.
+
+    Any change to the options advances the version of the defaults the
+    category belongs to. Copies and pickles are plain dictionaries.
+
+    """
+
+    def __init__(self, owner, options=()):
+        dict.__init__(self, options)
+        self._owner = owner
+
+    def __setitem__(self, option, value):
+        dict.__setitem__(self, option, value)
+        self._owner.mark_changed()
+
+    def __delitem__(self, option):
+        dict.__delitem__(self, option)
+        self._owner.mark_changed()
+
+    def clear(self):
+        dict.clear(self)
+        self._owner.mark_changed()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._owner.mark_changed()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._owner.mark_changed()
+        return item
+
+    def setdefault(self, option, value=None):
+        if option not in self:
+            self[option] = value
+        return dict.__getitem__(self, option)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._owner.mark_changed()
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class NglDefaults(MutableMapping):
+    """Dictionary of default values for Ngl plots.
+
+    The defaults are not computed until they are first used, so that
+    importing modules that refer to the defaults does not require
+    reading the rc file. The object behaves like a dictionary of
+    categories, each of which is a dictionary of options.
+
+    The rc file is the one given by the path attribute if it is set,
+    otherwise the one named by the NGLRC environment variable, otherwise
+    ~/.nglrc. The parsed file is cached along with its modification
+    time. The modification time is checked again at most once every
+    check_interval seconds, and the file is only parsed again if it has
+    changed, so long-running processes pick up changes to the rc file
+    cheaply.
+
+    """
+
+    def __init__(self, path=None, check_interval=2.):
+        """Create a defaults dictionary.
+
+        Optional arguments:
+        path -- Path of the rc file to read. Defaults to the value of
+            the NGLRC environment variable or ~/.nglrc.
+        check_interval -- Minimum time in seconds between checks for
+            changes to the rc file. If 0 the file is checked every time
+            a default is looked up. If None the file is never checked
+            again once it has been read. Defaults to 2 seconds.
+
+        """
+        self._path = path
+        self.check_interval = check_interval
+        # A number that is incremented every time the defaults change,
+        # including changes made to a category in place (e.g.,
+        # ngldefaults['font']['ngl'] = 5). Changes to the rc file are
+        # only seen once the file has been checked, see check.
+        self.version = 0
+        self._defaults = None
+        self._state = None
+        self._checked = None
+        self._frozen = False
+
+    @property
+    def path(self):
+        """Path of the rc file, or None to use the default location."""
+        return self._path
+
+    @path.setter
+    def path(self, path):
+        self._path = path
+        self._frozen = False
+        self._defaults = None
+
+    def _wrap(self, defaults):
+        """Make the categories of a defaults dictionary record changes."""
+        return dict((category, _Category(self, options))
+                for category, options in defaults.items())
+
+    def _due(self):
+        """Determine if the rc file should be checked for changes."""
+        if self._frozen or self.check_interval is None:
+            return False
+        now = default_timer()
+        if now - self._checked < self.check_interval:
+            return False
+        self._checked = now
+        return True
+
+    def _load(self):
+        """Return the defaults dictionary, (re)loading it if necessary."""
+        if self._defaults is not None:
+            # Don't check the rc file too often.
+            if not self._due():
+                return self._defaults
+            rcfilename = _rc_path(self._path)
+            if _rc_state(rcfilename) == self._state:
+                return self._defaults
+        rcfilename = _rc_path(self._path)
+        self._state = _rc_state(rcfilename)
+        self._checked = default_timer()
+        self._defaults = self._wrap(_setup_defaults(rcfilename))
+        self.version += 1
+        return self._defaults
+
+    def check(self):
+        """Check the rc file for changes, reading it again if needed.
+
+        This is done in the same way, and as often, as when a default is
+        looked up. Anything cached from the defaults should call check
+        before comparing the version.
+
+        """
+        self._load()
+
+    def mark_changed(self):
+        """Record that the defaults have been modified.
+
+        Changes made through the defaults and their categories are
+        recorded anyway, so this is only needed to force anything cached
+        from the defaults to be rebuilt.
+
+        """
+        self.version += 1
+
+    def reload(self):
+        """Read the rc file again now, whether or not it has changed."""
+        self._frozen = False
+        self._defaults = None
+        self._load()
+
+    def snapshot(self):
+        """Return a copy of the current defaults as a plain dictionary.
+
+        The snapshot can be passed to other processes (e.g., workers)
+        and installed there with freeze, so they do not need to read or
+        check the rc file.
+
+        """
+        return copy.deepcopy(self._load())
+
+    def freeze(self, snapshot=None):
+        """Stop reading the rc file and use fixed defaults.
+
+        Optional argument:
+        snapshot -- Defaults to use, as returned by snapshot. If not
+            given the current defaults are kept.
+
+        """
+        if snapshot is None:
+            snapshot = self._load()
+        self._defaults = self._wrap(copy.deepcopy(snapshot))
+        self._frozen = True
+        self.version += 1
+
+    def __getitem__(self, category):
+        return self._load()[category]
+
+    def __setitem__(self, category, options):
+        self._load()[category] = _Category(self, options)
+        self.version += 1
+
+    def __delitem__(self, category):
+        del self._load()[category]
+        self.version += 1
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return repr(self._load())
+
+
+# Create a dictionary of defaults. The user's rc file is read the first time
+# it is used.
+ngldefaults = NglDefaults()
 
 
 if __name__ == '__main__':
     pass
-
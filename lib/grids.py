@@ -0,0 +1,312 @@
+"""reducing gridded data to the resolution it is plotted at"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from decimation import _working_values
+
+
+def visible_points(coord, lower=None, upper=None, period=None):
+    """Number of coordinate values within plot limits.
+
+    Arguments:
+    coord -- 1-D array of coordinate values.
+
+    Optional arguments:
+    lower, upper -- The limits. A missing limit is not applied.
+    period -- Period of the coordinate (e.g., 360 for longitude). If
+        given, values are compared with the limits modulo the period.
+
+    """
+    coord = np.asanyarray(coord)
+    if lower is None and upper is None:
+        return coord.size
+    if period is not None and lower is not None and upper is not None:
+        if upper - lower >= period:
+            return coord.size
+        offset = np.mod(coord - lower, period)
+        return int(np.count_nonzero(offset <= upper - lower))
+    inside = np.ones(coord.shape, dtype=bool)
+    if lower is not None:
+        inside &= coord >= lower
+    if upper is not None:
+        inside &= coord <= upper
+    return int(np.count_nonzero(inside))
+
+
+def _pad(values, factors):
+    """Pad a 2-D array with NaN to a whole number of blocks."""
+    ny, nx = values.shape
+    fy, fx = factors
+    py, px = -ny % fy, -nx % fx
+    if not (py or px):
+        return values
+    padded = np.empty((ny + py, nx + px), dtype=np.float64)
+    padded[:ny, :nx] = values
+    padded[ny:, :] = np.nan
+    padded[:, nx:] = np.nan
+    return padded
+
+
+def _blocks(values, factors):
+    """View a padded 2-D array as blocks (rows, fy, columns, fx)."""
+    ny, nx = values.shape
+    fy, fx = factors
+    return values.reshape(ny // fy, fy, nx // fx, fx)
+
+
+def block_reduce(values, factors, method='mean'):
+    """Reduce a 2-D array over blocks of points.
+
+    Arguments:
+    values -- 2-D floating point array with missing values set to NaN.
+    factors -- The block size as (rows, columns).
+
+    Optional argument:
+    method -- 'mean' or 'max' of the points in each block that are not
+        missing. Defaults to 'mean'.
+
+    Returns the reduced array, with NaN where all the points in a block
+    are missing. Partial blocks at the ends of the rows and columns are
+    reduced over the points they contain.
+
+    """
+    if method not in ('mean', 'max'):
+        raise ValueError("unknown block reduction '%s'" % method)
+    padded = _pad(values, factors)
+    nan = np.isnan(padded)
+    if not nan.any():
+        blocks = _blocks(padded, factors)
+        if method == 'mean':
+            return blocks.mean(axis=(1, 3))
+        return blocks.max(axis=(1, 3))
+    if method == 'mean':
+        valid = _blocks(~nan, factors).sum(axis=(1, 3))
+        total = _blocks(np.where(nan, 0., padded), factors).sum(axis=(1, 3))
+        return total / np.where(valid == 0, np.nan, valid)
+    reduced = _blocks(np.where(nan, -np.inf, padded), factors).max(
+            axis=(1, 3))
+    reduced[np.isneginf(reduced)] = np.nan
+    return reduced
+
+
+def _coarsen_coordinate(coord, factor, method):
+    """Coarsen a 1-D coordinate in the same way as a field."""
+    coord = np.asanyarray(coord)
+    if method == 'nearest':
+        return coord[factor // 2::factor]
+    # The coordinate of a block is its mean, whatever the field reduction.
+    values = _working_values(coord.reshape(1, -1))
+    return block_reduce(values, (1, factor), 'mean')[0]
+
+
+def coarsen_field(data, factors, x=None, y=None, method='mean',
+        missing=None):
+    """Coarsen a field, and its coordinates, by blocks of grid points.
+
+    Arguments:
+    data -- 2-D field (rows are y, columns are x). May be a masked
+        array.
+    factors -- The number of grid points in each block as (rows,
+        columns).
+
+    Optional arguments:
+    x, y -- Coordinates of the field, either 1-D arrays along the
+        columns and rows or 2-D arrays the same shape as the field.
+    method -- 'mean' or 'max' of the valid points in each block, or
+        'nearest' to take the point at the center of each block.
+        Defaults to 'mean'.
+    missing -- Value marking missing points, in addition to masked
+        points and NaNs.
+
+    Returns the coarsened field, x and y. The field is a masked array if
+    any of the coarsened points are missing.
+
+    """
+    fy, fx = factors
+    if method == 'nearest':
+        rows = slice(fy // 2, None, fy)
+        columns = slice(fx // 2, None, fx)
+        reduced = data[rows, columns]
+    else:
+        values = _working_values(data, missing)
+        reduced = block_reduce(values, factors, method)
+        nan = np.isnan(reduced)
+        if nan.any():
+            reduced = np.ma.masked_where(nan, reduced, copy=False)
+    coarse = []
+    for coord, axis in ((x, 1), (y, 0)):
+        if coord is not None:
+            coord = np.asanyarray(coord)
+            if coord.ndim == 2:
+                if method == 'nearest':
+                    coord = coord[rows, columns]
+                else:
+                    coord = block_reduce(_working_values(coord), factors)
+            else:
+                coord = _coarsen_coordinate(coord, factors[axis],
+                        method)
+        coarse.append(coord)
+    return reduced, coarse[0], coarse[1]
+
+
+def convergence_mask(lat, shape):
+    """Mask thinning out grid points where meridians converge.
+
+    On most map projections lines of longitude get closer together
+    towards the poles, so a grid that is evenly spaced in longitude is
+    crowded at high latitudes. Along each row only every k-th point is
+    kept, where k is about 1 / cos(latitude).
+
+    Arguments:
+    lat -- Latitude of each row (1-D) or of each grid point (2-D).
+    shape -- Shape of the grid as (rows, columns).
+
+    Returns a boolean array of the grid shape, True where a point should
+    be removed.
+
+    """
+    lat = np.asanyarray(lat, dtype=np.float64)
+    if lat.ndim == 1:
+        lat = lat[:, np.newaxis]
+    nx = shape[1]
+    with np.errstate(divide='ignore'):
+        spacing = 1. / np.cos(np.deg2rad(np.clip(np.abs(lat), 0., 90.)))
+    spacing = np.clip(np.rint(spacing), 1, nx).astype(np.intp)
+    columns = np.arange(nx)
+    return columns % spacing != 0
+
+
+def _latitude_rows(lat, lower, upper, halo):
+    """Slice of the rows with latitudes within limits, or None."""
+    inside = np.ones(lat.shape, dtype=bool)
+    if lower is not None:
+        inside &= lat >= lower
+    if upper is not None:
+        inside &= lat <= upper
+    rows = np.nonzero(inside)[0]
+    if rows.size == 0:
+        return None
+    return slice(max(int(rows[0]) - halo, 0),
+            min(int(rows[-1]) + halo + 1, lat.size))
+
+
+def _longitude_columns(lon, lower, upper, halo):
+    """
+    Slices of the columns with longitudes within limits, or None.
+
+    Returns a list of one slice, or two slices if the columns wrap
+    around the end of a global grid, in which case the columns of the
+    second slice follow on from those of the first.
+
+    """
+    nx = lon.size
+    if lower is None or upper is None or upper - lower >= 360.:
+        return [slice(0, nx)]
+    inside = np.mod(lon - lower, 360.) <= upper - lower
+    columns = np.nonzero(inside)[0]
+    if columns.size == 0:
+        return None
+    # A grid is global if its columns continue around the whole circle.
+    periodic = nx > 1 and \
+            abs(lon[-1] - lon[0]) * nx / (nx - 1.) >= 360. - 1e-6
+    if inside[0] and inside[-1] and not inside.all():
+        # The visible columns wrap around the end of the grid.
+        if not periodic:
+            # The columns either side of the end of a regional grid are not
+            # next to each other, joining them would bridge the gap between
+            # them, so all the columns are kept.
+            return [slice(0, nx)]
+        outside = np.nonzero(~inside)[0]
+        start = int(outside[-1]) + 1
+        length = int(outside[0]) + nx - start
+    else:
+        start = int(columns[0])
+        length = int(columns[-1]) - start + 1
+    if periodic:
+        start -= halo
+        length = min(length + 2 * halo, nx)
+        start %= nx
+    else:
+        stop = min(start + length + halo, nx)
+        start = max(start - halo, 0)
+        length = stop - start
+    if start + length <= nx:
+        return [slice(start, start + length)]
+    return [slice(start, nx), slice(0, start + length - nx)]
+
+
+def domain_subset(lon, lat, limits, halo=0):
+    """Find the part of a grid inside map limits.
+
+    Arguments:
+    lon -- 1-D array of the longitudes of the columns of the grid.
+    lat -- 1-D array of the latitudes of the rows of the grid.
+    limits -- The map limits as (minimum latitude, maximum latitude,
+        minimum longitude, maximum longitude). Missing limits are None.
+
+    Optional argument:
+    halo -- Number of extra rows and columns to include around the
+        limits. Defaults to 0.
+
+    Returns the slice of the rows and a list of the slices of the
+    columns (two if the columns wrap around the end of a global grid)
+    to take from the grid, along with the longitudes and latitudes of
+    the subset. The longitudes of wrapped columns are made continuous.
+    Returns None if none of the grid is inside the limits.
+
+    """
+    lon = np.asanyarray(lon)
+    lat = np.asanyarray(lat)
+    minlat, maxlat, minlon, maxlon = limits
+    rows = _latitude_rows(lat, minlat, maxlat, halo)
+    columns = _longitude_columns(lon, minlon, maxlon, halo)
+    if rows is None or columns is None:
+        return None
+    newlon = lon[columns[0]]
+    if len(columns) == 2:
+        # The wrapped columns continue on from the end of the grid.
+        step = 360. if lon[-1] >= lon[0] else -360.
+        newlon = np.concatenate([newlon, lon[columns[1]] + step])
+    return rows, columns, newlon, lat[rows]
+
+
+def read_subset(data, rows, columns):
+    """Read part of a 2-D array.
+
+    The array may be anything supporting slicing (e.g., a memory map or
+    a netCDF variable), only the requested part is read.
+
+    Arguments:
+    data -- The array.
+    rows -- Slice of the rows to read.
+    columns -- List of slices of the columns to read, as returned by
+        domain_subset.
+
+    """
+    parts = [data[rows, column] for column in columns]
+    if len(parts) == 1:
+        return parts[0]
+    if any(np.ma.isMaskedArray(part) for part in parts):
+        return np.ma.concatenate(parts, axis=1)
+    return np.concatenate(parts, axis=1)
+
+
+if __name__ == '__main__':
+    pass
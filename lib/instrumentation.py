@@ -0,0 +1,150 @@
+"""opt-in timing and call counting for plotting"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import threading
+from timeit import default_timer
+
+
+class _NullTimer(object):
+    """A timer that does nothing, used when statistics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class _Timer(object):
+    """Context manager recording the wall time of a stage."""
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.stage, default_timer() - self.start)
+        return False
+
+
+class PlotStats(object):
+    """In-process statistics on plotting.
+
+    When enabled, the plotting functions in this package record the
+    wall time spent in each stage of plotting (e.g., 'contour_map.plot'
+    or 'contour_map.postplot') and count the Ngl primitives they create
+    (e.g., 'text_ndc' or 'add_annotation'). User code can time its own
+    stages, such as data preparation, in the same way:
+
+        with stats.timer('prep'):
+            data = prepare(raw_data)
+
+    Statistics are disabled by default, in which case recording costs
+    no more than a method call.
+
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        """Start recording statistics."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording statistics. Recorded values are kept."""
+        self.enabled = False
+
+    def reset(self):
+        """Discard all recorded statistics."""
+        with self._lock:
+            # Each stage maps to [number of calls, total seconds].
+            self.timings = dict()
+            self.counts = dict()
+
+    def timer(self, stage):
+        """Return a context manager that times a stage.
+
+        Argument:
+        stage -- Name of the stage.
+
+        """
+        if self.enabled:
+            return _Timer(self, stage)
+        return _null_timer
+
+    def record(self, stage, seconds):
+        """Record one call of a stage taking a given time."""
+        if self.enabled:
+            with self._lock:
+                timing = self.timings.setdefault(stage, [0, 0.])
+                timing[0] += 1
+                timing[1] += seconds
+
+    def count(self, name, n=1):
+        """Count the creation of Ngl primitives or other events.
+
+        Argument:
+        name -- Name of the counter, usually the Ngl function called.
+
+        Optional argument:
+        n -- Amount to increment the counter by. Defaults to 1.
+
+        """
+        if self.enabled:
+            with self._lock:
+                self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self):
+        """Return the statistics as a dictionary."""
+        with self._lock:
+            timings = dict((stage, {'calls': calls, 'seconds': seconds})
+                    for stage, (calls, seconds) in self.timings.items())
+            return {'timings': timings, 'counts': dict(self.counts)}
+
+    def to_json(self, fileobj=None, **kwargs):
+        """Dump the statistics as JSON.
+
+        Optional arguments:
+        fileobj -- File-like object to write to. If not given the JSON
+            is returned as a string.
+        **kwargs -- Passed to json.dump/json.dumps.
+
+        """
+        if fileobj is None:
+            return json.dumps(self.as_dict(), **kwargs)
+        json.dump(self.as_dict(), fileobj, **kwargs)
+
+
+# The statistics shared by all plotting in this process.
+stats = PlotStats()
+
+
+if __name__ == '__main__':
+    pass
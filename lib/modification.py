@@ -17,10 +17,240 @@
 # along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from copy import copy
+import copy
+import functools
+import inspect
 
+import numpy as np
 import Ngl
 
+from instrumentation import stats
+
+
+# Marker for missing values, distinct from None which is a valid resource
+# value.
+_missing = object()
+
+# The resource giving the missing value of each data argument of the Ngl
+# plotting functions, in order.
+_scalar_missing = ('sfMissingValueV',)
+_vector_missing = ('vfMissingUValueV', 'vfMissingVValueV')
+_missing_value_resources = {
+        'xy': ('caXMissingV', 'caYMissingV'),
+        'y': ('caYMissingV',),
+        'contour': _scalar_missing,
+        'contour_map': _scalar_missing,
+        'streamline': _vector_missing,
+        'streamline_map': _vector_missing,
+        'streamline_scalar': _vector_missing + _scalar_missing,
+        'streamline_scalar_map': _vector_missing + _scalar_missing,
+        'vector': _vector_missing,
+        'vector_map': _vector_missing,
+        'vector_scalar': _vector_missing + _scalar_missing,
+        'vector_scalar_map': _vector_missing + _scalar_missing,
+}
+
+# Missing value used when neither the resources nor the data give one. This
+# is the numpy default fill value for floating point data.
+_default_missing_value = 1e20
+
+
+def _normalize_data(data, missing=None):
+    """Convert plot data to the form Ngl uses.
+
+    Ngl converts data to C-contiguous double precision arrays, which
+    cannot represent masked points or use NaN for missing values. Data
+    that is already in this form, without missing points, is returned
+    as it is. Otherwise a single converted copy is made, with masked
+    points and NaNs set to the missing value.
+
+    Arguments:
+    data -- The data, an array or anything that can be converted to one.
+
+    Optional argument:
+    missing -- The missing value to use. Defaults to the fill value of
+        masked arrays, or 1e20.
+
+    Returns the data and the missing value used, which is None if the
+    data has no missing points.
+
+    """
+    converted = not isinstance(data, np.ndarray)
+    if converted:
+        try:
+            data = np.array(data, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Leave anything that is not numeric data for Ngl to handle.
+            return data, None
+    values = np.ma.getdata(data)
+    mask = np.ma.getmask(data)
+    masked = mask is not np.ma.nomask and mask.any()
+    # The minimum is NaN if any value is NaN, which avoids creating an array
+    # of flags when there are none.
+    nan = values.dtype.kind == 'f' and values.size > 0 and \
+            np.isnan(values.min())
+    if not (converted or masked or nan or values.dtype != np.float64 or
+            not values.flags.c_contiguous):
+        return values, None
+    if not converted:
+        values = np.array(values, dtype=np.float64, order='C')
+    stats.count('array_copy')
+    stats.count('array_copy_bytes', values.nbytes)
+    if not (masked or nan):
+        return values, None
+    if missing is None:
+        if np.ma.isMaskedArray(data):
+            missing = float(data.fill_value)
+        else:
+            missing = _default_missing_value
+    if masked:
+        values[mask] = missing
+    if nan:
+        values[np.isnan(values)] = missing
+    return values, missing
+
+
+class ResourceOverlay(Ngl.Resources):
+    """A lightweight view of an Ngl resources object.
+
+    The view presents the resources of an underlying resources object
+    with some resources overridden (by setting attributes on the view)
+    or hidden (by deleting attributes from the view). The underlying
+    object is never modified and its attributes are not copied, so the
+    view is cheap to create even when the resources hold large arrays.
+
+    A real Ngl resources object is only created by materialize, which
+    should be called immediately before the resources are passed to an
+    Ngl function.
+
+    """
+
+    def __init__(self, base, **overrides):
+        """Create a view of a resources object.
+
+        Argument:
+        base -- An Ngl resources object (or another ResourceOverlay).
+
+        Optional arguments:
+        **overrides -- Resources to override in the view.
+
+        """
+        self.__dict__['_overlay_base'] = base
+        self.__dict__['_overlay_overrides'] = overrides
+        self.__dict__['_overlay_hidden'] = set()
+
+    def __getattr__(self, name):
+        # Only called when the name is not found in the instance or class,
+        # i.e. for every resource name.
+        try:
+            base = self.__dict__['_overlay_base']
+        except KeyError:
+            raise AttributeError(name)
+        value = self.__dict__['_overlay_overrides'].get(name, _missing)
+        if value is not _missing:
+            return value
+        if name in self.__dict__['_overlay_hidden']:
+            raise AttributeError(name)
+        return getattr(base, name)
+
+    def __setattr__(self, name, value):
+        self.__dict__['_overlay_overrides'][name] = value
+
+    def __delattr__(self, name):
+        found = self.__dict__['_overlay_overrides'].pop(name, _missing) \
+                is not _missing
+        hidden = self.__dict__['_overlay_hidden']
+        base = self.__dict__['_overlay_base']
+        if name not in hidden and hasattr(base, name):
+            hidden.add(name)
+            found = True
+        if not found:
+            raise AttributeError(name)
+
+    def names(self):
+        """Return the set of resource names visible in the view."""
+        names = set(_resource_dict(self.__dict__['_overlay_base']))
+        names.difference_update(self.__dict__['_overlay_hidden'])
+        names.update(self.__dict__['_overlay_overrides'])
+        return names
+
+    def materialize(self):
+        """Return a real Ngl resources object equivalent to the view.
+
+        The object is of the same class as the underlying resources. If
+        the view does not change any of the underlying resources then
+        the underlying resources object itself is returned and nothing is
+        copied.
+
+        """
+        base = self.__dict__['_overlay_base']
+        overrides = self.__dict__['_overlay_overrides']
+        basedict = _resource_dict(base)
+        hidden = self.__dict__['_overlay_hidden'].intersection(basedict)
+        if not hidden and all(_same_value(basedict.get(name, _missing), value)
+                for name, value in overrides.items()):
+            if isinstance(base, ResourceOverlay):
+                return base.materialize()
+            return base
+        if isinstance(base, ResourceOverlay):
+            base = base.materialize()
+        # The copy keeps the class of the resources, since Ngl also reads
+        # resources defined by the class (e.g., properties).
+        res = copy.copy(base)
+        for name in hidden:
+            del res.__dict__[name]
+        res.__dict__.update(overrides)
+        return res
+
+
+def _resource_dict(res):
+    """Return the attribute dictionary of a resources object or view."""
+    if isinstance(res, ResourceOverlay):
+        return res.materialize().__dict__
+    return res.__dict__
+
+
+def _same_value(a, b):
+    """Determine if two resource values are the same."""
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except ValueError:
+        # Arrays cannot be compared this way, assume they are different.
+        return False
+
+
+# Whether the postplot method of each class of modifier takes a context.
+_postplot_contexts = dict()
+
+
+def _postplot_takes_context(modifier):
+    """
+    Determine if the postplot method of a modifier takes a context.
+
+    Modifiers written before contexts were introduced define
+    postplot(self, wks, plot) and keep their state on the modifier.
+
+    """
+    cls = type(modifier)
+    try:
+        return _postplot_contexts[cls]
+    except KeyError:
+        pass
+    try:
+        getargspec = inspect.getfullargspec
+    except AttributeError:
+        getargspec = inspect.getargspec
+    try:
+        spec = getargspec(modifier.postplot)
+        takes_context = spec[1] is not None or len(spec[0]) > 3
+    except TypeError:
+        # Not a Python function, assume it follows the current interface.
+        takes_context = True
+    _postplot_contexts[cls] = takes_context
+    return takes_context
+
 
 class PlotModifier(object):
     """Base class for plot modification objects.
@@ -34,23 +264,46 @@ class PlotModifier(object):
     # be any resources that Ngl will not recognize.
     resource_names = list()
 
+    def prepare(self, plot_func, args):
+        """Method called before preplot to transform the plot arguments.
+
+        This method receives the Ngl plotting function and the full
+        argument list (in which resources are views that may be
+        modified). It can be used to replace the data arrays passed to
+        the plotting function, e.g., with reduced versions of them.
+
+        Returns the plotting function and argument list to use, which
+        are the ones given if nothing needs to be changed.
+
+        """
+        return plot_func, args
+
     def preplot(self, *args):
         """Method called before a plot is created.
         
         This method recieves the full argument list to the plotting
         function which may be modified. Generally this method should
         parse the resource list for resource names it is associated
-        with and take some action on these. Returns None.
+        with and take some action on these.
+
+        Returns a context object which is passed to postplot. Any state
+        needed by postplot must be kept in the context rather than on
+        the modifier itself, so that a single modifier can be used by
+        several plotting calls at the same time.
 
         """
-        pass
+        return None
 
-    def postplot(self, wks, plot):
+    def postplot(self, wks, plot, context):
         """method called after a plot is created.
 
-        This method receives the workstation and the plot object.
+        This method receives the workstation, the plot object and the
+        context returned by preplot for the same plotting call.
         Modifications can then be applied to the plot. Returns None.
 
+        Modifiers defining postplot(self, wks, plot), without the
+        context, are still supported.
+
         """
         pass
 
@@ -58,54 +311,127 @@ class PlotModifier(object):
 class ModificationManager(object):
     """A decorator class for applying plot modifiers.
     
-    The class methods addModifiers and setModifiers should be used to
-    define the modifications that will be applied.
+    Each manager has its own modifiers, given when it is created. The
+    methods addModifiers and setModifiers can be used to change the
+    modifications that will be applied.
     
     """
 
-    # Class variable defining the modifiers that are currently active.
-    modifiers = list()
+    def __init__(self, ngl_plot_func, modifiers=()):
+        """Initialize a ModificationManager.
 
-    @classmethod
-    def addModifiers(cls, *modifiers):
-        """Add modifiers to all modification managers.
+        Argument:
+        ngl_plot_func -- An Ngl plotting function to be modified.
+
+        Optional argument:
+        modifiers -- List/tuple etc. of PlotModifier objects to apply.
+            Defaults to no modifiers.
+
+        """
+        self.f = ngl_plot_func
+        self.setModifiers(modifiers)
+        # Names under which the time spent in each stage of plotting is
+        # recorded when statistics are enabled.
+        self._stages = dict((stage, '%s.%s' % (self.f.__name__, stage))
+                for stage in ('preplot', 'plot', 'postplot', 'draw', 'frame'))
+
+    @property
+    def modifiers(self):
+        """The modifiers applied by this manager (a tuple)."""
+        return self._dispatch[0]
+
+    def addModifiers(self, *modifiers):
+        """Add modifiers to this modification manager.
 
         Argument:
         *modifiers -- PlotModification objects.
 
         """
-        for m in modifiers:
-            cls.modifiers.append(m)
+        self.setModifiers(self.modifiers + modifiers)
 
-    @classmethod
-    def setModifiers(cls, modifiers):
-        """Set the modifiers used for all modification managers.
+    def setModifiers(self, modifiers):
+        """Set the modifiers used for this modification manager.
 
         Argument:
         modifiers -- List/tuple etc. of PlotModifier objects.
 
         """
-        cls.modifiers = modifiers
+        modifiers = tuple(modifiers)
+        # Index the modifiers by the special resources they handle. Modifiers
+        # that handle no special resources always apply.
+        index = dict()
+        unconditional = list()
+        for position, modifier in enumerate(modifiers):
+            if not modifier.resource_names:
+                unconditional.append(position)
+            for resource_name in modifier.resource_names:
+                index.setdefault(resource_name, set()).add(position)
+        # The modifiers and their index are replaced together in a single
+        # assignment so that calls in progress always see a consistent set.
+        self._dispatch = (modifiers, index, unconditional)
+
+    def _active_modifiers(self, resource_names):
+        """
+        Select the modifiers that apply to a set of resource names.
 
-    def __init__(self, ngl_plot_func):
-        """Initialize a ModificationManager.
-
-        Argument:
-        ngl_plot_func -- An Ngl plotting function to be modified.
+        Returns the modifiers in the order they were registered and the
+        special resource names that were found.
 
         """
-        self.f = ngl_plot_func
+        modifiers, index, unconditional = self._dispatch
+        special = resource_names.intersection(index)
+        positions = set(unconditional)
+        for resource_name in special:
+            positions.update(index[resource_name])
+        return [modifiers[p] for p in sorted(positions)], special
 
     def __call__(self, *args):
         """Ngl graphics function with modifications applied."""
-        # Make a local copy of the resources arguments, preventing them
-        # from being modified in the calling namespace. These copied (and
-        # possibly modified) are used only inside this method.
+        with stats.timer(self._stages['preplot']):
+            plot_func, new_args, modifiers, contexts, draw_on, frame_on = \
+                    self._preplot(args)
+        # Make the plot.
+        with stats.timer(self._stages['plot']):
+            plot = plot_func(*new_args)
+        stats.count(self.f.__name__)
+        # Call the modifier post-plot methods.
+        wks = args[0]
+        with stats.timer(self._stages['postplot']):
+            for modifier, context in zip(modifiers, contexts):
+                if _postplot_takes_context(modifier):
+                    modifier.postplot(wks, plot, context)
+                else:
+                    modifier.postplot(wks, plot)
+        # Check if the plot should be drawn and the frame advanced. Do so now
+        # if required.
+        if draw_on:
+            with stats.timer(self._stages['draw']):
+                Ngl.draw(plot)
+            stats.count('draw')
+        if frame_on:
+            with stats.timer(self._stages['frame']):
+                Ngl.frame(wks)
+            stats.count('frame')
+        # Return the modified plot.
+        return plot
+
+    def _preplot(self, args):
+        """Prepare the arguments for the Ngl plotting function.
+
+        Returns the Ngl plotting function to call and its argument list,
+        the modifiers that apply and the contexts they returned from
+        preplot, and whether drawing and frame advancing were requested.
+
+        """
+        # Make a lightweight view of each of the resources arguments,
+        # preventing them from being modified in the calling namespace. These
+        # views (and any modifications made to them) are used only inside
+        # this method.
         res = list()
         for i, arg in enumerate(args):
             if isinstance(arg, Ngl.Resources):
-                res.append((copy(arg), i))
-        # Form the new argument list containing copies of the resource
+                res.append((ResourceOverlay(arg), i))
+        # Form the new argument list containing views of the resource
         # variables. We alse need to intercept nglDraw and nglFrame at the top
         # level, making sure they are turned off while modifications are
         # applied. After modifications we can check if drawing and frame
@@ -120,34 +446,62 @@ class ModificationManager(object):
             if frame_on:
                 setattr(r, 'nglFrame', False)
             new_args[i] = r
-        # Call the modifier pre-plot methods.
-        special_resources = list()
-        for modifier in self.modifiers:
+        # Find the special resources that are actually set, and select only
+        # the modifiers that handle them (plus any that always apply).
+        names = dict()
+        for r, i in res:
+            names[i] = r.names()
+        present = set()
+        present.update(*names.values())
+        modifiers, special_resources = self._active_modifiers(present)
+        # Let the modifiers transform the arguments before they are inspected
+        # by the pre-plot methods.
+        plot_func = self.f
+        for modifier in modifiers:
+            plot_func, new_args = modifier.prepare(plot_func, new_args)
+        # Convert the data arguments to the form used by Ngl, so that Ngl
+        # does not have to.
+        new_args = self._normalize(plot_func, new_args)
+        # Call the modifier pre-plot methods, keeping the context each one
+        # returns for this call only.
+        contexts = list()
+        for modifier in modifiers:
             # Run the preplot method of each modifier.
-            modifier.preplot(*new_args)
-            special_resources += modifier.resource_names
-        # Go back and remove all special resources from resource variables
-        # before they are passed to the Ngl plotting routine.
+            contexts.append(modifier.preplot(*new_args))
+        # Go back and remove the special resources that are set from resource
+        # variables before they are passed to the Ngl plotting routine.
         for r, i in res:
-            for resource_name in special_resources:
-                try:
-                    delattr(r, resource_name)
-                except AttributeError:
-                    pass
-        # Make the plot.
-        plot = self.f(*new_args)
-        # Call the modifier post-plot methods.
-        wks = args[0]
-        for modifier in self.modifiers:
-            modifier.postplot(wks, plot)
-        # Check if the plot should be drawn and the frame advanced. Do so now
-        # if required.
-        if draw_on:
-            Ngl.draw(plot)
-        if frame_on:
-            Ngl.frame(wks)
-        # Return the modified plot.
-        return plot
+            for resource_name in special_resources.intersection(names[i]):
+                delattr(r, resource_name)
+        # Real resources objects are only created now, just before the plot
+        # is made, and only where the views differ from the resources passed
+        # in. The views are found by type since prepare may have moved them.
+        new_args = [arg.materialize() if isinstance(arg, ResourceOverlay)
+                else arg for arg in new_args]
+        return plot_func, new_args, modifiers, contexts, draw_on, frame_on
+
+    def _normalize(self, plot_func, args):
+        """
+        Convert the data arguments of a plotting function to the form
+        used by Ngl, setting missing value resources where needed.
+
+        """
+        names = _missing_value_resources.get(plot_func.__name__)
+        if names is None:
+            return args
+        args = list(args)
+        res = args[-1] if isinstance(args[-1], ResourceOverlay) else None
+        ndata = len(args) - (2 if res is not None else 1)
+        for position, name in zip(xrange(1, ndata + 1), names):
+            data, missing = _normalize_data(args[position],
+                    getattr(res, name, None))
+            args[position] = data
+            if missing is not None:
+                if res is None:
+                    res = ResourceOverlay(Ngl.Resources())
+                    args.append(res)
+                setattr(res, name, missing)
+        return args
 
     def __repr__(self):
         return self.f.__repr__()
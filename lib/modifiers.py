@@ -17,9 +17,13 @@
 # along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy as np
 import Ngl
 
+import decimation
+import grids
 from defaults import ngldefaults as defaults
+from instrumentation import stats
 from modification import PlotModifier
 
 
@@ -95,8 +99,9 @@ class NglStrings(PlotModifier):
         string_defaults = (defaults['font']['ngl'],
                 defaults['fontheight']['ngl'], 1, 0., 0.)
         # Initialize a dictionary to store the specification for each of the
-        # left, right and center strings.
-        self.string_specs = dict(left=[], right=[], center=[])
+        # left, right and center strings. This is the context returned to
+        # the modification manager.
+        string_specs = dict(left=[], right=[], center=[])
         # Loop over each resource variable provided, handling the special
         # resource values.
         for res in resource_vars:
@@ -113,13 +118,24 @@ class NglStrings(PlotModifier):
                         res, special_resource_names, string_defaults)
                 if special_resources_list is not None:
                     # Record these values if they exist.
-                    self.string_specs[string_position].append(
+                    string_specs[string_position].append(
                             special_resources_list)
+        return string_specs
 
-    def postplot(self, wks, plot):
-        """Annotate the plot with title strings."""
+    def postplot(self, wks, plot, string_specs):
+        """Annotate the plot with title strings.
+
+        The text objects and annotations created are recorded on the
+        plot in the attribute '_nglstrings', a dictionary mapping each
+        position to a list of (text, annotation) pairs, so that they can
+        be updated or removed later.
+
+        """
+        strings = getattr(plot, '_nglstrings', None)
+        if strings is None:
+            strings = plot._nglstrings = dict(left=[], right=[], center=[])
         for position in ('left', 'right', 'center'):
-            for string_spec in self.string_specs[position]:
+            for string_spec in string_specs[position]:
                 # Create text and annotation resource variables based on the
                 # current string specification.
                 txres = self._text_resources(string_spec, position)
@@ -131,6 +147,9 @@ class NglStrings(PlotModifier):
                 # is a mutable object so doing this attaches the annotation to
                 # the input plot.
                 anno = Ngl.add_annotation(plot, text_object, anres)
+                strings[position].append((text_object, anno))
+                stats.count('text_ndc')
+                stats.count('add_annotation')
 
     def _text_resources(self, string_spec, string_type):
         """Create resources to create text in the correct format."""
@@ -198,6 +217,360 @@ class NglStrings(PlotModifier):
         return None
 
 
+# Width and height in pixels assumed for workstations that do not have them
+# (e.g., PostScript workstations).
+_default_wks_size = 1024
+
+# The workstation resource giving the size in pixels of the workstation in the
+# direction of each viewport size resource.
+_workstation_size_resources = {'vpWidthF': 'wkWidth', 'vpHeightF': 'wkHeight'}
+
+
+def _viewport_pixels(wks, res, size_resource='vpWidthF'):
+    """
+    Approximate width (or height, if size_resource is 'vpHeightF') of a
+    plot's viewport in pixels.
+
+    """
+    # If the viewport size is not given (e.g., the plot is maximized) the
+    # plot may be as large as the workstation.
+    size = getattr(res, size_resource, 1.)
+    wks_resource = _workstation_size_resources[size_resource]
+    try:
+        wks_size = Ngl.get_integer(wks, wks_resource)
+    except Exception:
+        wks_size = None
+    if not wks_size:
+        wks_size = _default_wks_size
+    return max(int(size * wks_size), 1)
+
+
+def _visible_shape(res, shape, x, y):
+    """
+    Number of rows and columns of a grid inside the map limits.
+
+    Only grids with 1-D coordinates are limited.
+
+    """
+    ny, nx = shape
+    if x is not None and np.ndim(x) == 1:
+        nx = grids.visible_points(x, getattr(res, 'mpMinLonF', None),
+                getattr(res, 'mpMaxLonF', None), period=360.)
+    if y is not None and np.ndim(y) == 1:
+        ny = grids.visible_points(y, getattr(res, 'mpMinLatF', None),
+                getattr(res, 'mpMaxLatF', None))
+    return ny, nx
+
+
+# Pairs of resources giving the coordinates of the data of a plot.
+_coordinate_resources = (('sfXArray', 'sfYArray'), ('vfXArray', 'vfYArray'))
+
+# Map limit resources, in the order used by grids.domain_subset.
+_map_limit_resources = ('mpMinLatF', 'mpMaxLatF', 'mpMinLonF', 'mpMaxLonF')
+
+
+class DomainSubsetting(PlotModifier):
+    """
+    Plot modifier reading only the part of the data inside map limits.
+
+    When the map limits (mpMinLatF, mpMaxLatF, mpMinLonF and mpMaxLonF,
+    with mpLimitMode 'LatLon' or not set) cover only part of a grid,
+    only the rows and columns of the data inside the limits (plus a
+    halo) are passed to Ngl. The data arguments may be any 2-D object
+    that can be sliced, such as a numpy memory map or a netCDF
+    variable; only the part of them that is needed is read. The
+    coordinates must be 1-D and given in the sfXArray/sfYArray or
+    vfXArray/vfYArray resources, which are subset along with the data.
+    Regions crossing the longitude seam of a global grid are handled by
+    joining the columns either side of the seam.
+
+    This modifier makes the following resources available:
+
+        'nglxSubset' -- If True the data are subset.
+        'nglxSubsetHalo' -- Number of extra rows and columns to keep
+            around the limits. Defaults to 2.
+
+    """
+
+    resource_names = (
+            'nglxSubset',
+            'nglxSubsetHalo',)
+
+    def prepare(self, plot_func, args):
+        """Replace the data with the part of it inside the map limits."""
+        res = args[-1]
+        if not isinstance(res, Ngl.Resources) or \
+                not getattr(res, 'nglxSubset', False):
+            return plot_func, args
+        if getattr(res, 'mpLimitMode', 'LatLon').lower() != 'latlon':
+            return plot_func, args
+        limits = tuple(getattr(res, name, None)
+                for name in _map_limit_resources)
+        if all(limit is None for limit in limits):
+            return plot_func, args
+        data = args[1:-1]
+        shape = getattr(data[0], 'shape', None)
+        if shape is None or len(shape) != 2 or \
+                any(getattr(arg, 'shape', None) != shape for arg in data):
+            return plot_func, args
+        names = [pair for pair in _coordinate_resources
+                if getattr(res, pair[0], None) is not None and
+                   getattr(res, pair[1], None) is not None]
+        if not names:
+            return plot_func, args
+        x = np.asanyarray(getattr(res, names[0][0]))
+        y = np.asanyarray(getattr(res, names[0][1]))
+        if x.shape != (shape[1],) or y.shape != (shape[0],):
+            return plot_func, args
+        subset = grids.domain_subset(x, y, limits,
+                getattr(res, 'nglxSubsetHalo', 2))
+        if subset is None:
+            # None of the data would be visible, leave it to Ngl.
+            return plot_func, args
+        rows, columns, x, y = subset
+        with stats.timer('subset'):
+            data = [grids.read_subset(arg, rows, columns) for arg in data]
+        stats.count('subset_fields', len(data))
+        for xname, yname in names:
+            setattr(res, xname, x)
+            setattr(res, yname, y)
+        return plot_func, [args[0]] + data + [res]
+
+
+class LineDecimation(PlotModifier):
+    """
+    Plot modifier reducing the number of points drawn by xy and y.
+
+    Curves with many more points than there are pixels across the plot
+    are reduced to a few points per pixel before they are passed to Ngl,
+    which is much faster to draw and looks the same. The x coordinates
+    should be monotonic. Both single curves and 2-D arrays of curves
+    are supported.
+
+    This modifier makes the following resources available:
+
+        'nglxDecimate' -- If True the curves are reduced.
+        'nglxDecimateMethod' -- 'minmax' (default) to keep the minimum
+            and maximum of the points in each pixel, or 'lttb' to use
+            the largest-triangle-three-buckets algorithm.
+        'nglxDecimatePoints' -- Number of points to keep in each curve.
+            Defaults to two per pixel across the viewport (vpWidthF
+            times the workstation width).
+
+    """
+
+    resource_names = (
+            'nglxDecimate',
+            'nglxDecimateMethod',
+            'nglxDecimatePoints',)
+
+    def prepare(self, plot_func, args):
+        """Replace the curves with reduced versions of them."""
+        res = args[-1]
+        if not isinstance(res, Ngl.Resources) or \
+                not getattr(res, 'nglxDecimate', False):
+            return plot_func, args
+        wks, data = args[0], args[1:-1]
+        if len(data) == 1:
+            x, y = None, data[0]
+        else:
+            x, y = data
+        y = np.asanyarray(y)
+        if y.ndim not in (1, 2):
+            return plot_func, args
+        npoints = getattr(res, 'nglxDecimatePoints', None)
+        if npoints is None:
+            npoints = 2 * _viewport_pixels(wks, res)
+        with stats.timer('decimate'):
+            xnew, ynew = decimation.decimate(x, y, npoints,
+                    method=getattr(res, 'nglxDecimateMethod', 'minmax'),
+                    missing=getattr(res, 'caYMissingV', None))
+        if ynew is y:
+            return plot_func, args
+        stats.count('decimated_points', y.size - ynew.size)
+        # Ngl.y plots against the indices of the points, which are no longer
+        # contiguous, so the reduced curves are plotted with Ngl.xy.
+        return Ngl.xy, [wks, xnew, ynew, res]
+
+
+class FieldCoarsening(PlotModifier):
+    """
+    Plot modifier coarsening fields passed to contour and contour_map.
+
+    Fields with many more grid points than there are pixels in the plot
+    are averaged (or otherwise reduced) over blocks of grid points
+    before they are contoured, so that the cost of contouring depends on
+    the size of the plot rather than the resolution of the data. The
+    coordinates in the sfXArray and sfYArray resources are coarsened
+    along with the field. Masked points, NaNs and points equal to
+    sfMissingValueV are treated as missing.
+
+    This modifier makes the following resources available:
+
+        'nglxCoarsen' -- If True the field is coarsened.
+        'nglxCoarsenMethod' -- 'mean' (default) or 'max' of the valid
+            points in each block, or 'nearest' to take the point at the
+            center of each block.
+        'nglxCoarsenFactor' -- Number of grid points in each block,
+            either an integer or (rows, columns). By default the block
+            size is chosen to give about one grid point per pixel of the
+            viewport, taking into account the part of the grid inside
+            the map limits (mpMinLonF etc.) when the coordinates are
+            1-D.
+
+    """
+
+    resource_names = (
+            'nglxCoarsen',
+            'nglxCoarsenMethod',
+            'nglxCoarsenFactor',)
+
+    def prepare(self, plot_func, args):
+        """Replace the field with a coarsened version of it."""
+        res = args[-1]
+        if not isinstance(res, Ngl.Resources) or \
+                not getattr(res, 'nglxCoarsen', False):
+            return plot_func, args
+        wks, data = args[0], args[1]
+        data = np.asanyarray(data)
+        if data.ndim != 2:
+            return plot_func, args
+        x = getattr(res, 'sfXArray', None)
+        y = getattr(res, 'sfYArray', None)
+        factors = getattr(res, 'nglxCoarsenFactor', None)
+        if factors is None:
+            factors = self._factors(wks, res, data.shape, x, y)
+        elif np.isscalar(factors):
+            factors = (factors, factors)
+        if tuple(factors) == (1, 1):
+            return plot_func, args
+        with stats.timer('coarsen'):
+            data, x, y = grids.coarsen_field(data, factors, x, y,
+                    method=getattr(res, 'nglxCoarsenMethod', 'mean'),
+                    missing=getattr(res, 'sfMissingValueV', None))
+        stats.count('coarsened_fields')
+        if x is not None:
+            res.sfXArray = x
+        if y is not None:
+            res.sfYArray = y
+        return plot_func, [wks, data] + list(args[2:])
+
+    def _factors(self, wks, res, shape, x, y):
+        """Block size giving about one grid point per pixel."""
+        ny, nx = _visible_shape(res, shape, x, y)
+        width = _viewport_pixels(wks, res, 'vpWidthF')
+        height = _viewport_pixels(wks, res, 'vpHeightF')
+        return (max(ny // height, 1), max(nx // width, 1))
+
+
+# Map projections on which lines of longitude are parallel, so that grids
+# regular in longitude are not crowded at high latitudes.
+_parallel_meridian_projections = ('CylindricalEquidistant', 'Mercator',
+        'CylindricalEqualArea')
+
+# The data arguments of the vector and streamline plotting functions, in
+# order, described by the coordinate and missing value resources of each.
+_thinned_arguments = (
+        ('vfXArray', 'vfYArray', 'vfMissingUValueV'),
+        ('vfXArray', 'vfYArray', 'vfMissingVValueV'),
+        ('sfXArray', 'sfYArray', 'sfMissingValueV'),)
+
+
+class FieldThinning(PlotModifier):
+    """
+    Plot modifier thinning the fields passed to the vector and
+    streamline plotting functions.
+
+    Ngl computes a vector for every grid point even when far more
+    vectors than can be seen would be drawn. This modifier thins the u
+    and v components (and the scalar field, for the *_scalar functions)
+    to a given spacing between vectors in NDC space before they are
+    passed to Ngl. The coordinates in the vfXArray/vfYArray (and
+    sfXArray/sfYArray) resources are thinned along with the fields.
+
+    The number of grid points kept across the plot is worked out from
+    the viewport size and the part of the grid inside the map limits
+    (mpMinLonF etc.) when the coordinates are 1-D. On map projections
+    where lines of longitude converge towards the poles, points are also
+    removed (set missing) along rows at high latitudes so the density of
+    vectors is more even.
+
+    This modifier makes the following resources available:
+
+        'nglxThin' -- If True the fields are thinned.
+        'nglxThinMethod' -- 'subsample' (default) to keep the grid
+            point at the center of each block of points, or 'mean' to
+            average over each block.
+        'nglxThinSpacingF' -- Distance between vectors in NDC units.
+            Defaults to vcMinDistanceF if it is set, otherwise 0.02.
+
+    """
+
+    resource_names = (
+            'nglxThin',
+            'nglxThinMethod',
+            'nglxThinSpacingF',)
+
+    def prepare(self, plot_func, args):
+        """Replace the fields with thinned versions of them."""
+        res = args[-1]
+        if not isinstance(res, Ngl.Resources) or \
+                not getattr(res, 'nglxThin', False):
+            return plot_func, args
+        wks, data = args[0], [np.asanyarray(arg) for arg in args[1:-1]]
+        if any(field.ndim != 2 or field.shape != data[0].shape
+                for field in data):
+            return plot_func, args
+        x = getattr(res, 'vfXArray', None)
+        y = getattr(res, 'vfYArray', None)
+        factors = self._factors(res, data[0].shape, x, y)
+        if factors == (1, 1):
+            return plot_func, args
+        method = getattr(res, 'nglxThinMethod', 'subsample')
+        if method == 'subsample':
+            method = 'nearest'
+        elif method != 'mean':
+            raise ValueError("unknown thinning method '%s'" % method)
+        thinned = []
+        coordinates = dict()
+        with stats.timer('thin'):
+            for field, (xname, yname, missing_name) in \
+                    zip(data, _thinned_arguments):
+                field, fx, fy = grids.coarsen_field(field, factors,
+                        getattr(res, xname, None), getattr(res, yname, None),
+                        method=method,
+                        missing=getattr(res, missing_name, None))
+                thinned.append(field)
+                coordinates[xname], coordinates[yname] = fx, fy
+            lat = coordinates['vfYArray']
+            if lat is not None and self._meridians_converge(plot_func, res):
+                # Remove points from the same places in every field.
+                drop = grids.convergence_mask(lat, thinned[0].shape)
+                thinned = [np.ma.masked_where(drop, field)
+                        for field in thinned]
+        stats.count('thinned_fields', len(thinned))
+        for name, value in coordinates.items():
+            if value is not None:
+                setattr(res, name, value)
+        return plot_func, [wks] + thinned + [res]
+
+    def _factors(self, res, shape, x, y):
+        """Block size giving the requested spacing between vectors."""
+        spacing = getattr(res, 'nglxThinSpacingF',
+                getattr(res, 'vcMinDistanceF', 0.02))
+        ny, nx = _visible_shape(res, shape, x, y)
+        columns = max(int(getattr(res, 'vpWidthF', 1.) / spacing), 1)
+        rows = max(int(getattr(res, 'vpHeightF', 1.) / spacing), 1)
+        return (max(ny // rows, 1), max(nx // columns, 1))
+
+    def _meridians_converge(self, plot_func, res):
+        """Determine if a plot is on a map where meridians converge."""
+        if not plot_func.__name__.endswith('_map'):
+            return False
+        projection = getattr(res, 'mpProjection', 'CylindricalEquidistant')
+        return projection not in _parallel_meridian_projections
+
+
 if __name__ == '__main__':
     pass
 
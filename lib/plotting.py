@@ -18,137 +18,701 @@
 
 
 import warnings
-from copy import copy
 
 import numpy as np
 import Ngl
 
 from defaults import ngldefaults as defaults
+from instrumentation import stats
 from modification import ModificationManager as ModMan
-from modifiers import NglStrings
+from modification import ResourceOverlay
+from modifiers import DomainSubsetting, FieldCoarsening, FieldThinning, \
+        LineDecimation, NglStrings
+from quantiles import QuantileSketch, bin_edges
 
 
 # Define plotting functions in this namespace with the same names as the Ngl
 # plotting functions. These versions have modifications applied using a
 # ModificationManager object. The modification applied allows the use of the
 # NCL-style 'gsn' strings. Note that  we are re-defining the built-in 'map'
-# here.
-ModMan.addModifiers(NglStrings())
-xy = ModMan(Ngl.xy)
-y = ModMan(Ngl.y)
-map = ModMan(Ngl.map)
-contour = ModMan(Ngl.contour)
-contour_map = ModMan(Ngl.contour_map)
-streamline = ModMan(Ngl.streamline)
-streamline_map = ModMan(Ngl.streamline_map)
-streamline_scalar = ModMan(Ngl.streamline_scalar)
-streamline_scalar_map = ModMan(Ngl.streamline_scalar_map)
-vector = ModMan(Ngl.vector)
-vector_map = ModMan(Ngl.vector_map)
-vector_scalar = ModMan(Ngl.vector_scalar)
-vector_scalar_map = ModMan(Ngl.vector_scalar_map)
+# here. A single NglStrings modifier is shared by all the plotting functions,
+# which is safe since modifiers keep no per-call state. The line plotting
+# functions can also reduce the number of points they draw, the contour
+# functions the resolution of the field they contour and the vector and
+# streamline functions the density of their vectors. The functions drawing
+# data on maps can also read only the part of the data inside the map limits,
+# which is done before any other reduction.
+_strings = NglStrings()
+_decimation = LineDecimation()
+_coarsening = FieldCoarsening()
+_thinning = FieldThinning()
+_subsetting = DomainSubsetting()
+xy = ModMan(Ngl.xy, [_strings, _decimation])
+y = ModMan(Ngl.y, [_strings, _decimation])
+map = ModMan(Ngl.map, [_strings])
+contour = ModMan(Ngl.contour, [_strings, _coarsening])
+contour_map = ModMan(Ngl.contour_map, [_strings, _subsetting, _coarsening])
+streamline = ModMan(Ngl.streamline, [_strings, _thinning])
+streamline_map = ModMan(Ngl.streamline_map,
+        [_strings, _subsetting, _thinning])
+streamline_scalar = ModMan(Ngl.streamline_scalar, [_strings, _thinning])
+streamline_scalar_map = ModMan(Ngl.streamline_scalar_map,
+        [_strings, _subsetting, _thinning])
+vector = ModMan(Ngl.vector, [_strings, _thinning])
+vector_map = ModMan(Ngl.vector_map, [_strings, _subsetting, _thinning])
+vector_scalar = ModMan(Ngl.vector_scalar, [_strings, _thinning])
+vector_scalar_map = ModMan(Ngl.vector_scalar_map,
+        [_strings, _subsetting, _thinning])
+
+# All the modified plotting functions.
+_modified_functions = (xy, y, map, contour, contour_map, streamline,
+        streamline_map, streamline_scalar, streamline_scalar_map, vector,
+        vector_map, vector_scalar, vector_scalar_map)
+
+
+def add_modifiers(*modifiers):
+    """Add modifiers to all the modified plotting functions.
+
+    Argument:
+    *modifiers -- PlotModifier objects.
+
+    """
+    for function in _modified_functions:
+        function.addModifiers(*modifiers)
 
 
 # New plotting functions.
-def histogram(wks, data, res):
-    """Plot a histogram.
+def _bar_vertices(left, width, height, base, bar_width_perc):
+    """Compute the vertices of a set of histogram bars.
 
-    The NumPy histogram function is used to define the histogram.
+    All bars are computed at once. The return values are two arrays of
+    shape (nbars, 5) containing the x and y coordinates of the closed
+    outline of each bar.
 
     Arguments:
-    wks -- Ngl wrokstation.
-    data -- 1D array of data to construct a histogram from.
-    res -- Ngl resources variable. Valid resources are:
-        
+    left -- Array of the left edges of the bars.
+    width -- Width of the bars, either a scalar or an array with one
+        value per bar.
+    height -- Array of the y coordinates of the tops of the bars.
+    base -- The y coordinate of the base of the bars, either a scalar
+        or an array with one value per bar.
+    bar_width_perc -- Fraction of the bin width that each bar covers.
+
+    """
+    left = np.asarray(left, dtype=np.float64)
+    right = left + np.asarray(width, dtype=np.float64) * bar_width_perc
+    height = np.asarray(height, dtype=np.float64)
+    base = np.asarray(base, dtype=np.float64)
+    # Each bar is drawn anti-clockwise from its bottom left corner, closing
+    # the outline back at the start.
+    xbars = np.empty([len(left), 5])
+    xbars[:, [0, 3, 4]] = left[:, np.newaxis]
+    xbars[:, [1, 2]] = right[:, np.newaxis]
+    ybars = np.empty([len(left), 5])
+    ybars[:, [0, 1, 4]] = base[..., np.newaxis]
+    ybars[:, [2, 3]] = height[:, np.newaxis]
+    return xbars, ybars
+
+
+def _iter_chunks(data, chunksize):
+    """Generate flattened chunks of histogram input data.
+
+    Memory-mapped arrays are read in slices of at most chunksize
+    elements. Any other iterable is assumed to already yield chunks,
+    each of which is flattened.
+
+    """
+    if isinstance(data, np.ndarray):
+        flat = data.reshape(-1)
+        for start in xrange(0, flat.size, chunksize):
+            yield np.asarray(flat[start:start+chunksize])
+    else:
+        for chunk in data:
+            yield np.asarray(chunk).ravel()
+
+
+def _histogram_edges(data, bins, hrange, chunksize):
+    """Determine fixed bin edges for chunked histogram input."""
+    if np.iterable(bins):
+        # Explicit bin intervals define the edges directly.
+        return np.asarray(bins, dtype=np.float64)
+    if hrange is None:
+        if not isinstance(data, np.ndarray):
+            # A generic iterable of chunks can only be read once, so the
+            # range cannot be found before counting.
+            raise ValueError('chunked histogram input requires '
+                    "'nglxHistogramRange' or 'nglHistogramBinIntervals'")
+        # A memory-mapped array can be read twice, so find the range with an
+        # extra chunked pass.
+        lo, hi = np.inf, -np.inf
+        for chunk in _iter_chunks(data, chunksize):
+            if chunk.size:
+                lo = min(lo, chunk.min())
+                hi = max(hi, chunk.max())
+        if lo > hi:
+            raise ValueError('cannot compute a histogram of empty data')
+        if lo == hi:
+            # Match the behaviour of numpy.histogram for constant data.
+            lo, hi = lo - 0.5, hi + 0.5
+        hrange = (lo, hi)
+    return np.linspace(hrange[0], hrange[1], bins + 1)
+
+
+def _data_bin_edges(data, nbins, spacing, hrange):
+    """Choose bin edges for data held in memory."""
+    finite = np.asarray(data, dtype=np.float64).ravel()
+    finite = finite[np.isfinite(finite)]
+    if not finite.size:
+        raise ValueError('cannot compute a histogram of empty data')
+    positive = finite[finite > 0]
+    return bin_edges(nbins, spacing, lambda q: np.percentile(finite, 100. * q),
+            finite.min(), finite.max(),
+            positive.min() if positive.size else np.inf, hrange=hrange)
+
+
+def _histogram_counts(data, bins, hrange, density, chunksize,
+        spacing='linear'):
+    """Compute histogram counts and bin edges.
+
+    In-memory arrays (and lists) are binned in one call to
+    numpy.histogram. Memory-mapped arrays and other iterables of chunks
+    are binned incrementally over fixed bin edges so that peak memory
+    use depends only on the chunk size.
+
+    For 'quantile' or 'log' bin spacing the edges are chosen from the
+    data: exactly for in-memory arrays, or from a QuantileSketch built
+    in a single pass over chunked data. A QuantileSketch may also be
+    given as the data, in which case the counts are estimated from it.
+
+    """
+    if isinstance(data, QuantileSketch):
+        if not np.iterable(bins):
+            bins = data.bin_edges(bins, spacing, hrange=hrange)
+        binedges = np.asarray(bins, dtype=np.float64)
+        return data.histogram(binedges, density=density), binedges
+    in_memory = not isinstance(data, np.memmap) and \
+            (isinstance(data, (np.ndarray, list, tuple)) or
+             not np.iterable(data))
+    if spacing.lower() != 'linear' and not np.iterable(bins):
+        if in_memory:
+            bins = _data_bin_edges(data, bins, spacing, hrange)
+        else:
+            # Summarize the data in a single chunked pass.
+            sketch = QuantileSketch()
+            for chunk in _iter_chunks(data, chunksize):
+                sketch.update(chunk)
+            if not isinstance(data, np.ndarray):
+                # A generic iterable cannot be read again, so the sketch
+                # must provide the counts too.
+                return _histogram_counts(sketch, bins, hrange, density,
+                        chunksize, spacing)
+            bins = sketch.bin_edges(bins, spacing, hrange=hrange)
+    if in_memory:
+        return np.histogram(data, bins=bins, range=hrange, density=density)
+    binedges = _histogram_edges(data, bins, hrange, chunksize)
+    hist = np.zeros(len(binedges) - 1, dtype=np.int64)
+    for chunk in _iter_chunks(data, chunksize):
+        hist += np.histogram(chunk, bins=binedges)[0]
+    if density:
+        # Normalize once all the chunks have been counted, in the same way
+        # as numpy.histogram.
+        hist = hist / (hist.sum() * np.diff(binedges))
+    return hist, binedges
+
+
+# Default values of the special histogram resources. These will not be
+# recognised by Ngl.
+_histogram_resource_defaults = {
+        'nglHistogramBarWidthPercent': 1.,
+        'nglHistogramBinIntervals': None,
+        'nglHistogramNumberOfBins': 10,
+        'nglxHistogramRange': None,
+        'nglxHistogramBarColor': 0,
+        'nglxHistogramBarOutlineColor': 1,
+        'nglxHistogramDensity': True,
+        'nglxHistogramChunkSize': 1048576,
+        'nglxHistogramStyle': 'grouped',
+        'nglxHistogramBinSpacing': 'linear',
+}
+
+
+def _histogram_resources(res):
+    """Separate special histogram resources from Ngl resources.
+
+    Returns a view of the resources with the special resources hidden
+    and drawing and frame advancing turned off, a dictionary of the
+    special resource values, and whether drawing and frame advancing
+    were requested.
+
     """
-    # Define a function to compute bar locations.
-    def bar_position(x, y, dx, ymin, bar_width_perc):
-        """Compute the coordinates required to draw a specified bar."""
-        dxp = dx * bar_width_perc
-        xbar = np.array([x, x+dxp, x+dxp, x, x])
-        ybar = np.array([ymin, ymin, y, y, ymin])
-        return xbar, ybar
-    # Make a local copy of resources so they can be modified.
-    res = copy(res)
+    # Make a lightweight view of the resources so they can be modified
+    # without copying them.
+    res = ResourceOverlay(res)
     # Intercept and turn off draw and frame resources. These will be applied
     # if necessary once the histogram has been constructed.
     frame_on = getattr(res, 'nglFrame', True)
     draw_on = getattr(res, 'nglDraw', True)
     res.nglFrame = False
     res.nglDraw = False
-    # Set default values of special resources that will not be recognised by 
-    # Ngl.
-    resdefaults = {
-            'nglHistogramBarWidthPercent': 1.,
-            'nglHistogramBinIntervals': None,
-            'nglHistogramNumberOfBins': 10,
-            'nglxHistogramRange': None,
-            'nglxHistogramBarColor': 0,
-            'nglxHistogramBarOutlineColor': 1,
-            'nglxHistogramDensity': True,
-    }
     # Record the values of the special resources, and remove them from the
     # resource list.
     specialres = dict()
-    for resname in resdefaults.keys():
-        specialres[resname] = getattr(res, resname, resdefaults[resname])
+    for resname in _histogram_resource_defaults.keys():
+        specialres[resname] = getattr(res, resname,
+                _histogram_resource_defaults[resname])
         try:
             delattr(res, resname)
         except AttributeError:
             pass
-    # Work out the values of histogram parameters.
-    nbins = specialres['nglHistogramBinIntervals'] or \
-            specialres['nglHistogramNumberOfBins']
-    hrange = specialres['nglxHistogramRange']
-    density = specialres['nglxHistogramDensity']
-    # Compute the histogram with the NumPy routine.
-    hist, binedges = np.histogram(data, bins=nbins, range=hrange, density=density)
-    dx = binedges[1] - binedges[0]
-    ymin = 0.
-    # Draw up to three bars, the first and last and the tallest, if they are
-    # different. This sets up the plot correctly. The user specified plotting
-    # resources are respected during this process. The lines drawn here will
-    # be covered by the histogram.
-    xdum, ydum = list(), list()
-    xbar, ybar = bar_position(binedges[0], hist[0], dx, ymin,      # first bar
-            specialres['nglHistogramBarWidthPercent'])
-    xdum.append(xbar)
-    ydum.append(ybar)
-    if nbins > 1:
-        xbar, ybar = bar_position(binedges[-2], hist[-1], dx, ymin,    # last bar
-                specialres['nglHistogramBarWidthPercent'])
-        xdum.append(xbar)
-        ydum.append(ybar)
-    i = np.argmax(hist)
-    if i not in (0, nbins-1):
-        xbar, ybar = bar_position(binedges[i], hist[i], dx, ymin,    # tallest bar
-                specialres['nglHistogramBarWidthPercent'])
-        xdum.append(xbar)
-        ydum.append(ybar)
-    plot = xy(wks, np.array(xdum), np.array(ydum), res)
-    # Create resources for shading the bars and drawing outlines around them.
-    fillres = Ngl.Resources()
-    fillres.gsFillColor = specialres['nglxHistogramBarColor']
-    lineres = Ngl.Resources()
-    lineres.gsLineColor = specialres['nglxHistogramBarOutlineColor']
-    # Draw the bars and their outlines.
+    return res, specialres, draw_on, frame_on
+
+
+def _draw_bars(wks, xbars, ybars, res, fillcolors, linecolors, draw_on,
+        frame_on):
+    """Draw one or more series of histogram bars.
+
+    Arguments:
+    wks -- Ngl workstation.
+    xbars, ybars -- Arrays of shape (nseries, nbars, 5) containing the
+        outlines of the bars of each series.
+    res -- Ngl resources for the base plot.
+    fillcolors, linecolors -- Sequences of fill and outline colors, one
+        for each series.
+    draw_on, frame_on -- If True the plot is drawn and the frame
+        advanced respectively.
+
+    """
+    nseries, nbars = xbars.shape[:2]
+    # Draw up to three bars, the leftmost and rightmost and the tallest, if
+    # they are different. This sets up the plot correctly. The user specified
+    # plotting resources are respected during this process. The lines drawn
+    # here will be covered by the histogram.
+    xall = xbars.reshape([nseries * nbars, 5])
+    yall = ybars.reshape([nseries * nbars, 5])
+    dummy = np.unique([np.argmin(xall[:, 0]), np.argmax(xall[:, 1]),
+            np.argmax(yall[:, 2])])
+    plot = xy(wks, xall[dummy], yall[dummy], res)
+    # Each bar is a separate segment of a single primitive, the segments
+    # start every 5 points. This means only one polygon and one polyline are
+    # needed for each series regardless of the number of bars.
+    segments = np.arange(0, 5 * nbars, 5)
     plot._histbars = list()
     plot._histlines = list()
-    for bar in xrange(nbins):
-        xbar, ybar = bar_position(binedges[bar], hist[bar], dx, ymin,
-                specialres['nglHistogramBarWidthPercent'])
-        plot._histbars.append(Ngl.add_polygon(wks, plot, xbar, ybar, fillres))
-        plot._histlines.append(Ngl.add_polyline(wks, plot, xbar, ybar, lineres))
+    for series in xrange(nseries):
+        # Create resources for shading the bars and drawing outlines around
+        # them.
+        fillres = Ngl.Resources()
+        fillres.gsFillColor = fillcolors[series]
+        fillres.gsSegments = segments
+        lineres = Ngl.Resources()
+        lineres.gsLineColor = linecolors[series]
+        lineres.gsSegments = segments
+        # Draw the bars and their outlines.
+        x = xbars[series].ravel()
+        y = ybars[series].ravel()
+        plot._histbars.append(Ngl.add_polygon(wks, plot, x, y, fillres))
+        plot._histlines.append(Ngl.add_polyline(wks, plot, x, y, lineres))
+    stats.count('add_polygon', nseries)
+    stats.count('add_polyline', nseries)
     # Apply drawing and frame advancing if they were specified in the input
     # resources.
     if draw_on:
-        Ngl.draw(plot)
+        with stats.timer('histogram.draw'):
+            Ngl.draw(plot)
+        stats.count('draw')
     if frame_on:
-        Ngl.frame(plot)
+        with stats.timer('histogram.frame'):
+            Ngl.frame(wks)
+        stats.count('frame')
     # Return a plot identifier.
     return plot
 
 
+def _draw_histogram(wks, hist, binedges, res, specialres, draw_on,
+        frame_on):
+    """Draw histogram bars for the given counts and bin edges."""
+    # Compute the outlines of every bar in one go.
+    xbars, ybars = _bar_vertices(binedges[:-1], np.diff(binedges), hist, 0.,
+            specialres['nglHistogramBarWidthPercent'])
+    return _draw_bars(wks, xbars[np.newaxis], ybars[np.newaxis], res,
+            [specialres['nglxHistogramBarColor']],
+            [specialres['nglxHistogramBarOutlineColor']], draw_on, frame_on)
+
+
+def histogram(wks, data, res):
+    """Plot a histogram.
+
+    The NumPy histogram function is used to define the histogram. The
+    bars are drawn as a single segmented polygon with a single segmented
+    polyline outline, so the number of Ngl primitives created does not
+    depend on the number of bins.
+
+    Arguments:
+    wks -- Ngl wrokstation.
+    data -- 1D array of data to construct a histogram from. This may
+        also be a memory-mapped array (numpy.memmap) or an iterable
+        (e.g., a generator) yielding chunks of data, in which case the
+        counts are accumulated one chunk at a time. Chunked input
+        other than a memory-mapped array requires either the
+        'nglxHistogramRange' or 'nglHistogramBinIntervals' resource to
+        fix the bin edges in advance. A QuantileSketch (for example
+        one merged from sketches built by parallel workers) may also
+        be given, in which case the counts are estimated from it.
+    res -- Ngl resources variable. Valid resources are:
+
+        'nglHistogramBarWidthPercent'
+        'nglHistogramBinIntervals'
+        'nglHistogramNumberOfBins'
+        'nglxHistogramRange'
+        'nglxHistogramBarColor'
+        'nglxHistogramBarOutlineColor'
+        'nglxHistogramDensity'
+        'nglxHistogramChunkSize'
+        'nglxHistogramBinSpacing'
+
+        'nglxHistogramBinSpacing' may be 'linear' (default) for equal
+        width bins, 'quantile' for bins containing equal numbers of
+        values, or 'log' for logarithmically spaced bins. Adaptive
+        bins are only used when 'nglHistogramBinIntervals' is not set.
+
+    """
+    res, specialres, draw_on, frame_on = _histogram_resources(res)
+    # Work out the values of histogram parameters.
+    bins = specialres['nglHistogramBinIntervals']
+    if bins is None:
+        bins = specialres['nglHistogramNumberOfBins']
+    hrange = specialres['nglxHistogramRange']
+    density = specialres['nglxHistogramDensity']
+    # Compute the histogram with the NumPy routine, chunk by chunk if the
+    # input data is chunked.
+    with stats.timer('histogram.bin'):
+        hist, binedges = _histogram_counts(data, bins, hrange, density,
+                specialres['nglxHistogramChunkSize'],
+                specialres['nglxHistogramBinSpacing'])
+    return _draw_histogram(wks, hist, binedges, res, specialres, draw_on,
+            frame_on)
+
+
+def histogram_from_counts(wks, counts, binedges, res):
+    """Plot a histogram from precomputed counts.
+
+    No binning is done, the counts are drawn as they are. This allows
+    the binning to be done elsewhere, for example by a distributed job,
+    leaving only the drawing to be done here.
+
+    Arguments:
+    wks -- Ngl workstation.
+    counts -- 1D array of the value (count or density) of each bin.
+    binedges -- 1D array of bin edges, one longer than counts.
+    res -- Ngl resources variable. The resources controlling the
+        appearance of the bars are valid:
+
+        'nglHistogramBarWidthPercent'
+        'nglxHistogramBarColor'
+        'nglxHistogramBarOutlineColor'
+
+        Resources controlling binning are ignored.
+
+    """
+    counts = np.asarray(counts)
+    binedges = np.asarray(binedges, dtype=np.float64)
+    if counts.ndim != 1 or binedges.shape != (len(counts) + 1,):
+        raise ValueError('binedges must have one more element than counts')
+    res, specialres, draw_on, frame_on = _histogram_resources(res)
+    return _draw_histogram(wks, counts, binedges, res, specialres, draw_on,
+            frame_on)
+
+
+def _multi_histogram_counts(data, bins, hrange, density, spacing='linear'):
+    """Compute histograms for each row of a 2D array in one pass.
+
+    All rows are binned over the same bin edges with a single call to
+    numpy.digitize and a single call to numpy.bincount.
+
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim != 2:
+        raise ValueError('data must be 2D (series x samples)')
+    nseries = data.shape[0]
+    # Work out the bin edges shared by all the series.
+    if np.iterable(bins):
+        binedges = np.asarray(bins, dtype=np.float64)
+    else:
+        binedges = _data_bin_edges(data, bins, spacing, hrange)
+    nbins = len(binedges) - 1
+    # Find the bin each value falls in. Bins are half-open except the last
+    # one which includes its right edge, as in numpy.histogram.
+    index = np.digitize(data, binedges) - 1
+    index[data == binedges[-1]] = nbins - 1
+    valid = (index >= 0) & (index < nbins)
+    # Offset the bin index of each series so that all the series can be
+    # counted together.
+    index += nbins * np.arange(nseries)[:, np.newaxis]
+    hist = np.bincount(index[valid], minlength=nseries * nbins)
+    hist = hist.reshape([nseries, nbins])
+    if density:
+        hist = hist / (hist.sum(axis=1)[:, np.newaxis] * np.diff(binedges))
+    return hist, binedges
+
+
+def _series_values(value, nseries):
+    """Expand a resource value to one value per series."""
+    if isinstance(value, basestring) or not np.iterable(value):
+        return [value] * nseries
+    if len(value) != nseries:
+        raise ValueError('expected %d values, one per series' % nseries)
+    return list(value)
+
+
+def multi_histogram(wks, data, res):
+    """Plot histograms of several series on the same axes.
+
+    All series are binned over the same bin edges in one vectorized
+    pass. The bars are drawn on a single base plot, either side by side
+    within each bin ('grouped') or on top of each other ('stacked').
+    One polygon and one polyline are drawn per series.
+
+    Arguments:
+    wks -- Ngl workstation.
+    data -- 2D array of data with shape (series, samples), for example
+        (ensemble members, samples).
+    res -- Ngl resources variable. The resources understood by
+        histogram are valid, except 'nglxHistogramChunkSize'. The
+        resources 'nglxHistogramBarColor' and
+        'nglxHistogramBarOutlineColor' may also be sequences giving
+        one color per series. Additionally:
+
+        'nglxHistogramStyle' -- 'grouped' (default) or 'stacked'.
+
+    """
+    res, specialres, draw_on, frame_on = _histogram_resources(res)
+    # Work out the values of histogram parameters.
+    bins = specialres['nglHistogramBinIntervals']
+    if bins is None:
+        bins = specialres['nglHistogramNumberOfBins']
+    with stats.timer('histogram.bin'):
+        hist, binedges = _multi_histogram_counts(data, bins,
+                specialres['nglxHistogramRange'],
+                specialres['nglxHistogramDensity'],
+                specialres['nglxHistogramBinSpacing'])
+    nseries, nbins = hist.shape
+    width = np.diff(binedges) * specialres['nglHistogramBarWidthPercent']
+    style = specialres['nglxHistogramStyle'].lower()
+    # Compute the position of every bar of every series at once.
+    if style == 'grouped':
+        # Divide each bin between the series.
+        width = width / nseries
+        left = binedges[:-1] + width * np.arange(nseries)[:, np.newaxis]
+        base = np.zeros([nseries, nbins])
+        top = hist
+    elif style == 'stacked':
+        # Each series sits on top of the sum of the previous series.
+        left = np.tile(binedges[:-1], [nseries, 1])
+        top = np.cumsum(hist, axis=0)
+        base = top - hist
+    else:
+        raise ValueError("invalid histogram style '%s'" % style)
+    width = np.tile(width, [nseries, 1])
+    xbars, ybars = _bar_vertices(left.ravel(), width.ravel(), top.ravel(),
+            base.ravel(), 1.)
+    xbars = xbars.reshape([nseries, nbins, 5])
+    ybars = ybars.reshape([nseries, nbins, 5])
+    return _draw_bars(wks, xbars, ybars, res,
+            _series_values(specialres['nglxHistogramBarColor'], nseries),
+            _series_values(specialres['nglxHistogramBarOutlineColor'],
+                nseries),
+            draw_on, frame_on)
+
+
+# The panel resources that determine the positions of the plots in a panel.
+_panel_layout_resources = ('nglPanelRowSpec', 'nglPanelCenter',
+        'nglPanelLeft', 'nglPanelRight', 'nglPanelTop', 'nglPanelBottom',
+        'nglPanelXF', 'nglPanelYF', 'nglPanelXWhiteSpacePercent',
+        'nglPanelYWhiteSpacePercent')
+
+# Layouts that have already been computed, keyed by the dimensions, the
+# panel layout resources and the plot size.
+_panel_layouts = dict()
+_max_panel_layouts = 64
+
+
+class PanelLayout(object):
+    """The positions of the plots in a panel plot.
+
+    The position of the top left corner of every panel is computed once
+    when the layout is created and stored in the arrays x and y, in the
+    order the plots are panelled.
+
+    """
+
+    def __init__(self, dims, plot_width, plot_height, res=None):
+        """Compute a panel layout.
+
+        Arguments:
+        dims -- Dimensions of the panel plot, as for PanelPlot.
+        plot_width -- Width of each plot (vpWidthF).
+        plot_height -- Height of each plot (vpHeightF).
+
+        Optional argument:
+        res -- An Ngl resources object containing panel resources.
+
+        """
+        self.plot_width = plot_width
+        self.plot_height = plot_height
+        # Messages describing problems with the layout, which can be issued
+        # as warnings by the caller.
+        self.problems = []
+        # Get the unified panel specification. These details can be used to
+        # produce the panel plot independently of the user's choice of panel
+        # specification format.
+        self.number_rows, self.number_columns, self.row_spec, \
+                self.number_panels = self._get_panel_spec(dims, res)
+        # Compute the space to be left between plots. This consists of a base
+        # size plus an offset. The offset can be user specified via the
+        # resources variable.
+        self.delta_x, self.delta_y = self._get_plot_spacing(res)
+        # Compute the total width of the panel plot.
+        self.total_width = self.number_columns * self.plot_width + \
+                (self.number_columns - 1) * self.delta_x
+        # Compute the top and left coordinates of the panel plot.
+        self.panel_x0, self.panel_center_x = self._get_panel_xcoord(res)
+        self.panel_y0 = self._get_panel_ycoord(res)
+        # Work out where each of the plots goes.
+        self.x, self.y = self._get_plot_coords(res)
+
+    @classmethod
+    def cached(cls, dims, plot_width, plot_height, res=None):
+        """Return a layout, reusing a previously computed one if possible.
+
+        Arguments are as for PanelLayout.
+
+        """
+        key = (tuple(dims), plot_width, plot_height,
+                tuple(getattr(res, name, None)
+                      for name in _panel_layout_resources))
+        try:
+            return _panel_layouts[key]
+        except KeyError:
+            pass
+        layout = cls(dims, plot_width, plot_height, res)
+        if len(_panel_layouts) >= _max_panel_layouts:
+            _panel_layouts.clear()
+        _panel_layouts[key] = layout
+        return layout
+
+    def _get_panel_spec(self, dims, res):
+        """Generate a panel row specification and useful information."""
+        is_row_spec = getattr(res, 'nglPanelRowSpec', False)
+        if is_row_spec:
+            # The given dimensions are in 'row spec' format, where each entry
+            # in the dimensions array specifies the number of plots on that
+            # row.
+            for row_spec in dims:
+                # Check the validity of each row specification, the number
+                # must be positive.
+                if row_spec < 1:
+                    raise ValueError('a positive number of plots is required')
+            # The row spec is as given by the dimensions so just store it.
+            row_spec = list(dims)
+            # Also store the number of panels requested, and the number of
+            # rows and columns. The number of columns is the maximum of all
+            # the rows.
+            npanels = sum(dims)
+            nrows = len(dims)
+            ncols = max(dims)
+        else:
+            # The given dimensions specify a grid as [rows, columns]. We need
+            # to construct a corresponding row spec so that only one method
+            # needs to be considered throughout this code.
+            if len(dims) != 2:
+                # Check that the dimension specification is a valid grid.
+                raise ValueError('invalid dimension')
+            # Store the number of rows and columns in the grid.
+            nrows, ncols = dims
+            npanels = nrows * ncols
+            # Construct an equivalent 'row spec' format specification for the
+            # grid.
+            row_spec = [ncols] * nrows
+        return (nrows, ncols, row_spec, npanels)
+
+    def _get_plot_spacing(self, res):
+        """Work out the spacing between individual panels."""
+        base_x = 0.04
+        offset_x = getattr(res, 'nglPanelXWhiteSpacePercent', 0.) / \
+                100. * self.plot_width
+        base_y = 0.05
+        offset_y = getattr(res, 'nglPanelYWhiteSpacePercent', 0.) / \
+                100. * self.plot_height
+        return (base_x + offset_x, base_y + offset_y)
+
+    def _get_panel_xcoord(self, res):
+        """Generate the x coordinate of the left edge of the panel."""
+        ngl_panel_x = getattr(res, 'nglPanelXF', None)
+        ngl_panel_left = getattr(res, 'nglPanelLeft', 0.)
+        ngl_panel_right = getattr(res, 'nglPanelRight', 1.)
+        if ngl_panel_x is None:
+            # The x coordinate of the left edge is not explicitly defined, so
+            # we should try to center the plot in the middle of the available
+            # workstation. The available workstation is defined by the user.
+            panel_center_x = (ngl_panel_left + ngl_panel_right) / 2.
+            ngl_panel_x = panel_center_x - 0.5 * self.total_width
+            if ngl_panel_x < ngl_panel_left:
+                self.problems.append(
+                        'panel is too wide for available workstation area')
+        else:
+            # If ngl_panel_x is defined we use all the space to the right that
+            # is available to us.
+            panel_center_x = ngl_panel_x + 0.5 * self.total_width
+        return ngl_panel_x, panel_center_x
+
+    def _get_panel_ycoord(self, res):
+        """Generate the y coordinate of the top edge of the panel."""
+        ngl_panel_y = getattr(res, 'nglPanelYF', None)
+        ngl_panel_top = getattr(res, 'nglPanelTop', 1.)
+        if ngl_panel_y is None:
+            # The y coordinate of the top edge is not explicitly defined, so
+            # we pick a default offset from the top of the available
+            # workstation.
+            ngl_panel_y = ngl_panel_top - 0.07
+            if ngl_panel_y > 1:
+                self.problems.append(
+                        'panel is placed off the bottom of the workstation')
+        return ngl_panel_y
+
+    def _get_plot_coords(self, res):
+        """
+        Generate the coordinates of the top left corner of each panel.
+
+        """
+        # How short rows are position can be user specified.
+        ngl_panel_center = getattr(res, 'nglPanelCenter', True)
+        # The row and column of each panel.
+        row_spec = np.array(self.row_spec)
+        rows = np.repeat(np.arange(self.number_rows), row_spec)
+        columns = np.concatenate([np.arange(n) for n in row_spec])
+        # Compute the x coordinate of the left edge of each row. Rows are
+        # started at the left edge of the panel unless they are short rows
+        # and centering is required.
+        row_x0 = np.empty(self.number_rows)
+        row_x0[:] = self.panel_x0
+        if ngl_panel_center:
+            short = row_spec < self.number_columns
+            widths = row_spec * self.plot_width + \
+                    (row_spec - 1) * self.delta_x
+            row_x0[short] = self.panel_center_x - 0.5 * widths[short]
+        xpos = row_x0[rows] + columns * (self.plot_width + self.delta_x)
+        ypos = self.panel_y0 - rows * (self.plot_height + self.delta_y)
+        return xpos, ypos
+
+
+def _at_position(plot, position):
+    """Determine if the viewport of a plot is at a position."""
+    # Ngl stores the position in single precision.
+    x, y = position
+    return abs(Ngl.get_float(plot, 'vpXF') - x) < 1e-6 and \
+            abs(Ngl.get_float(plot, 'vpYF') - y) < 1e-6
+
+
 class PanelPlot(object):
     """Create panel plots from individual plots."""
 
@@ -171,11 +735,22 @@ class PanelPlot(object):
 
     def __call__(self, wks, plots, dims, res=None):
         """Panel a collection of plots.
+
+        The layout of the panel is cached, so panelling plots of the same
+        size with the same dimensions and panel resources again (e.g.,
+        for each frame of an animation) does not recompute it. Plots
+        that are already in position (e.g., from a previous call) are
+        not repositioned.
         
         Arguments:
         wks -- An Ngl workstation to plot onto.
         plots -- A collection of plots to put together into a panel
-            plot.
+            plot. An entry may also be a callable taking the workstation
+            as its only argument and returning a plot (created with
+            nglDraw and nglFrame set to False). Such a plot is built
+            only when its panel is drawn and is destroyed once it has
+            been drawn, so that only one of these plots is held in
+            memory at a time.
         dims -- Dimensions of the panel plot. It should be specified as
             (rows, cols) or, if the panel resource 'nglPanelRowSpec' is
             set to True, as (cols0, cols1, cols2) where each entry
@@ -200,59 +775,97 @@ class PanelPlot(object):
             'nglPanelTitleFontColor'
             'nglPanelTitleOffsetXF'
             'nglPanelTitleOffsetYF'
-            'nglPanelFigureStrings'            X not implemented
+            'nglPanelFigureStrings'
+            'nglPanelFigureStringsFont'
+            'nglPanelFigureStringsFontColor'
+            'nglPanelFigureStringsFontHeightF'
             'nglPanelLabelBar'                 X not implemented
             'nglPanelDebug'
        
         """
-        # Get the unified panel specification. These details can be used to
-        # produce the panel plot independently of the user's choice of panel
-        # specification format.
-        self.number_rows, self.number_columns, self.row_spec, \
-                self.number_panels = self._get_panel_spec(dims, res)
-        # Get the number of plots that can actually be plotted. We cannot plot
-        # more plots than panels that are defined.
-        self.number_plots = self._get_number_plots(plots)
+        # Plots built from a factory before they are drawn, keyed by their
+        # index in the list of plots.
+        self._built = dict()
+        try:
+            with stats.timer('panel.layout'):
+                self._layout(wks, plots, dims, res)
+            # Draw each plot on the workstation.
+            with stats.timer('panel.draw'):
+                self._draw_plots(wks, plots, res)
+        finally:
+            # A template plot built only to find the plot size may not have
+            # been drawn if its panel was truncated or drawing failed.
+            for plot in self._built.values():
+                Ngl.destroy(plot)
+            self._built.clear()
+        # Draw panel labels and a main title if required.
+        with stats.timer('panel.annotate'):
+            self._draw_panel_labels(wks, plots, res)
+            self._draw_main_title(wks, res)
+        # Finish the panelling by advancing the frame unless requested not to.
+        if getattr(res, 'nglPanelFrame', True):
+            with stats.timer('panel.frame'):
+                Ngl.frame(wks)
+            stats.count('frame')
+
+    def _layout(self, wks, plots, dims, res):
+        """Work out the position of each plot in the panel."""
         # Retrieve the width and height of the plots from the plot objects.
         # Only one plot is considered and the others assumed to be the same
         # size. Unless otherwise specified, the plot this information comes
         # from will be the first plot.
-        self.plot_width, self.plot_height = \
-                self._get_plot_dimensions(plots, res)
-        # Compute the space to be left between plots. This consists of a base
-        # size plus an offset. The offset can be user specified via the
-        # resources variable.
-        self.delta_x, self.delta_y = self._get_plot_spacing(res)
-        # Compute the total width of the panel plot.
-        self.total_width = self.number_columns * self.plot_width + \
-                (self.number_columns - 1) * self.delta_x
-        # Compute the top and left coordinates of the panel plot.
-        self.panel_x0, self.panel_center_x = self._get_panel_xcoord(res)
-        self.panel_y0 = self._get_panel_ycoord(res)
-        # Work out where to draw each of the plots.
-        self.plot_coordinates = self._get_plot_coords(res)
-        # Draw each plot on the workstation.
-        self._draw_plots(plots, res)
-        # Draw panel labels if required.
-        self._draw_panel_labels(wks, res)
-        # Draw a main title if required.
-        self._draw_main_title(wks, res)
-        # Finish the panelling by advancing the frame unless requested not to.
-        if getattr(res, 'nglPanelFrame', True):
-            Ngl.frame(wks)
+        plot_width, plot_height = self._get_plot_dimensions(wks, plots, res)
+        self.layout = PanelLayout.cached(dims, plot_width, plot_height, res)
+        if self._warnings_on:
+            for problem in self.layout.problems:
+                warnings.warn(problem)
+        # Get the number of plots that can actually be plotted. We cannot plot
+        # more plots than panels that are defined.
+        self.number_plots = self._get_number_plots(plots)
 
-    def _draw_plots(self, plots, res):
+    def _draw_plots(self, wks, plots, res):
         """Draw the provided plots."""
-        for plot in xrange(self.number_plots):
+        layout = self.layout
+        for index in xrange(self.number_plots):
+            plot = plots[index]
+            factory = callable(plot)
+            if factory:
+                # Build the plot just before it is drawn.
+                plot = self._build_plot(wks, plots, index)
             # It is OK for a plot to be None, it will just be skipped. This
             # allows the user to have a lot of control over their panel plot.
-            if plots[plot] is not None:
-                # Set the position of the plot.
-                res_pos = Ngl.Resources()
-                res_pos.vpXF, res_pos.vpYF = self.plot_coordinates[plot]
-                Ngl.set_values(plots[plot], res_pos)
+            if plot is None:
+                continue
+            try:
+                # Set the position of the plot, unless it is already there
+                # (e.g., it was put there by a previous panel plot). A plot
+                # built from a factory is new so its position is always set.
+                position = (float(layout.x[index]), float(layout.y[index]))
+                if factory or not _at_position(plot, position):
+                    res_pos = Ngl.Resources()
+                    res_pos.vpXF, res_pos.vpYF = position
+                    Ngl.set_values(plot, res_pos)
+                    stats.count('set_values')
                 # Draw to plot.
-                Ngl.draw(plots[plot])
+                Ngl.draw(plot)
+                stats.count('draw')
+            finally:
+                if factory:
+                    # The plot is not needed again, so free it before the
+                    # next plot is built.
+                    Ngl.destroy(plot)
+                    stats.count('destroy')
+
+    def _build_plot(self, wks, plots, index):
+        """Build the plot for a panel from its factory."""
+        try:
+            return self._built.pop(index)
+        except KeyError:
+            pass
+        with stats.timer('panel.build'):
+            plot = plots[index](wks)
+        stats.count('panel_build')
+        return plot
 
     def _draw_main_title(self, wks, res):
         """Draw a title string above the panel plot."""
@@ -273,17 +886,19 @@ class PanelPlot(object):
             txres.txJust = 'BottomCenter'
             # Work out the center coordinate of the title, this is the same
             # for each line of a multi-line title.
-            title_x = self.panel_center_x + getattr(res,
+            title_x = self.layout.panel_center_x + getattr(res,
                     'nglPanelTitleOffsetXF', 0.)
             for i, t in enumerate(panel_titles):
                 # For each line of a multi-line title (just one for a single
                 # line title) work out the y coordinate and then draw the text
                 # on the workstation.
-                title_y = self.panel_y0 + 0.04 + \
+                title_y = self.layout.panel_y0 + 0.04 + \
                         (i+ (i * 0.5)) * txres.txFontHeightF
                 Ngl.text_ndc(wks, t, title_x, title_y, txres)
+                stats.count('text_ndc')
 
-    def _draw_panel_labels(self, wks, res):
+    def _draw_panel_labels(self, wks, plots, res):
+        """Draw a label at the top left corner of each plot."""
         ngl_panel_figure_strings = getattr(res, 'nglPanelFigureStrings', None)
         if ngl_panel_figure_strings is not None:
             txres = Ngl.Resources()
@@ -294,150 +909,42 @@ class PanelPlot(object):
                     'nglPanelFigureStringsFontColor', 1)
             txres.txFont = getattr(res,
                     'nglPanelFigureStringsFont',
-                    defaults['font']['labels'])
+                    defaults['font']['ngl'])
             txres.txJust = 'BottomRight'
-            for plot in self.number_plots:
-                plot_x, plot_y = self.plot_positions[plot]
-                label_x = plot_x - 0.03
-                label_y = plot_y + 0.03
+            nlabels = min(self.number_plots, len(ngl_panel_figure_strings))
+            for plot in xrange(nlabels):
+                if plots[plot] is None:
+                    # Panels without a plot are not labelled.
+                    continue
+                label_x = self.layout.x[plot] - 0.03
+                label_y = self.layout.y[plot] + 0.03
                 Ngl.text_ndc(wks, ngl_panel_figure_strings[plot], label_x,
                         label_y, txres)
-
-    def _get_panel_spec(self, dims, res):
-        """Generate a panel row specification and useful information."""
-        is_row_spec = getattr(res, 'nglPanelRowSpec', False)
-        if is_row_spec:
-            # The given dimensions are in 'row spec' format, where each entry
-            # in the dimensions array specifies the number of plots on that
-            # row.
-            for row_spec in dims:
-                # Check the validity of each row specification, the number
-                # must be positive.
-                if row_spec < 1:
-                    raise ValueError('a positive number of plots is required')
-            # The row spec is as given by the dimensions so just store it.
-            row_spec = dims
-            # Also store the number of panels requested, and the number of
-            # rows and columns. The number of columns is the maximum of all
-            # the rows.
-            npanels = sum(dims)
-            nrows = len(dims)
-            ncols = max(dims)
-        else:
-            # The given dimensions specify a grid as [rows, columns]. We need
-            # to construct a corresponding row spec so that only one method
-            # needs to be considered throughout this code.
-            if len(dims) != 2:
-                # Check that the dimension specification is a valid grid.
-                raise ValuError('invalid dimension')
-            # Store the number of rows and columns in the grid.
-            nrows, ncols = dims
-            npanels = nrows * ncols
-            # Construct an equivalent 'row spec' format specification for the
-            # grid.
-            row_spec = [ncols] * nrows
-        return (nrows, ncols, row_spec, npanels)
+                stats.count('text_ndc')
 
     def _get_number_plots(self, plots):
         """Get the number of plots that can actually be panelled."""
         nplots = len(plots)
-        if nplots > self.number_panels:
-            nplots = self.number_panels
+        if nplots > self.layout.number_panels:
+            nplots = self.layout.number_panels
             if self._warnings_on:
                 warnings.warn('more plots than defined panels, truncating')
         return nplots
 
-    def _get_plot_dimensions(self, plots, res):
+    def _get_plot_dimensions(self, wks, plots, res):
         """Get the dimensions of the plots to be panelled."""
         # Select the index of the plot to get the size from.
         base_plot = getattr(res, 'nglPanelScalePlotIndex', 0)
-        pwidth = Ngl.get_float(plots[base_plot], 'vpWidthF')
-        pheight = Ngl.get_float(plots[base_plot], 'vpHeightF')
+        template = plots[base_plot]
+        if callable(template):
+            # The template plot has to be built to find its size. It is kept
+            # until its panel is drawn rather than being built twice.
+            template = self._build_plot(wks, plots, base_plot)
+            self._built[base_plot] = template
+        pwidth = Ngl.get_float(template, 'vpWidthF')
+        pheight = Ngl.get_float(template, 'vpHeightF')
         return pwidth, pheight
 
-    def _get_plot_spacing(self, res):
-        """Work out the spacing between individual panels."""
-        base_x = 0.04
-        offset_x = getattr(res, 'nglPanelXWhiteSpacePercent', 0.) / \
-                100. * self.plot_width
-        base_y = 0.05
-        offset_y = getattr(res, 'nglPanelYWhiteSpacePercent', 0.) / \
-                100. * self.plot_height
-        return (base_x + offset_x, base_y + offset_y)
-
-    def _get_panel_xcoord(self, res):
-        """Generate the x coordinate of the left edge of the panel."""
-        ngl_panel_x = getattr(res, 'nglPanelXF', None)
-        ngl_panel_left = getattr(res, 'nglPanelLeft', 0.)
-        ngl_panel_right = getattr(res, 'nglPanelRight', 1.)
-        if ngl_panel_x is None:
-            # The x coordinate of the left edge is not explicitly defined, so
-            # we should try to center the plot in the middle of the available
-            # workstation. The available workstation is defined by the user.
-            panel_center_x = (ngl_panel_left + ngl_panel_right) / 2.
-            ngl_panel_x = panel_center_x - 0.5 * self.total_width
-            if ngl_panel_x < ngl_panel_left:
-                if self.warnings_on:
-                    warnings.warn(
-                           'panel is too wide for available workstation area')
-        else:
-            # If ngl_panel_x is defined we use all the space to the right that
-            # is available to us.
-            panel_center_x = ngl_panel_x + 0.5 * self.total_width
-        return ngl_panel_x, panel_center_x
-
-    def _get_panel_ycoord(self, res):
-        """Generate the y coordinate of the top edge of the panel."""
-        ngl_panel_y = getattr(res, 'nglPanelYF', None)
-        ngl_panel_top = getattr(res, 'nglPanelTop', 1.)
-        ngl_panel_bottom = getattr(res, 'nglPanelBottom', 0.)
-        if ngl_panel_y is None:
-            # The y coordinate of the top edge is not explicitly defined, so
-            # we pick a default offset from the top of the available
-            # workstation.
-            ngl_panel_y = ngl_panel_top - 0.07
-            if ngl_panel_y > 1:
-                if self._warnings_on:
-                    warnings.warn(
-                          'panel is placed off the bottom of the workstation')
-        return ngl_panel_y
-
-    def _get_plot_coords(self, res):
-        """
-        Generate the coordinates of the top left corner of each  plot.
-        
-        """
-        # How short rows are position can be user specified.
-        ngl_panel_center = getattr(res, 'nglPanelCenter', True)
-        # Create empty lists for the x and y coordinates.
-        xpos, ypos = list(), list()
-        # Use the row specification to determine the positions of each plot.
-        panel_counter = 0
-        for row in xrange(self.number_rows):
-            ncols = self.row_spec[row]
-            for col in xrange(ncols):
-                panel_counter += 1
-                if panel_counter > self.number_plots:
-                    # If there are no more plots there is no point working out
-                    # any more plot positions so we just stop early.
-                    break
-                # Compute the x coordinate of the plot.
-                if ngl_panel_center and ncols < self.number_columns:
-                    # The panel is on a short row and centering is required.
-                    width = ncols * self.plot_width + \
-                            (ncols - 1) * self.delta_x
-                    x0 = self.panel_center_x - 0.5 * width
-                    xpos.append(x0 + col * (self.plot_width + self.delta_x))
-                else:
-                    # The panel is on a full row or no centering is required.
-                    xpos.append(self.panel_x0 + \
-                            col * (self.plot_width + self.delta_x))
-                # Compute the y coordinate of the plot.
-                ypos.append(self.panel_y0 - \
-                        row * (self.plot_height + self.delta_y))
-        # Return a list of (x, y) coordinate pairs, one for each plot.
-        return zip(xpos, ypos)
-
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,231 @@
+"""mergeable quantile sketches for adaptive histogram binning"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+
+class QuantileSketch(object):
+    """A mergeable, fixed-memory summary of the distribution of data.
+
+    The sketch is a simplified KLL sketch. Values are stored in a stack
+    of levels, the values at level h each representing 2**h original
+    values. When a level becomes full it is sorted and every other
+    value is promoted to the next level. Memory use is proportional to
+    the accuracy parameter k, not to the amount of data seen.
+
+    Sketches built independently (e.g., by parallel workers) can be
+    combined with merge before being used to choose histogram bins.
+
+    """
+
+    def __init__(self, k=200, seed=None):
+        """Create an empty sketch.
+
+        Optional arguments:
+        k -- Accuracy parameter. Larger values give more accurate
+            quantiles at the expense of more memory. Defaults to 200.
+        seed -- Seed for the random choices made when compacting.
+
+        """
+        self.k = k
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        # The smallest positive value is needed for log-spaced bins.
+        self.min_positive = np.inf
+        self._levels = [np.empty(0)]
+        self._random = np.random.RandomState(seed)
+
+    def update(self, values):
+        """Add values to the sketch. Returns the sketch.
+
+        Argument:
+        values -- Array of values. Non-finite values are ignored.
+
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size:
+            self.count += values.size
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            positive = values[values > 0]
+            if positive.size:
+                self.min_positive = min(self.min_positive, positive.min())
+            self._levels[0] = np.concatenate([self._levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """Merge another sketch into this one. Returns the sketch.
+
+        Argument:
+        other -- A QuantileSketch.
+
+        """
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.min_positive = min(self.min_positive, other.min_positive)
+        self._compress()
+        return self
+
+    def _capacity(self, level):
+        """Maximum number of values held at a level."""
+        # Lower levels get geometrically smaller capacities, as in KLL.
+        depth = len(self._levels) - level - 1
+        return max(int(np.ceil(self.k * (2. / 3.) ** depth)), 2)
+
+    def _compress(self):
+        """Compact any levels that are over capacity."""
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd value out stays at this level, every other one of
+                # the rest (starting at random) is promoted.
+                keep = items[items.size - items.size % 2:]
+                items = items[:items.size - items.size % 2]
+                offset = self._random.randint(2)
+                self._levels[level + 1] = np.concatenate(
+                        [self._levels[level + 1], items[offset::2]])
+                self._levels[level] = keep
+            level += 1
+
+    def _weighted_values(self):
+        """Sorted retained values and their cumulative weights."""
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.repeat(2. ** level, items.size)
+                for level, items in enumerate(self._levels)])
+        order = np.argsort(values, kind='mergesort')
+        return values[order], np.cumsum(weights[order])
+
+    def rank(self, x, side='right'):
+        """Estimate the number of values less than or equal to x.
+
+        Arguments:
+        x -- A value or array of values.
+
+        Optional argument:
+        side -- If 'left' estimate the number of values strictly less
+            than x instead. Defaults to 'right'.
+
+        """
+        x = np.asarray(x, dtype=np.float64)
+        rank = np.zeros(x.shape)
+        for level, items in enumerate(self._levels):
+            rank += np.searchsorted(np.sort(items), x, side=side) * \
+                    2. ** level
+        return rank
+
+    def quantiles(self, q):
+        """Estimate quantiles of the data.
+
+        Argument:
+        q -- A quantile or array of quantiles in the range [0, 1].
+
+        """
+        if not self.count:
+            raise ValueError('cannot compute quantiles of an empty sketch')
+        q = np.asarray(q, dtype=np.float64)
+        values, cumweights = self._weighted_values()
+        index = np.searchsorted(cumweights, q * cumweights[-1], side='left')
+        result = values[np.clip(index, 0, values.size - 1)]
+        # The extremes are known exactly.
+        result = np.where(q <= 0, self.min, result)
+        result = np.where(q >= 1, self.max, result)
+        return result
+
+    def histogram(self, binedges, density=False):
+        """Estimate histogram counts over the given bin edges.
+
+        Bins are half-open except the last, which includes its right
+        edge, as in numpy.histogram.
+
+        """
+        binedges = np.asarray(binedges, dtype=np.float64)
+        cdf = self.rank(binedges)
+        cdf[0] = self.rank(binedges[0], side='left')
+        hist = np.diff(cdf)
+        if density:
+            hist = hist / (hist.sum() * np.diff(binedges))
+        return hist
+
+    def bin_edges(self, nbins, spacing='quantile', hrange=None):
+        """Choose histogram bin edges from the sketch.
+
+        See the function bin_edges for details.
+
+        """
+        if not self.count:
+            raise ValueError('cannot compute bin edges of an empty sketch')
+        return bin_edges(nbins, spacing, self.quantiles, self.min, self.max,
+                self.min_positive, hrange=hrange)
+
+
+def bin_edges(nbins, spacing, quantiles, vmin, vmax, vmin_positive,
+        hrange=None):
+    """Choose histogram bin edges.
+
+    Arguments:
+    nbins -- The number of bins. Fewer bins may be returned for
+        'quantile' spacing if some quantiles coincide.
+    spacing -- 'linear' for equal-width bins, 'quantile' for bins
+        containing equal numbers of values, or 'log' for bins equally
+        spaced in the logarithm of the data.
+    quantiles -- A function returning the values of an array of
+        quantiles in [0, 1].
+    vmin, vmax -- Minimum and maximum of the data.
+    vmin_positive -- Smallest positive value in the data.
+
+    Optional argument:
+    hrange -- (min, max) limits used for 'linear' and 'log' spacing
+        instead of those of the data. Ignored for 'quantile' spacing.
+
+    """
+    spacing = spacing.lower()
+    if spacing == 'quantile':
+        return np.unique(quantiles(np.linspace(0., 1., nbins + 1)))
+    if hrange is None:
+        hrange = (vmin, vmax)
+    lo, hi = hrange
+    if spacing == 'linear':
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        return np.linspace(lo, hi, nbins + 1)
+    if spacing == 'log':
+        if lo <= 0:
+            # Zero and negative values cannot be placed on a log scale, so
+            # start from the smallest positive value.
+            lo = vmin_positive
+        if not 0 < lo < hi < np.inf:
+            raise ValueError('log-spaced bins require positive data')
+        return np.logspace(np.log10(lo), np.log10(hi), nbins + 1)
+    raise ValueError("invalid bin spacing '%s'" % spacing)
+
+
+if __name__ == '__main__':
+    pass
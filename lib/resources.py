@@ -22,9 +22,95 @@ import Ngl
 from defaults import ngldefaults as defaults
 
 
+def _resources_attributes():
+    """Build the default attributes of a Resources object."""
+    return {
+            # By default we do not want plots to be drawn on the workstation
+            # or the workstation frame to be advanced.
+            'nglDraw': False,
+            'nglFrame': False,
+            # We want the user to specify the size of the plot.
+            'nglMaximize': False,
+            # Define the font size to be used for some of the standard plot
+            # elements. The defaults system is used to set these values. The
+            # user may change the defaults.
+            'tiMainFontHeightF': defaults['fontheight']['title'],
+            'tiXAxisFontHeightF': defaults['fontheight']['axistitle'],
+            'tiYAxisFontHeightF': defaults['fontheight']['axistitle'],
+            'tmXBLabelFontHeightF': defaults['fontheight']['axislabel'],
+            'tmXTLabelFontHeightF': defaults['fontheight']['axislabel'],
+            'tmYLLabelFontHeightF': defaults['fontheight']['axislabel'],
+            'tmYRLabelFontHeightF': defaults['fontheight']['axislabel'],
+            # Define the fonts to be used for some standard plot elements.
+            # Again these values come from the defaults system.
+            'tiMainFont': defaults['font']['title'],
+            'tiXAxisFont': defaults['font']['axistitle'],
+            'tiYAxisFont': defaults['font']['axistitle'],
+            'tmXBLabelFont': defaults['font']['axislabel'],
+            'tmXTLabelFont': defaults['font']['axislabel'],
+            'tmYLLabelFont': defaults['font']['axislabel'],
+            'tmYRLabelFont': defaults['font']['axislabel'],
+            # Set the length of tick marks.
+            'tmXBMajorLengthF': defaults['ticksize']['major'],
+            'tmXTMajorLengthF': defaults['ticksize']['major'],
+            'tmYLMajorLengthF': defaults['ticksize']['major'],
+            'tmYRMajorLengthF': defaults['ticksize']['major'],
+            'tmXBMinorLengthF': defaults['ticksize']['minor'],
+            'tmXTMinorLengthF': defaults['ticksize']['minor'],
+            'tmYLMinorLengthF': defaults['ticksize']['minor'],
+            'tmYRMinorLengthF': defaults['ticksize']['minor'],
+    }
+
+
+def _map_resources_attributes():
+    """Build the default attributes of a MapResources object."""
+    attributes = _resources_attributes()
+    attributes.update({
+            # Turn off the map grid.
+            'mpGridAndLimbOn': False,
+            # Allow the aspect ratio of a map to be anything the user wants.
+            'mpShapeMode': 'FreeAspect',
+            # Turn on tick marks for the top and right map edges.
+            'tmXTOn': True,
+            'tmYROn': True,
+            # The labelbar orientation is stored in a variable hidden from
+            # Ngl, see MapResources.__init__.
+            '__lbOrientation__': 'Horizontal',
+            'lbLabelFont': defaults['font']['axislabel'],
+    })
+    return attributes
+
+
+# Prototype attribute dictionaries, built once for each version of the
+# defaults. The keys are the functions that build them, the values are
+# (defaults version, attributes) pairs.
+_prototypes = dict()
+
+
+def _prototype(build):
+    """Return the prototype attributes built by a function.
+
+    The prototype is rebuilt if the defaults have changed since it was
+    last built. Changes to the rc file are checked for no more often
+    than they are when looking up a default.
+
+    """
+    defaults.check()
+    version = defaults.version
+    prototype = _prototypes.get(build)
+    if prototype is None or prototype[0] != version:
+        prototype = (version, build())
+        _prototypes[build] = prototype
+    return prototype[1]
+
+
 class Resources(object, Ngl.Resources):
     """
     Wrapper for Ngl.Resources allowing for some resources to be pre-set.
+
+    The pre-set resources are copied from a prototype that is only
+    rebuilt when the defaults change, so creating resources objects is
+    cheap.
     
     """
 
@@ -38,40 +124,8 @@ class Resources(object, Ngl.Resources):
             # has no __init__ method, but we do this in case one is added in
             # the future.
             pass
-        # By default we do not want plots to be drawn on the workstation or
-        # the workstation frame to be advanced.
-        self.nglDraw = False
-        self.nglFrame = False
-        # We want the user to specify the size of the plot.
-        self.nglMaximize = False
-        # Define the font size to be used for some of the standard plot
-        # elements. The defaults system is used to set these values. The user
-        # may change the defaults.
-        self.tiMainFontHeightF = defaults['fontheight']['title']
-        self.tiXAxisFontHeightF = defaults['fontheight']['axistitle']
-        self.tiYAxisFontHeightF = defaults['fontheight']['axistitle']
-        self.tmXBLabelFontHeightF = defaults['fontheight']['axislabel']
-        self.tmXTLabelFontHeightF = defaults['fontheight']['axislabel']
-        self.tmYLLabelFontHeightF = defaults['fontheight']['axislabel']
-        self.tmYRLabelFontHeightF = defaults['fontheight']['axislabel']
-        # Define the fonts to be used for some standard plot elements. Again
-        # these values come from the defaults system.
-        self.tiMainFont = defaults['font']['title']
-        self.tiXAxisFont = defaults['font']['axistitle']
-        self.tiYAxisFont = defaults['font']['axistitle']
-        self.tmXBLabelFont = defaults['font']['axislabel']
-        self.tmXTLabelFont = defaults['font']['axislabel']
-        self.tmYLLabelFont = defaults['font']['axislabel']
-        self.tmYRLabelFont = defaults['font']['axislabel']
-        # Set the length of tick marks.
-        self.tmXBMajorLengthF = defaults['ticksize']['major']
-        self.tmXTMajorLengthF = defaults['ticksize']['major']
-        self.tmYLMajorLengthF = defaults['ticksize']['major']
-        self.tmYRMajorLengthF = defaults['ticksize']['major']
-        self.tmXBMinorLengthF = defaults['ticksize']['minor']
-        self.tmXTMinorLengthF = defaults['ticksize']['minor']
-        self.tmYLMinorLengthF = defaults['ticksize']['minor']
-        self.tmYRMinorLengthF = defaults['ticksize']['minor']
+        # Set all the default resources in one go.
+        self.__dict__.update(_prototype(_resources_attributes))
 
 
 class MapResources(Resources):
@@ -79,40 +133,32 @@ class MapResources(Resources):
 
     def __init__(self, dims=None):
         """Create a map resources object."""
-        # Call the parent class constructor to inherit all the base resources.
-        super(MapResources, self).__init__()
-#        Resources.__init__(self)
+        try:
+            # Call the Ngl.Resources constructor in case it sets anything. The
+            # Resources constructor is not needed since the prototype for map
+            # resources includes all the base resources.
+            Ngl.Resources.__init__(self)
+        except:
+            pass
+        # Set all the default resources in one go. These include the size,
+        # orientation and position of a plot labelbar. The orientation is
+        # stored in a variable hidden from Ngl by a leading double
+        # underscore. Unfortunately Python's name mangling scheme will convert
+        # this to _MapResources__lbOrientation, something Ngl will find,
+        # unless a trailing underscore is added to the name. This variable is
+        # hidden from Ngl so that the property access can be used instead.
+        # This allows the size of the labelbar to be changed dynamically as
+        # the orientation changes.
+        self.__dict__.update(_prototype(_map_resources_attributes))
         # Set the plot size if provided.
         if dims is not None:
             self.vpWidthF, self.vpHeightF = dims
-        # Turn off the map grid.
-        self.mpGridAndLimbOn = False
-        # Allow the aspect ratio of a map to be anything the user wants.
-        self.mpShapeMode = 'FreeAspect'
-        # Turn on tick marks for the top and right map edges.
-        self.tmXTOn = True
-        self.tmYROn = True
-        # Define the size, orientation and position of a plot labelbar. The
-        # orientation is stored in a variable hidden from Ngl by a leading
-        # double underscore. Unfortunately Python's name mangling scheme will
-        # convert this to _MapResources__lbOrientation, something Ngl will
-        # find, unless a trailing underscore is added to the name. This 
-        # variable is hidden from Ngl so that the property access can be used
-        # instead. This allows the size of the labelbar to be changed
-        # dynamically as the orientation changes.
-        self.__lbOrientation__ = 'Horizontal'
-        self.lbLabelFont = defaults['font']['axislabel']
-        try:
-            # Try to set the labelbar size and font height. This depends on
-            # knowing the plot height in advance.
+            # Set the labelbar size and font height. This depends on knowing
+            # the plot size in advance.
             self.pmLabelBarHeightF = 0.02 / self.vpHeightF
             self.lbLabelFontHeightF = defaults['fontheight']['axislabel'] * \
                     0.6 / self.vpWidthF
             self.pmLabelBarWidthF = 0.6
-        except AttributeError:
-            # If the plot height is not known then we can't set the labelbar
-            # size, just carry on without doing it.
-            pass
         # Also define the default format of labelbar labels.
         #self.lbLabelFormat = defaults['format']['labelbar']
 
@@ -0,0 +1,407 @@
+"""plots that are kept and updated in place"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import Ngl
+
+import plotting
+from instrumentation import stats
+from modification import ModificationManager, ResourceOverlay
+from modifiers import NglStrings
+
+
+# The data arguments of each plotting function that can be updated in place.
+# Each data argument is described by the member of the plot holding the data
+# and the resource the data is stored in.
+_scalar_data = (('sffield', 'sfDataArray'),)
+_vector_data = (('vffield', 'vfUDataArray'), ('vffield', 'vfVDataArray'))
+_data_arguments = {
+        'contour': _scalar_data,
+        'contour_map': _scalar_data,
+        'streamline': _vector_data,
+        'streamline_map': _vector_data,
+        'streamline_scalar': _vector_data + _scalar_data,
+        'streamline_scalar_map': _vector_data + _scalar_data,
+        'vector': _vector_data,
+        'vector_map': _vector_data,
+        'vector_scalar': _vector_data + _scalar_data,
+        'vector_scalar_map': _vector_data + _scalar_data,
+}
+
+# The members of a plot that resources are set on, by resource name prefix.
+# The first member that exists in the plot is used. Resources with other
+# prefixes are set on the base plot.
+_data_plots = ('contour', 'vector', 'streamline')
+_resource_members = (
+        ('sf', ('sffield',)),
+        ('vf', ('vffield',)),
+        ('cn', ('contour',)),
+        ('vc', ('vector',)),
+        ('st', ('streamline',)),
+        ('mp', ('map',)),
+        # Labelbars belong to the plot being labelled.
+        ('lb', _data_plots),
+        ('pmLabelBar', _data_plots),
+)
+
+# Special resources that can be changed without rebuilding a plot.
+_updatable_special = frozenset(NglStrings.resource_names) | \
+        frozenset(['nglDraw', 'nglFrame'])
+
+# Marker for missing resources.
+_missing = object()
+
+
+def _resource_values(res):
+    """Return a dictionary of the resources set in a resources object."""
+    if res is None:
+        return dict()
+    return dict((name, value) for name, value in res.__dict__.items()
+            if not name.startswith('_'))
+
+
+def _same_value(a, b):
+    """Determine if two resource values are the same."""
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    try:
+        return bool(a == b)
+    except ValueError:
+        return False
+
+
+def _changed_resources(old, new):
+    """Return the names of resources that differ between two frames."""
+    return set(name for name in set(old) | set(new)
+            if not _same_value(old.get(name, _missing),
+                               new.get(name, _missing)))
+
+
+def _resource_member(plot, name):
+    """Name of the member of a plot that a resource should be set on."""
+    for prefix, members in _resource_members:
+        if name.startswith(prefix):
+            for member in members:
+                if getattr(plot, member, None) is not None:
+                    return member
+    return 'base'
+
+
+class RetainedPlot(object):
+    """A plot that is kept between the frames of an animation.
+
+    Instead of building a new plot for every frame, the data and the
+    resources that changed since the previous frame are pushed to the
+    existing plot with Ngl.set_values. The map, coastlines,
+    labelbar and title string annotations are all kept. If a change
+    cannot be made in place (e.g., a resource is removed, or a title
+    string is added) the plot is rebuilt. The data is prepared in the
+    same way as by the plotting function, so modifiers (e.g.,
+    nglxCoarsen) are applied to every frame and missing data is filled.
+
+    Example:
+
+        plot = RetainedPlot(contour_map, wks, data[0], res)
+        for frame in data[1:]:
+            res.nglLeftString = ...
+            plot.update(frame, res)
+
+    """
+
+    def __init__(self, plot_func, wks, *args):
+        """Create the plot for the first frame.
+
+        Arguments:
+        plot_func -- A scalar or vector plotting function from
+            nglextras.plotting, e.g., contour_map.
+        wks -- Ngl workstation.
+        *args -- The remaining arguments to the plotting function, the
+            data arrays followed by an optional resources object.
+
+        """
+        try:
+            self._data_arguments = _data_arguments[plot_func.__name__]
+        except KeyError:
+            raise ValueError("plots made by '%s' cannot be updated in place" %
+                    plot_func.__name__)
+        self.plot_func = plot_func
+        # The data pushed to the plot is prepared in the same way as the
+        # plotting function prepares it, so that modifiers such as
+        # nglxCoarsen still apply and missing data is filled.
+        if isinstance(plot_func, ModificationManager):
+            self._manager = plot_func
+        else:
+            self._manager = ModificationManager(plot_func)
+        self.wks = wks
+        self.plot = None
+        self._strings = NglStrings()
+        self._build(*self._split(args))
+
+    def update(self, *args):
+        """Update the plot for a new frame.
+
+        Arguments:
+        *args -- The data arrays followed by an optional resources
+            object, as for the plotting function.
+
+        Returns the plot.
+
+        """
+        data, res = self._split(args)
+        with stats.timer('retained.update'):
+            values = _resource_values(res)
+            changed = _changed_resources(self._resources, values)
+            if not self._can_update(changed, values):
+                self._build(data, res)
+                return self.plot
+            self._push(data, res, values, changed)
+            self._update_strings(changed, res)
+            self._resources = values
+        self._finish(res)
+        return self.plot
+
+    def _split(self, args):
+        """Split plotting arguments into data and resources."""
+        args = list(args)
+        res = None
+        if args and isinstance(args[-1], Ngl.Resources):
+            res = args.pop()
+        if len(args) != len(self._data_arguments):
+            raise ValueError('expected %d data arguments, got %d' %
+                    (len(self._data_arguments), len(args)))
+        return args, res
+
+    def _push(self, data, res, values, changed):
+        """Set the new data and the changed resources on the plot."""
+        # The data and resources are prepared as they would be by the
+        # plotting function. The data, and the resources that changed or
+        # that preparing changed, are collected for each member of the plot.
+        # The data is always pushed, since the same array may have been
+        # refilled with the values for the new frame.
+        prepared_data, prepared = self._prepare(data, res)
+        updates = dict()
+        for (member, name), array in zip(self._data_arguments,
+                prepared_data):
+            updates.setdefault(member, dict())[name] = array
+        for name, value in prepared.items():
+            if name.startswith('ngl'):
+                continue
+            if name in changed or value is not values.get(name, _missing):
+                member = _resource_member(self.plot, name)
+                updates.setdefault(member, dict())[name] = value
+        # Push the updates, one call per member of the plot.
+        for member, resources in updates.items():
+            rlist = Ngl.Resources()
+            rlist.__dict__.update(resources)
+            Ngl.set_values(getattr(self.plot, member), rlist)
+            stats.count('set_values')
+
+    def _prepare(self, data, res):
+        """
+        Prepare data and resources in the same way as the plotting
+        function.
+
+        Returns the data arrays and a dictionary of the resources that
+        the plotting function would pass to Ngl.
+
+        """
+        view = ResourceOverlay(res if res is not None else Ngl.Resources(),
+                nglDraw=False, nglFrame=False)
+        args = self._manager._preplot([self.wks] + data + [view])[1]
+        return args[1:-1], _resource_values(args[-1])
+
+    def _build(self, data, res):
+        """Build the plot from scratch."""
+        if self.plot is not None:
+            Ngl.destroy(self.plot)
+        # Drawing and frame advancing are done separately for every frame.
+        view = ResourceOverlay(res if res is not None else Ngl.Resources(),
+                nglDraw=False, nglFrame=False)
+        self.plot = self._manager(self.wks, *(data + [view]))
+        self._resources = _resource_values(res)
+        self._finish(res)
+
+    def _can_update(self, changed, values):
+        """Determine if the changed resources can be set in place."""
+        for name in changed:
+            if name not in values:
+                # Resources cannot be unset.
+                return False
+            if name.startswith('ngl') and name not in _updatable_special:
+                # Other special resources are only applied when a plot is
+                # created.
+                return False
+            if name in self._strings.resource_names and \
+                    name.endswith('String') and name not in self._resources:
+                # A new title string needs a new annotation.
+                return False
+        return True
+
+    def _update_strings(self, changed, res):
+        """Update the title string annotations that have changed."""
+        changed = changed.intersection(self._strings.resource_names)
+        if not changed:
+            return
+        specs = self._strings.preplot(res)
+        records = getattr(self.plot, '_nglstrings', dict())
+        for position in ('left', 'right', 'center'):
+            prefix = 'ngl%sString' % position.capitalize()
+            if not any(name.startswith(prefix) for name in changed):
+                continue
+            for spec, (text, anno) in zip(specs[position],
+                    records.get(position, [])):
+                txres = self._strings._text_resources(spec, position)
+                del txres.nglDraw
+                txres.txString = spec['string']
+                Ngl.set_values(text, txres)
+                Ngl.set_values(anno,
+                        self._strings._annotation_resources(spec, position))
+                stats.count('set_values', 2)
+
+    def _finish(self, res):
+        """Draw the plot and advance the frame if requested."""
+        if getattr(res, 'nglDraw', True):
+            Ngl.draw(self.plot)
+            stats.count('draw')
+        if getattr(res, 'nglFrame', True):
+            Ngl.frame(self.wks)
+            stats.count('frame')
+
+
+class MapBase(object):
+    """A map that data plots can be overlaid on and removed from.
+
+    The map projection and outlines are computed once, when the MapBase
+    is created, and reused for every data plot overlaid on it. This
+    makes drawing many fields over the same domain much cheaper than
+    calling contour_map (etc.) for each field.
+
+    Title strings (NglStrings resources) given for an overlaid plot are
+    attached to the map, and are removed along with the plot.
+
+    Example:
+
+        base = MapBase(wks, MapResources((0.8, 0.4)))
+        for field in fields:
+            plot = base.overlay(contour, field, res)
+            base.draw(frame=True)
+            base.remove(plot)
+
+    """
+
+    def __init__(self, wks, res=None):
+        """Create the map.
+
+        Arguments:
+        wks -- Ngl workstation.
+
+        Optional argument:
+        res -- Resources for the map (e.g., a MapResources object).
+
+        """
+        self.wks = wks
+        if res is None:
+            res = Ngl.Resources()
+        self.plot = plotting.map(wks,
+                ResourceOverlay(res, nglDraw=False, nglFrame=False))
+        # The annotations added for each overlaid plot, keyed by the id of
+        # the plot.
+        self._annotations = dict()
+
+    def overlay(self, plot_func, *args):
+        """Create a data plot and overlay it on the map.
+
+        Arguments:
+        plot_func -- A plotting function that does not draw a map, e.g.,
+            contour, vector or streamline from nglextras.plotting.
+        *args -- The remaining arguments to the plotting function, the
+            data arrays followed by an optional resources object.
+
+        Returns the data plot.
+
+        """
+        args = list(args)
+        res = Ngl.Resources()
+        if args and isinstance(args[-1], Ngl.Resources):
+            res = args.pop()
+        # The title strings are handled here rather than by the plotting
+        # function so that they can be attached to the map.
+        strings = NglStrings()
+        context = strings.preplot(res)
+        view = ResourceOverlay(res, nglDraw=False, nglFrame=False)
+        for name in view.names().intersection(strings.resource_names):
+            delattr(view, name)
+        # The resources are materialized since plot_func may be an Ngl
+        # function, which does not understand views.
+        plot = plot_func(self.wks, *(args + [view.materialize()]))
+        Ngl.overlay(self.plot, plot)
+        stats.count('overlay')
+        # Attach the title strings to the map, recording the annotations
+        # that were added.
+        records = getattr(self.plot, '_nglstrings', dict())
+        existing = dict((position, len(records.get(position, [])))
+                for position in ('left', 'right', 'center'))
+        strings.postplot(self.wks, self.plot, context)
+        records = getattr(self.plot, '_nglstrings', dict())
+        self._annotations[id(plot)] = [(position, annotation)
+                for position in ('left', 'right', 'center')
+                for annotation in records.get(position, [])[
+                    existing[position]:]]
+        return plot
+
+    def remove(self, plot, destroy=True):
+        """Remove an overlaid plot from the map.
+
+        Arguments:
+        plot -- A plot returned by overlay.
+
+        Optional argument:
+        destroy -- If True the plot, and the text of its title strings,
+            are destroyed once removed. Defaults to True.
+
+        """
+        Ngl.remove_overlay(self.plot, plot, 0)
+        for position, annotation in self._annotations.pop(id(plot), []):
+            text, anno = annotation
+            Ngl.remove_annotation(self.plot, anno)
+            self.plot._nglstrings[position].remove(annotation)
+            if destroy:
+                Ngl.destroy(text)
+        if destroy:
+            Ngl.destroy(plot)
+
+    def draw(self, frame=False):
+        """Draw the map and its overlays.
+
+        Optional argument:
+        frame -- If True the frame is advanced after drawing. Defaults
+            to False.
+
+        """
+        Ngl.draw(self.plot)
+        stats.count('draw')
+        if frame:
+            Ngl.frame(self.wks)
+            stats.count('frame')
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,283 @@
+"""a long-running local render server and its client"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import itertools
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import batch
+from defaults import ngldefaults
+from instrumentation import stats
+
+
+# Messages are pickled and preceded by their length.
+_header = struct.Struct('!Q')
+
+
+def _send(sock, message):
+    """Send a message on a socket."""
+    payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_header.pack(len(payload)) + payload)
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1048576))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive(sock):
+    """Receive a message from a socket."""
+    size, = _header.unpack(_receive_exactly(sock, _header.size))
+    return pickle.loads(_receive_exactly(sock, size))
+
+
+class ServerBusy(Exception):
+    """Raised by a client when the server has too many queued requests."""
+    pass
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Handle the requests made on one client connection."""
+
+    def handle(self):
+        while True:
+            try:
+                request = _receive(self.request)
+            except EOFError:
+                return
+            _send(self.request, self.server.render_server._handle(request))
+
+
+class _UnixServer(socketserver.ThreadingMixIn,
+        socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class RenderServer(object):
+    """A local server that renders frames with warm worker processes.
+
+    The server listens on a Unix socket for frames (see batch.Frame) and
+    renders them with a pool of worker processes, in the same way as
+    render_batch. The workers import Ngl and open their workstations
+    once, so a small plot is rendered without paying the start-up costs
+    of a new process. At most processes frames are rendered at a time;
+    further requests are queued, up to max_queued, after which requests
+    are refused until the queue drains. A frame that is not rendered
+    within timeout seconds of arriving, including any time spent queued,
+    is reported as failed (e.g., because its worker crashed). It keeps
+    its place in the queue until a worker has finished with it, so a
+    frame lost with a crashed worker takes up its place for good.
+
+    The socket can only be used by the owner of the server process,
+    since requests are unpickled.
+
+    Statistics (see instrumentation) are recorded separately by each
+    process. The stats command returns those of the server process,
+    which include the time taken to render each frame as seen by the
+    server, but not the statistics recorded by the worker processes.
+
+    Example:
+
+        server = RenderServer('/tmp/ngl.sock', directory='plots')
+        server.serve_forever()
+
+    and in client code:
+
+        client = RenderClient('/tmp/ngl.sock')
+        result = client.render('contour_map', [field], res, name='t2m')
+
+    """
+
+    def __init__(self, address, directory='.', wks_type='png',
+            wks_res=None, prefix='frame', processes=2, max_queued=64,
+            modifiers=(), timeout=300.):
+        """Create a server.
+
+        Arguments:
+        address -- Path of the Unix socket to listen on. An existing
+            file at this path is removed.
+
+        Optional arguments:
+        directory, wks_type, wks_res, prefix, modifiers, timeout -- As
+            for render_batch.
+        processes -- Number of worker processes, which is the number of
+            frames rendered at once. Defaults to 2.
+        max_queued -- Maximum number of frames waiting to be rendered.
+            Defaults to 64.
+
+        """
+        self.address = address
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._scratch = tempfile.mkdtemp(prefix='.nglextras-', dir=directory)
+        settings = dict(directory=directory, wks_type=wks_type,
+                wks_res=wks_res, prefix=prefix, scratch=self._scratch)
+        self._settings = settings
+        self._pool = multiprocessing.Pool(processes, batch._init_worker,
+                (settings, ngldefaults.snapshot(), tuple(modifiers)))
+        self._limit = threading.Semaphore(processes + max_queued)
+        # Frames without a name are numbered in the order they arrive.
+        self._index = itertools.count()
+        if os.path.exists(address):
+            os.remove(address)
+        self._server = _UnixServer(address, _RequestHandler)
+        self._server.render_server = self
+        # Unpickling a request can run arbitrary code, so only the owner may
+        # connect.
+        os.chmod(address, 0o600)
+
+    def serve_forever(self):
+        """Handle requests until shutdown is called."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop serve_forever. Must be called from another thread."""
+        self._server.shutdown()
+
+    def close(self):
+        """Stop the worker processes and remove the socket."""
+        self._server.server_close()
+        self._pool.close()
+        self._pool.join()
+        shutil.rmtree(self._scratch, ignore_errors=True)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+    def _handle(self, request):
+        """Carry out a request, returning the reply."""
+        command = request[0]
+        if command == 'render':
+            return self._render(request[1])
+        if command == 'stats':
+            return ('ok', stats.as_dict())
+        if command == 'ping':
+            return ('ok', None)
+        return ('error', "unknown command '%s'" % command)
+
+    def _render(self, frame):
+        if not self._limit.acquire(False):
+            stats.count('server_refused')
+            return ('busy', None)
+        with stats.timer('server.render'):
+            deadline = batch._deadline(self.timeout)
+            job = (next(self._index), frame)
+            # The place taken by the frame is only given up once a worker
+            # has finished with it, even if the request times out first.
+            try:
+                pending = self._pool.apply_async(batch._render_frame,
+                        (job,), callback=self._finished)
+            except:
+                self._limit.release()
+                raise
+            result = batch._frame_result(self._settings, job, pending,
+                    deadline, self.timeout)
+        stats.count('server_frames')
+        return ('ok', result)
+
+    def _finished(self, result):
+        """Give up the place of a frame a worker has finished with."""
+        self._limit.release()
+
+
+class RenderClient(object):
+    """Client for a RenderServer."""
+
+    def __init__(self, address):
+        """Connect to a server.
+
+        Argument:
+        address -- Path of the server's Unix socket.
+
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(address)
+
+    def _request(self, *request):
+        _send(self._socket, request)
+        status, value = _receive(self._socket)
+        if status == 'busy':
+            raise ServerBusy('render server queue is full')
+        if status != 'ok':
+            raise ValueError(value)
+        return value
+
+    def render(self, plot, args=(), res=None, name=None):
+        """Render a frame.
+
+        The arguments are the same as for batch.Frame. Arrays can be sent
+        with the request, or published with SharedArrays beforehand to
+        avoid sending them.
+
+        Returns a FrameResult. Errors raised while drawing the frame are
+        reported in the result rather than being raised.
+
+        """
+        return self._request('render', batch.Frame(plot, args, res, name))
+
+    def stats(self):
+        """Return the statistics recorded by the server process.
+
+        Statistics recorded by the worker processes are not included.
+
+        """
+        return self._request('stats')
+
+    def ping(self):
+        """Check that the server is responding."""
+        self._request('ping')
+
+    def close(self):
+        """Close the connection."""
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+if __name__ == '__main__':
+    # Run a server on the socket given on the command line, writing frames
+    # to the current directory.
+    RenderServer(sys.argv[1]).serve_forever()
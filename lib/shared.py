@@ -0,0 +1,209 @@
+"""sharing large arrays between processes without copying them"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import OrderedDict
+import copy
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import Ngl
+
+from instrumentation import stats
+from modification import ResourceOverlay
+
+
+# Memory backed file system used for shared arrays when it is available.
+_shared_memory_directory = '/dev/shm'
+
+# Arrays that have been attached in this process, keyed by file name, from
+# least to most recently used. The same memory map is used however many times
+# an array is referenced. Only the most recently used arrays are kept, so that
+# long-running processes (e.g., render server workers) do not keep every
+# array they have ever seen mapped.
+_attached = OrderedDict()
+_max_attached = 32
+
+
+class SharedArray(object):
+    """Handle to an array published by SharedArrays.
+
+    A handle is small and cheap to pickle. It can be used in place of
+    the array it refers to in the data arguments and resources of frames
+    rendered by render_batch; the array is attached (memory mapped,
+    read-only) by the worker process rendering the frame.
+
+    """
+
+    def __init__(self, filename, shape, dtype, fill_value=None):
+        self.filename = filename
+        self.shape = shape
+        self.dtype = dtype
+        # The value marking the masked points of a masked array that is not
+        # floating point, or None.
+        self.fill_value = fill_value
+
+    def attach(self):
+        """Return the array as a read-only memory map.
+
+        If the array was published from a masked array that is not
+        floating point, the memory map is masked where it holds the fill
+        value.
+
+        """
+        try:
+            array = _attached.pop(self.filename)
+        except KeyError:
+            array = np.load(self.filename, mmap_mode='r')
+            if self.fill_value is not None:
+                array = np.ma.masked_equal(array, self.fill_value, copy=False)
+            stats.count('shared_attach')
+        _attached[self.filename] = array
+        while len(_attached) > _max_attached:
+            _attached.popitem(last=False)
+        return array
+
+    def __repr__(self):
+        return 'SharedArray(%r, shape=%r, dtype=%r, fill_value=%r)' % (
+                self.filename, self.shape, self.dtype, self.fill_value)
+
+
+class SharedArrays(object):
+    """A collection of arrays shared with other processes.
+
+    Each array is written once to a file, in shared memory if possible,
+    and memory mapped by the processes using it. This means the array is
+    not copied to each process, however many processes there are.
+
+    Example:
+
+        with SharedArrays() as shared:
+            lons = shared.publish(lons)
+            res.sfXArray = lons
+            frames = [Frame('contour_map', [shared.publish(field)], res)
+                      for field in fields]
+            results = render_batch(frames)
+
+    """
+
+    def __init__(self, directory=None):
+        """Create an empty collection.
+
+        Optional argument:
+        directory -- Directory in which to create the files holding the
+            arrays. Defaults to /dev/shm if it exists, otherwise the
+            system temporary directory.
+
+        """
+        if directory is None and os.path.isdir(_shared_memory_directory):
+            directory = _shared_memory_directory
+        self.directory = tempfile.mkdtemp(prefix='nglextras-',
+                dir=directory)
+        self._handles = dict()
+
+    def publish(self, array):
+        """Share an array.
+
+        Publishing the same array object again returns the same handle.
+        The array should not be modified once it has been published.
+
+        Argument:
+        array -- The array to share. Masked points of floating point
+            arrays are set to NaN. Other masked arrays are filled with
+            their fill value, and are masked again where they hold it
+            when they are attached.
+
+        Returns a SharedArray handle.
+
+        """
+        try:
+            return self._handles[id(array)][1]
+        except KeyError:
+            pass
+        data = array
+        fill_value = None
+        if np.ma.isMaskedArray(data):
+            if data.dtype.kind in 'fc':
+                data = data.filled(np.nan)
+            else:
+                fill_value = data.fill_value
+                data = data.filled(fill_value)
+        data = np.asanyarray(data)
+        filename = os.path.join(self.directory,
+                'array%d.npy' % len(self._handles))
+        np.save(filename, data)
+        handle = SharedArray(filename, data.shape, data.dtype.str,
+                fill_value)
+        # The array is kept so that its id is not reused.
+        self._handles[id(array)] = (array, handle)
+        stats.count('shared_publish')
+        return handle
+
+    def close(self):
+        """Remove the shared arrays.
+
+        Processes that have already attached an array can keep using it.
+
+        """
+        for _, handle in self._handles.values():
+            _attached.pop(handle.filename, None)
+        self._handles.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def resolve(value):
+    """Replace shared array handles with the arrays they refer to.
+
+    Handles are replaced in lists and tuples and in the resources of Ngl
+    resources objects. Resources objects are not modified, a new
+    copy of the resources object, of the same class, referring to the
+    same values is returned instead.
+
+    Argument:
+    value -- A SharedArray, resources object, list, tuple or any other
+        object, which is returned unchanged.
+
+    """
+    if isinstance(value, SharedArray):
+        return value.attach()
+    if isinstance(value, (list, tuple)):
+        return type(value)(resolve(item) for item in value)
+    if isinstance(value, Ngl.Resources):
+        if isinstance(value, ResourceOverlay):
+            value = value.materialize()
+        shared = dict((name, item.attach())
+                for name, item in value.__dict__.items()
+                if isinstance(item, SharedArray))
+        if shared:
+            res = copy.copy(value)
+            res.__dict__.update(shared)
+            return res
+    return value
+
+
+if __name__ == '__main__':
+    pass
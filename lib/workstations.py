@@ -0,0 +1,257 @@
+"""reusing Ngl workstations for many output files"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from contextlib import contextmanager
+import os
+import shutil
+import tempfile
+from timeit import default_timer
+
+import Ngl
+
+from instrumentation import stats
+
+
+# Workstation types that write each frame to its own file as it is drawn,
+# so that the output of a workstation can be moved elsewhere without closing
+# it. Other types (e.g., 'ps' or 'pdf') only complete their output file when
+# the workstation is closed, so they cannot be reused.
+_reusable_types = ('png',)
+
+# Resources that determine the size of a workstation.
+_size_resources = ('wkWidth', 'wkHeight')
+
+
+class _PooledWorkstation(object):
+    """A workstation held by a pool."""
+
+    def __init__(self, wks, basename):
+        self.wks = wks
+        self.basename = basename
+        self.in_use = False
+        self.last_used = default_timer()
+
+
+def _workstation_key(wks_type, res):
+    """Key identifying workstations that can be used interchangeably."""
+    return (wks_type,) + tuple(getattr(res, name, None)
+            for name in _size_resources)
+
+
+def _other_resources(res):
+    """Workstation resources other than the size, or None."""
+    if res is None:
+        return None
+    others = dict((name, value) for name, value in res.__dict__.items()
+            if name not in _size_resources and not name.startswith('_'))
+    if not others:
+        return None
+    rlist = Ngl.Resources()
+    rlist.__dict__.update(others)
+    return rlist
+
+
+class WorkstationPool(object):
+    """A pool of workstations that are reused for different outputs.
+
+    Opening and closing a workstation is a significant part of the cost
+    of drawing a small plot. A pool keeps workstations open and hands
+    them out for drawing one output file at a time. Workstations are
+    keyed by their type and size (the wkWidth and wkHeight resources).
+
+    Only workstation types that write each frame as it is drawn (i.e.,
+    'png') can be reused. Workstations of other types are opened for the
+    output file and closed once it has been drawn.
+
+    Example:
+
+        pool = WorkstationPool()
+        for field, name in zip(fields, names):
+            with pool.workstation(name) as wks:
+                contour_map(wks, field, res)
+        pool.close()
+
+    """
+
+    def __init__(self, max_open=4, idle_timeout=60., directory=None):
+        """Create an empty pool.
+
+        Optional arguments:
+        max_open -- Maximum number of workstations kept open. Defaults
+            to 4.
+        idle_timeout -- Time in seconds after which an unused workstation
+            is closed. If None workstations are only closed to make room
+            for others. Defaults to 60 seconds.
+        directory -- Directory the workstations write to before their
+            output is moved into place. It should be on the same file
+            system as the output files. Defaults to a new temporary
+            directory.
+
+        """
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._directory = tempfile.mkdtemp(prefix='nglextras-wks-',
+                dir=directory)
+        self._workstations = dict()
+        self._opened = 0
+
+    def __len__(self):
+        """Number of open workstations."""
+        return sum(len(pooled) for pooled in self._workstations.values())
+
+    @contextmanager
+    def workstation(self, target, wks_type='png', res=None):
+        """Borrow a workstation to draw an output file.
+
+        The workstation is yielded as a plain Ngl workstation, so it can
+        be passed to any of the plotting functions or to PanelPlot. When
+        the block exits the frames drawn are moved to the target (with
+        the extension of the workstation type added, and frame numbers
+        if there is more than one frame) and the workstation is returned
+        to the pool. IOError is raised if no frames were drawn.
+
+        Arguments:
+        target -- Name of the output file, without the extension.
+
+        Optional arguments:
+        wks_type -- Ngl workstation type. Defaults to 'png'.
+        res -- Resources for the workstation.
+
+        """
+        if wks_type not in _reusable_types:
+            wks = Ngl.open_wks(wks_type, target, res)
+            stats.count('open_wks')
+            try:
+                yield wks
+            finally:
+                Ngl.delete_wks(wks)
+            return
+        pooled = self._acquire(wks_type, res)
+        try:
+            yield pooled.wks
+        except:
+            # The workstation may be in an unknown state, so it is closed and
+            # any output it produced is discarded.
+            self._discard(wks_type, res, pooled)
+            raise
+        try:
+            self._move_output(pooled, target, wks_type)
+        finally:
+            Ngl.clear_workstation(pooled.wks)
+            pooled.in_use = False
+            pooled.last_used = default_timer()
+
+    def evict_idle(self):
+        """Close workstations that have not been used recently."""
+        if self.idle_timeout is None:
+            return
+        now = default_timer()
+        for key, pooled in list(self._iter_pooled()):
+            if not pooled.in_use and \
+                    now - pooled.last_used > self.idle_timeout:
+                self._close(key, pooled)
+
+    def close(self):
+        """Close all the workstations in the pool."""
+        for key, pooled in list(self._iter_pooled()):
+            self._close(key, pooled)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _iter_pooled(self):
+        for key, workstations in self._workstations.items():
+            for pooled in workstations:
+                yield key, pooled
+
+    def _acquire(self, wks_type, res):
+        """Get an idle workstation, opening one if necessary."""
+        self.evict_idle()
+        key = _workstation_key(wks_type, res)
+        for pooled in self._workstations.get(key, []):
+            if not pooled.in_use:
+                stats.count('wks_reuse')
+                break
+        else:
+            self._make_room()
+            basename = os.path.join(self._directory, 'wks%d' % self._opened)
+            self._opened += 1
+            pooled = _PooledWorkstation(
+                    Ngl.open_wks(wks_type, basename, res), basename)
+            self._workstations.setdefault(key, []).append(pooled)
+            stats.count('open_wks')
+            res = None
+        # Workstation resources other than the size are set again every
+        # time, since they may have been changed by the last user.
+        others = _other_resources(res)
+        if others is not None:
+            Ngl.set_values(pooled.wks, others)
+            stats.count('set_values')
+        pooled.in_use = True
+        return pooled
+
+    def _make_room(self):
+        """Close the least recently used idle workstation if necessary."""
+        if len(self) < self.max_open:
+            return
+        idle = [(pooled.last_used, key, pooled)
+                for key, pooled in self._iter_pooled() if not pooled.in_use]
+        if not idle:
+            raise RuntimeError('all %d workstations are in use' %
+                    self.max_open)
+        _, key, pooled = min(idle, key=lambda item: item[0])
+        self._close(key, pooled)
+
+    def _close(self, key, pooled):
+        self._workstations[key].remove(pooled)
+        if not self._workstations[key]:
+            del self._workstations[key]
+        Ngl.delete_wks(pooled.wks)
+        stats.count('delete_wks')
+        for filename in self._outputs(pooled):
+            os.remove(filename)
+
+    def _discard(self, wks_type, res, pooled):
+        self._close(_workstation_key(wks_type, res), pooled)
+
+    def _outputs(self, pooled):
+        """The files written by a workstation, in frame order."""
+        prefix = os.path.basename(pooled.basename) + '.'
+        return sorted(os.path.join(self._directory, filename)
+                for filename in os.listdir(self._directory)
+                if filename.startswith(prefix))
+
+    def _move_output(self, pooled, target, wks_type):
+        """Move the frames written by a workstation to the target.
+
+        Raises IOError if the workstation has not written anything.
+
+        """
+        outputs = self._outputs(pooled)
+        if not outputs:
+            raise IOError('no output was written for %s' % target)
+        if len(outputs) == 1:
+            targets = ['%s.%s' % (target, wks_type)]
+        else:
+            targets = ['%s.%06d.%s' % (target, i + 1, wks_type)
+                    for i in xrange(len(outputs))]
+        for output, target in zip(outputs, targets):
+            shutil.move(output, target)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,80 @@
+"""tests for the batch module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+from timeit import default_timer
+
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+from batch import Frame, render_batch
+
+
+def _blank(wks, crash=False):
+    """Draw an empty frame, or kill the worker process."""
+    if crash:
+        os._exit(1)
+    Ngl.frame(wks)
+
+
+def _fail(wks):
+    raise ValueError('drawing failed')
+
+
+def test_frames_are_rendered(tmpdir):
+    frames = [Frame(_blank), Frame(_blank, name='named')]
+    results = render_batch(frames, directory=str(tmpdir), processes=2)
+    assert [result.index for result in results] == [0, 1]
+    assert [result.name for result in results] == ['frame_000000', 'named']
+    for result in results:
+        assert result.error is None
+        assert os.path.exists(result.path)
+    # Only the output files are left behind.
+    assert sorted(os.listdir(str(tmpdir))) == ['frame_000000.png',
+            'named.png']
+
+
+def test_errors_are_reported(tmpdir):
+    results = render_batch([Frame(_fail), Frame(_blank)],
+            directory=str(tmpdir), processes=1)
+    assert 'drawing failed' in results[0].error
+    assert results[1].error is None
+
+
+def test_crashed_worker_is_reported(tmpdir):
+    frames = [Frame(_blank), Frame(_blank, [True]), Frame(_blank)]
+    results = render_batch(frames, directory=str(tmpdir), processes=2,
+            timeout=5.)
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].error is None
+    assert 'crashed' in results[1].error
+    assert results[1].path == str(tmpdir.join('frame_000001.png'))
+    assert results[2].error is None
+
+
+def test_timeout_applies_to_whole_batch(tmpdir):
+    frames = [Frame(_blank, [True]) for _ in range(3)] + [Frame(_blank)]
+    start = default_timer()
+    results = render_batch(frames, directory=str(tmpdir), processes=3,
+            timeout=2.)
+    # The lost frames share one deadline rather than waiting in turn.
+    assert default_timer() - start < 5.
+    for result in results[:3]:
+        assert 'crashed' in result.error
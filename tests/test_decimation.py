@@ -0,0 +1,124 @@
+"""tests for the decimation module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+from decimation import decimate, lttb_indices, minmax_indices
+
+
+@pytest.fixture
+def curves():
+    rs = np.random.RandomState(0)
+    return np.cumsum(rs.normal(size=(3, 10000)), axis=1)
+
+
+def test_minmax_keeps_endpoints_and_extrema(curves):
+    indices = minmax_indices(curves, 50)
+    assert indices.shape == (3, 102)
+    assert (np.diff(indices, axis=1) >= 0).all()
+    for curve, kept in zip(curves, indices):
+        assert kept[0] == 0
+        assert kept[-1] == curve.size - 1
+        assert curve.argmin() in kept
+        assert curve.argmax() in kept
+
+
+def test_minmax_keeps_bin_extrema(curves):
+    indices = minmax_indices(curves[:1], 10)
+    kept = curves[0][indices[0]]
+    for values in np.split(curves[0], 10):
+        assert values.min() in kept
+        assert values.max() in kept
+
+
+def test_minmax_ignores_missing_values():
+    y = np.arange(20.).reshape(1, -1)
+    y[0, 5:15] = np.nan
+    indices = minmax_indices(y, 4)
+    assert not np.isnan(y[0, indices[0, :2]]).any()
+    assert (indices < 20).all()
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    y = np.zeros((1, 1000))
+    y[0, 437] = 10.
+    y[0, 802] = -10.
+    x = np.arange(1000.)[np.newaxis]
+    indices = lttb_indices(x, y, 20)
+    assert indices.shape == (1, 20)
+    assert indices[0, 0] == 0
+    assert indices[0, -1] == 999
+    assert 437 in indices[0]
+    assert 802 in indices[0]
+    assert (np.diff(indices, axis=1) > 0).all()
+
+
+def test_lttb_with_few_points():
+    y = np.arange(10.).reshape(1, -1)
+    indices = lttb_indices(np.arange(10.)[np.newaxis], y, 20)
+    np.testing.assert_array_equal(indices, np.arange(10)[np.newaxis])
+
+
+def test_decimate_small_curves_unchanged():
+    x = np.arange(10.)
+    y = np.arange(10.)
+    xnew, ynew = decimate(x, y, 100)
+    assert xnew is x
+    assert ynew is y
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_single_curve(method):
+    x = np.linspace(0., 1., 5000)
+    y = np.sin(50. * x)
+    xnew, ynew = decimate(x, y, 200, method=method)
+    assert xnew.ndim == ynew.ndim == 1
+    assert xnew.shape == ynew.shape
+    assert ynew.size <= 200
+    assert (xnew[0], xnew[-1]) == (x[0], x[-1])
+    np.testing.assert_array_equal(np.sin(50. * xnew), ynew)
+
+
+def test_decimate_several_curves_with_shared_x(curves):
+    x = np.arange(curves.shape[1])
+    xnew, ynew = decimate(x, curves, 100)
+    assert xnew.shape == ynew.shape
+    assert xnew.shape[0] == 3
+    for row, xrow, yrow in zip(curves, xnew, ynew):
+        np.testing.assert_array_equal(row[xrow], yrow)
+
+
+def test_decimate_without_x_returns_indices(curves):
+    xnew, ynew = decimate(None, curves[0], 100)
+    np.testing.assert_array_equal(curves[0][xnew], ynew)
+
+
+def test_decimate_missing_values():
+    y = np.ma.masked_greater(np.arange(1000.), 900.)
+    y[500] = -999.
+    xnew, _ = decimate(None, y, 50, missing=-999.)
+    # The extrema are found among the valid points.
+    assert 0 in xnew
+    assert 900 in xnew
+
+
+def test_decimate_unknown_method(curves):
+    with pytest.raises(ValueError):
+        decimate(None, curves, 100, method='fourier')
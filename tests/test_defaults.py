@@ -0,0 +1,154 @@
+"""tests for the defaults module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import pytest
+
+from defaults import NglDefaults
+
+
+@pytest.fixture
+def rcfile(tmpdir):
+    path = tmpdir.join('nglrc')
+    path.write('# user settings\nfont.title = 21\nfontheight.ngl = 0.02\n')
+    return str(path)
+
+
+@pytest.fixture
+def defaults(rcfile):
+    return NglDefaults(path=rcfile, check_interval=0)
+
+
+def test_rc_file_overrides(defaults):
+    assert defaults['font']['title'] == 21.
+    assert defaults['fontheight']['ngl'] == 0.02
+    # Options not in the rc file keep their default values.
+    assert defaults['font']['ngl'] == 4
+
+
+def test_missing_rc_file(tmpdir):
+    defaults = NglDefaults(path=str(tmpdir.join('missing')))
+    assert defaults['font']['title'] == 22
+
+
+def test_invalid_rc_key(tmpdir):
+    path = tmpdir.join('nglrc')
+    path.write('title = 21\n')
+    with pytest.raises(ValueError):
+        NglDefaults(path=str(path))['font']
+
+
+def test_version_is_stable(defaults):
+    defaults.check()
+    version = defaults.version
+    defaults['font']['title']
+    assert defaults.version == version
+
+
+def test_version_changes_after_in_place_edit(defaults):
+    version = defaults.version
+    defaults['fontheight']['title'] = 0.05
+    assert defaults.version != version
+    assert defaults['fontheight']['title'] == 0.05
+
+
+def test_version_changes_after_setting_category(defaults):
+    version = defaults.version
+    defaults['font'] = dict(title=1)
+    assert defaults.version != version
+
+
+def test_rc_file_changes_are_read(defaults, rcfile):
+    version = defaults.version
+    with open(rcfile, 'a') as f:
+        f.write('font.ngl = 7\n')
+    # Make sure the modification time changes.
+    stat = os.stat(rcfile)
+    os.utime(rcfile, (stat.st_atime, stat.st_mtime + 10))
+    assert defaults['font']['ngl'] == 7.
+    assert defaults.version != version
+
+
+def test_freeze_snapshot(defaults, rcfile):
+    snapshot = defaults.snapshot()
+    snapshot['font']['title'] = 5
+    other = NglDefaults(path=rcfile)
+    other.freeze(snapshot)
+    assert other['font']['title'] == 5
+    # The snapshot is a copy.
+    assert defaults['font']['title'] == 21.
+
+
+def test_environment_variable(rcfile, monkeypatch):
+    monkeypatch.setenv('NGLRC', rcfile)
+    assert NglDefaults()['font']['title'] == 21.
+
+
+def test_explicit_path_overrides_environment(rcfile, tmpdir, monkeypatch):
+    monkeypatch.setenv('NGLRC', str(tmpdir.join('missing')))
+    assert NglDefaults(path=rcfile)['font']['title'] == 21.
+
+
+def test_setting_path_reloads(rcfile, tmpdir):
+    defaults = NglDefaults(path=str(tmpdir.join('missing')))
+    assert defaults['font']['title'] == 22
+    defaults.path = rcfile
+    assert defaults['font']['title'] == 21.
+
+
+def test_rc_file_is_not_checked_again(rcfile):
+    defaults = NglDefaults(path=rcfile, check_interval=None)
+    defaults['font']
+    with open(rcfile, 'a') as f:
+        f.write('font.ngl = 7\n')
+    stat = os.stat(rcfile)
+    os.utime(rcfile, (stat.st_atime, stat.st_mtime + 10))
+    assert defaults['font']['ngl'] == 4
+    defaults.reload()
+    assert defaults['font']['ngl'] == 7.
+
+
+def test_version_changes_after_category_methods(defaults):
+    for edit in (lambda font: font.update(title=1),
+            lambda font: font.pop('title'),
+            lambda font: font.setdefault('extra', 2),
+            lambda font: font.__delitem__('ngl')):
+        version = defaults.version
+        edit(defaults['font'])
+        assert defaults.version != version
+
+
+def test_check_reads_rc_file_changes(defaults, rcfile):
+    defaults['font']
+    version = defaults.version
+    with open(rcfile, 'a') as f:
+        f.write('font.ngl = 7\n')
+    stat = os.stat(rcfile)
+    os.utime(rcfile, (stat.st_atime, stat.st_mtime + 10))
+    defaults.check()
+    assert defaults.version != version
+
+
+def test_snapshot_is_plain_dictionaries(defaults):
+    snapshot = defaults.snapshot()
+    assert type(snapshot['font']) is dict
+    version = defaults.version
+    snapshot['font']['title'] = 5
+    assert defaults.version == version
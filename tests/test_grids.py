@@ -0,0 +1,221 @@
+"""tests for the grids module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+import grids
+
+
+def test_visible_points():
+    lat = np.linspace(-90., 90., 181)
+    assert grids.visible_points(lat) == 181
+    assert grids.visible_points(lat, 0., 10.) == 11
+    assert grids.visible_points(lat, upper=-80.) == 11
+
+
+def test_visible_points_periodic():
+    lon = np.arange(0., 360., 1.)
+    # Limits crossing the end of the grid.
+    assert grids.visible_points(lon, -10., 10., period=360.) == 21
+    assert grids.visible_points(lon, 0., 720., period=360.) == 360
+
+
+def test_block_reduce_mean():
+    values = np.arange(16.).reshape(4, 4)
+    np.testing.assert_array_equal(grids.block_reduce(values, (2, 2)),
+            [[2.5, 4.5], [10.5, 12.5]])
+
+
+def test_block_reduce_max():
+    values = np.arange(16.).reshape(4, 4)
+    np.testing.assert_array_equal(
+            grids.block_reduce(values, (2, 2), 'max'), [[5., 7.], [13., 15.]])
+
+
+def test_block_reduce_partial_blocks():
+    values = np.arange(15.).reshape(3, 5)
+    reduced = grids.block_reduce(values, (2, 2))
+    assert reduced.shape == (2, 3)
+    # The last block of each row holds only one column.
+    assert reduced[0, 2] == 6.5
+    assert reduced[1, 2] == 14.
+
+
+@pytest.mark.parametrize('method', ['mean', 'max'])
+def test_block_reduce_missing_values(method):
+    values = np.ones((4, 4))
+    values[0, 0] = np.nan
+    values[2:, 2:] = np.nan
+    reduced = grids.block_reduce(values, (2, 2), method)
+    assert reduced[0, 0] == 1.
+    assert np.isnan(reduced[1, 1])
+    assert not np.isnan(reduced[:1]).any()
+
+
+def test_block_reduce_unknown_method():
+    values = np.ones((4, 4))
+    with pytest.raises(ValueError):
+        grids.block_reduce(values, (2, 2), 'meen')
+    values[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        grids.block_reduce(values, (2, 2), 'median')
+
+
+def test_coarsen_field_unknown_method():
+    with pytest.raises(ValueError):
+        grids.coarsen_field(np.ones((4, 4)), (2, 2), method='meen')
+
+
+def test_coarsen_field_coordinates():
+    data = np.arange(24.).reshape(4, 6)
+    x = np.arange(6.)
+    y = np.arange(4.) * 10.
+    reduced, xnew, ynew = grids.coarsen_field(data, (2, 3), x, y)
+    np.testing.assert_array_equal(reduced, [[4., 7.], [16., 19.]])
+    np.testing.assert_array_equal(xnew, [1., 4.])
+    np.testing.assert_array_equal(ynew, [5., 25.])
+
+
+def test_coarsen_field_2d_coordinates():
+    x, y = np.meshgrid(np.arange(6.), np.arange(4.))
+    _, xnew, ynew = grids.coarsen_field(np.zeros((4, 6)), (2, 3), x, y)
+    np.testing.assert_array_equal(xnew, [[1., 4.], [1., 4.]])
+    np.testing.assert_array_equal(ynew, [[.5, .5], [2.5, 2.5]])
+
+
+def test_coarsen_field_missing_values():
+    data = np.ma.masked_all((4, 4))
+    data[:2, :2] = 1.
+    data[0, 0] = -999.
+    reduced, _, _ = grids.coarsen_field(data, (2, 2), missing=-999.)
+    assert np.ma.isMaskedArray(reduced)
+    assert reduced[0, 0] == 1.
+    assert reduced.mask[1:].all()
+    assert reduced.mask[:, 1].all()
+
+
+def test_coarsen_field_without_missing_values():
+    reduced, xnew, ynew = grids.coarsen_field(np.ones((4, 4)), (2, 2))
+    assert not np.ma.isMaskedArray(reduced)
+    assert xnew is None and ynew is None
+
+
+def test_coarsen_field_nearest():
+    data = np.arange(36).reshape(6, 6)
+    x = np.arange(6.)
+    reduced, xnew, _ = grids.coarsen_field(data, (3, 3), x,
+            method='nearest')
+    np.testing.assert_array_equal(reduced, [[7, 10], [25, 28]])
+    np.testing.assert_array_equal(xnew, [1., 4.])
+
+
+def test_convergence_mask_equator_kept():
+    drop = grids.convergence_mask(np.zeros(3), (3, 10))
+    assert drop.shape == (3, 10)
+    assert not drop.any()
+
+
+def test_convergence_mask_high_latitudes():
+    # Every second point is kept at 60 degrees, every fourth near 75.
+    drop = grids.convergence_mask([60., -75.5, 90.], (3, 8))
+    np.testing.assert_array_equal(~drop[0], np.arange(8) % 2 == 0)
+    np.testing.assert_array_equal(~drop[1], np.arange(8) % 4 == 0)
+    # Only the first point of a row at the pole is kept.
+    np.testing.assert_array_equal(~drop[2], np.arange(8) == 0)
+
+
+def test_convergence_mask_2d_latitudes():
+    lat = np.repeat([[0.], [60.]], 4, axis=1)
+    drop = grids.convergence_mask(lat, lat.shape)
+    np.testing.assert_array_equal(drop,
+            grids.convergence_mask([0., 60.], (2, 4)))
+
+
+@pytest.fixture
+def global_grid():
+    lon = np.arange(0., 360., 1.)
+    lat = np.arange(-90., 91., 1.)
+    return lon, lat
+
+
+def test_domain_subset(global_grid):
+    rows, columns, lon, lat = grids.domain_subset(*global_grid,
+            limits=(10., 20., 30., 40.))
+    assert rows == slice(100, 111)
+    assert columns == [slice(30, 41)]
+    np.testing.assert_array_equal(lon, np.arange(30., 41.))
+    np.testing.assert_array_equal(lat, np.arange(10., 21.))
+
+
+def test_domain_subset_longitude_wrap(global_grid):
+    rows, columns, lon, _ = grids.domain_subset(*global_grid,
+            limits=(None, None, -10., 10.))
+    assert rows == slice(0, 181)
+    assert columns == [slice(350, 360), slice(0, 11)]
+    # The longitudes continue across the end of the grid.
+    np.testing.assert_array_equal(lon, np.arange(350., 371.))
+
+
+def test_domain_subset_halo(global_grid):
+    rows, columns, lon, _ = grids.domain_subset(*global_grid,
+            limits=(-90., -80., -10., 10.), halo=2)
+    assert rows == slice(0, 13)
+    assert columns == [slice(348, 360), slice(0, 13)]
+    np.testing.assert_array_equal(lon, np.arange(348., 373.))
+
+
+def test_domain_subset_regional_halo():
+    lon = np.arange(0., 101.)
+    _, columns, _, _ = grids.domain_subset(lon, np.arange(10.),
+            (None, None, 95., 120.), halo=2)
+    # A regional grid does not wrap, the halo stops at the edge.
+    assert columns == [slice(93, 101)]
+
+
+def test_domain_subset_regional_wrap():
+    # Limits crossing the end of a regional grid cover columns at both ends
+    # of it, which are not next to each other.
+    lon = np.arange(0., 301.)
+    _, columns, newlon, _ = grids.domain_subset(lon, np.arange(10.),
+            (None, None, 250., 380.))
+    assert columns == [slice(0, 301)]
+    np.testing.assert_array_equal(newlon, lon)
+
+
+def test_domain_subset_no_overlap(global_grid):
+    lon, lat = global_grid
+    assert grids.domain_subset(lon, lat[:90], (10., 20., 0., 10.)) is None
+    assert grids.domain_subset(lon[:90], lat, (None, None, 100., 120.)) \
+            is None
+
+
+def test_read_subset():
+    data = np.arange(20.).reshape(4, 5)
+    subset = grids.read_subset(data, slice(1, 3), [slice(3, 5), slice(0, 1)])
+    np.testing.assert_array_equal(subset, [[8., 9., 5.], [13., 14., 10.]])
+    single = grids.read_subset(data, slice(0, 1), [slice(0, 2)])
+    np.testing.assert_array_equal(single, [[0., 1.]])
+
+
+def test_read_subset_masked():
+    data = np.ma.masked_greater(np.arange(20.).reshape(4, 5), 18.)
+    subset = grids.read_subset(data, slice(3, 4), [slice(4, 5), slice(0, 1)])
+    assert np.ma.isMaskedArray(subset)
+    np.testing.assert_array_equal(subset.mask, [[True, False]])
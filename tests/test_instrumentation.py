@@ -0,0 +1,79 @@
+"""tests for the instrumentation module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+
+import pytest
+
+from instrumentation import PlotStats
+
+
+@pytest.fixture
+def stats():
+    stats = PlotStats()
+    stats.enable()
+    return stats
+
+
+def test_disabled_by_default():
+    stats = PlotStats()
+    with stats.timer('stage'):
+        pass
+    stats.count('text_ndc')
+    assert stats.as_dict() == {'timings': {}, 'counts': {}}
+
+
+def test_timer(stats):
+    for _ in range(3):
+        with stats.timer('stage'):
+            pass
+    timing = stats.as_dict()['timings']['stage']
+    assert timing['calls'] == 3
+    assert timing['seconds'] >= 0.
+
+
+def test_timer_records_failed_stages(stats):
+    with pytest.raises(ValueError):
+        with stats.timer('stage'):
+            raise ValueError()
+    assert stats.as_dict()['timings']['stage']['calls'] == 1
+
+
+def test_count(stats):
+    stats.count('text_ndc')
+    stats.count('text_ndc', 2)
+    assert stats.as_dict()['counts'] == {'text_ndc': 3}
+
+
+def test_disable_keeps_values(stats):
+    stats.count('draw')
+    stats.disable()
+    stats.count('draw')
+    assert stats.as_dict()['counts'] == {'draw': 1}
+
+
+def test_reset(stats):
+    stats.count('draw')
+    stats.reset()
+    assert stats.as_dict() == {'timings': {}, 'counts': {}}
+
+
+def test_to_json(stats):
+    stats.count('draw')
+    assert json.loads(stats.to_json())['counts'] == {'draw': 1}
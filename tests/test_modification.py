@@ -0,0 +1,247 @@
+"""tests for the modification module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+from modification import (ModificationManager, PlotModifier,
+        ResourceOverlay, _normalize_data)
+from resources import MapResources
+
+
+class _Special(PlotModifier):
+    """A modifier handling a special resource but doing nothing."""
+    resource_names = ['nglxTest']
+
+
+def _ngl_resources(res):
+    """The resources Ngl reads from a resources object."""
+    return dict((name, getattr(res, name)) for name in dir(res)
+            if not name.startswith('__'))
+
+
+def _recording_manager(calls, modifiers=()):
+    def contour_map(wks, data, res):
+        calls.append(res)
+        return None
+    return ModificationManager(contour_map, modifiers)
+
+
+def _map_resources(**resources):
+    res = MapResources()
+    res.lbOrientation = 'Vertical'
+    res.nglDraw = False
+    res.nglFrame = False
+    for name, value in resources.items():
+        setattr(res, name, value)
+    return res
+
+
+def test_materialize_keeps_class():
+    res = _map_resources()
+    view = ResourceOverlay(res, cnFillOn=False)
+    materialized = view.materialize()
+    assert type(materialized) is MapResources
+    assert materialized.lbOrientation == 'Vertical'
+    assert materialized.cnFillOn is False
+    assert not hasattr(res, 'cnFillOn')
+
+
+def test_materialize_without_changes_is_not_copied():
+    res = _map_resources()
+    assert ResourceOverlay(res).materialize() is res
+
+
+def test_materialize_hidden_names():
+    res = _map_resources(cnFillOn=True)
+    view = ResourceOverlay(ResourceOverlay(res))
+    del view.cnFillOn
+    materialized = view.materialize()
+    assert type(materialized) is MapResources
+    assert not hasattr(materialized, 'cnFillOn')
+    assert res.cnFillOn is True
+
+
+def test_copy_and_copy_free_paths_agree():
+    # A special resource forces a copy, without it the resources are
+    # passed on unchanged.
+    calls = []
+    manager = _recording_manager(calls, [_Special()])
+    data = [[1., 2.], [3., 4.]]
+    manager(None, data, _map_resources())
+    manager(None, data, _map_resources(nglxTest=True))
+    copy_free, copied = calls
+    assert type(copied) is MapResources
+    assert _ngl_resources(copied) == _ngl_resources(copy_free)
+    assert _ngl_resources(copied)['lbOrientation'] == 'Vertical'
+
+
+class _Recorder(PlotModifier):
+    """A modifier recording the contexts postplot receives."""
+
+    def __init__(self):
+        self.contexts = []
+
+    def preplot(self, *args):
+        return len(args)
+
+    def postplot(self, wks, plot, context):
+        self.contexts.append(context)
+
+
+class _LegacyRecorder(PlotModifier):
+    """A modifier with the postplot method used before contexts."""
+
+    def __init__(self):
+        self.plots = []
+
+    def postplot(self, wks, plot):
+        self.plots.append(plot)
+
+
+def test_postplot_receives_context():
+    recorder = _Recorder()
+    manager = _recording_manager([], [recorder])
+    manager(None, [[1., 2.]], _map_resources())
+    assert recorder.contexts == [3]
+
+
+def test_legacy_postplot_is_supported():
+    legacy = _LegacyRecorder()
+    recorder = _Recorder()
+    manager = _recording_manager([], [legacy, recorder])
+    plot = manager(None, [[1., 2.]], _map_resources())
+    assert legacy.plots == [plot]
+    assert recorder.contexts == [3]
+
+
+def test_modifiers_are_per_manager():
+    first = _recording_manager([])
+    second = _recording_manager([])
+    recorder = _Recorder()
+    first.addModifiers(recorder)
+    assert first.modifiers == (recorder,)
+    assert second.modifiers == ()
+
+
+class _Tracer(PlotModifier):
+    """A modifier recording when it is applied."""
+
+    def __init__(self, log, name, resource_names=()):
+        self.log = log
+        self.name = name
+        self.resource_names = list(resource_names)
+
+    def preplot(self, *args):
+        self.log.append(self.name)
+
+
+def test_modifiers_are_selected_by_resource():
+    log = []
+    calls = []
+    manager = _recording_manager(calls, [_Tracer(log, 'a', ['nglxA']),
+            _Tracer(log, 'always'), _Tracer(log, 'b', ['nglxB'])])
+    manager(None, [[1.]], _map_resources())
+    assert log == ['always']
+    del log[:]
+    manager(None, [[1.]], _map_resources(nglxB=True, nglxA=1))
+    assert log == ['a', 'always', 'b']
+    # The special resources are not passed to Ngl.
+    assert not hasattr(calls[-1], 'nglxA')
+    assert not hasattr(calls[-1], 'nglxB')
+
+
+def test_set_modifiers_replaces_index():
+    log = []
+    manager = _recording_manager([], [_Tracer(log, 'a', ['nglxA'])])
+    manager.setModifiers([_Tracer(log, 'b', ['nglxB'])])
+    manager(None, [[1.]], _map_resources(nglxA=True, nglxB=True))
+    assert log == ['b']
+
+
+def test_stages_are_recorded():
+    from instrumentation import stats
+    stats.reset()
+    stats.enable()
+    try:
+        _recording_manager([])(None, [[1.]], _map_resources())
+        recorded = stats.as_dict()
+    finally:
+        stats.disable()
+        stats.reset()
+    assert recorded['counts']['contour_map'] == 1
+    for stage in ('preplot', 'plot', 'postplot'):
+        assert recorded['timings']['contour_map.' + stage]['calls'] == 1
+
+
+def test_normalize_clean_data_is_not_copied():
+    data = np.arange(6.).reshape(2, 3)
+    normalized, missing = _normalize_data(data)
+    assert normalized is data
+    assert missing is None
+
+
+def test_normalize_converts_other_data():
+    normalized, missing = _normalize_data(np.arange(6, dtype=np.int32))
+    assert normalized.dtype == np.float64
+    assert missing is None
+    transposed = np.arange(6.).reshape(2, 3).T
+    normalized, _ = _normalize_data(transposed)
+    assert normalized.flags.c_contiguous
+    np.testing.assert_array_equal(normalized, transposed)
+    normalized, _ = _normalize_data([[1, 2], [3, 4]])
+    assert normalized.dtype == np.float64
+
+
+def test_normalize_fills_missing_points():
+    data = np.ma.masked_equal([1., 2., 3., np.nan], 2.)
+    normalized, missing = _normalize_data(data)
+    assert not np.ma.isMaskedArray(normalized)
+    assert missing == data.fill_value
+    np.testing.assert_array_equal(normalized, [1., missing, 3., missing])
+    # The data passed in is not changed.
+    assert data[1] is np.ma.masked
+    assert np.isnan(data[3])
+
+
+def test_normalize_missing_value():
+    normalized, missing = _normalize_data(np.array([np.nan, 1.]))
+    assert missing == 1e20
+    normalized, missing = _normalize_data(np.array([np.nan, 1.]), -999.)
+    assert missing == -999.
+    np.testing.assert_array_equal(normalized, [-999., 1.])
+
+
+def test_normalize_leaves_other_arguments():
+    normalized, missing = _normalize_data('not data')
+    assert normalized == 'not data'
+    assert missing is None
+
+
+def test_manager_sets_missing_value_resource():
+    calls = []
+
+    def contour(wks, data, res=None):
+        calls.append((data, res))
+    ModificationManager(contour)(None, np.array([[np.nan, 1.]]))
+    data, res = calls[0]
+    assert res.sfMissingValueV == 1e20
+    np.testing.assert_array_equal(data, [[1e20, 1.]])
@@ -0,0 +1,229 @@
+"""tests for the modifiers module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+import modifiers
+
+
+def _resources(**resources):
+    res = Ngl.Resources()
+    for name, value in resources.items():
+        setattr(res, name, value)
+    return res
+
+
+@pytest.fixture
+def workstation_size(monkeypatch):
+    """Workstations are 800 pixels wide and 400 pixels high."""
+    sizes = {'wkWidth': 800, 'wkHeight': 400}
+    monkeypatch.setattr(Ngl, 'get_integer', lambda wks, name: sizes[name])
+
+
+def test_viewport_width_pixels(workstation_size):
+    res = _resources(vpWidthF=0.5, vpHeightF=0.5)
+    assert modifiers._viewport_pixels(None, res, 'vpWidthF') == 400
+
+
+def test_viewport_height_pixels(workstation_size):
+    res = _resources(vpWidthF=0.5, vpHeightF=0.5)
+    assert modifiers._viewport_pixels(None, res, 'vpHeightF') == 200
+
+
+def test_viewport_pixels_without_workstation_size(monkeypatch):
+    def get_integer(wks, name):
+        raise ValueError(name)
+    monkeypatch.setattr(Ngl, 'get_integer', get_integer)
+    res = _resources(vpHeightF=0.25)
+    assert modifiers._viewport_pixels(None, res, 'vpHeightF') == 256
+
+
+def test_line_decimation_reduces_curves(workstation_size):
+    y = np.sin(np.linspace(0., 100., 10000))
+    res = _resources(nglxDecimate=True, nglxDecimatePoints=200)
+    plot_func, args = modifiers.LineDecimation().prepare(Ngl.y,
+            [None, y, res])
+    # The reduced curve is plotted against the indices of its points.
+    assert plot_func is Ngl.xy
+    _, x, ynew, newres = args
+    assert newres is res
+    assert ynew.size <= 200
+    np.testing.assert_array_equal(y[x], ynew)
+
+
+def test_line_decimation_points_from_viewport(workstation_size):
+    y = np.random.RandomState(0).normal(size=(2, 10000))
+    res = _resources(nglxDecimate=True, vpWidthF=0.25)
+    _, args = modifiers.LineDecimation().prepare(Ngl.xy,
+            [None, np.arange(10000.), y, res])
+    # Two points per pixel across a 200 pixel viewport.
+    assert args[2].shape[0] == 2
+    assert args[2].shape[1] <= 400
+
+
+def test_line_decimation_short_curves_unchanged(workstation_size):
+    args = [None, np.arange(10.), np.arange(10.),
+            _resources(nglxDecimate=True)]
+    plot_func, new_args = modifiers.LineDecimation().prepare(Ngl.xy, args)
+    assert plot_func is Ngl.xy
+    assert new_args is args
+
+
+def test_line_decimation_off_by_default(workstation_size):
+    args = [None, np.arange(10000.), _resources()]
+    plot_func, new_args = modifiers.LineDecimation().prepare(Ngl.y, args)
+    assert plot_func is Ngl.y
+    assert new_args is args
+
+
+def test_field_coarsening_factor(workstation_size):
+    data = np.arange(64.).reshape(8, 8)
+    res = _resources(nglxCoarsen=True, nglxCoarsenFactor=2,
+            sfXArray=np.arange(8.), sfYArray=np.arange(8.))
+    plot_func, args = modifiers.FieldCoarsening().prepare(Ngl.contour,
+            [None, data, res])
+    assert plot_func is Ngl.contour
+    assert args[1].shape == (4, 4)
+    np.testing.assert_array_equal(res.sfXArray, [.5, 2.5, 4.5, 6.5])
+    np.testing.assert_array_equal(res.sfYArray, [.5, 2.5, 4.5, 6.5])
+
+
+def test_field_coarsening_factors_from_viewport(workstation_size):
+    # The viewport is 400 by 200 pixels.
+    res = _resources(nglxCoarsen=True, vpWidthF=0.5, vpHeightF=0.5)
+    _, args = modifiers.FieldCoarsening().prepare(Ngl.contour,
+            [None, np.zeros((1000, 1200)), res])
+    assert args[1].shape == (200, 400)
+
+
+def test_field_coarsening_map_limits(workstation_size):
+    # Only a tenth of the columns and half of the rows are visible.
+    res = _resources(nglxCoarsen=True, vpWidthF=0.5, vpHeightF=0.5,
+            sfXArray=np.linspace(0., 359.9, 3600),
+            sfYArray=np.linspace(-90., 90., 800),
+            mpMinLonF=0., mpMaxLonF=36., mpMinLatF=0., mpMaxLatF=90.)
+    factors = modifiers.FieldCoarsening()._factors(None, res, (800, 3600),
+            res.sfXArray, res.sfYArray)
+    assert factors == (2, 1)
+
+
+def test_field_coarsening_small_fields_unchanged(workstation_size):
+    args = [None, np.zeros((10, 10)), _resources(nglxCoarsen=True)]
+    _, new_args = modifiers.FieldCoarsening().prepare(Ngl.contour, args)
+    assert new_args is args
+
+
+def _vector_arguments(shape, **resources):
+    u = np.ones(shape)
+    v = np.ones(shape)
+    res = _resources(nglxThin=True, vfXArray=np.linspace(0., 359., shape[1]),
+            vfYArray=np.linspace(0., 89., shape[0]), **resources)
+    return [None, u, v, res]
+
+
+def test_field_thinning_spacing():
+    args = _vector_arguments((100, 100), nglxThinSpacingF=0.1)
+    _, new_args = modifiers.FieldThinning().prepare(Ngl.vector, args)
+    _, u, v, res = new_args
+    assert u.shape == v.shape == (10, 10)
+    assert res.vfXArray.shape == (10,)
+    assert res.vfYArray.shape == (10,)
+    assert not np.ma.is_masked(u)
+
+
+def test_field_thinning_min_distance():
+    args = _vector_arguments((100, 100), vcMinDistanceF=0.05)
+    _, new_args = modifiers.FieldThinning().prepare(Ngl.vector, args)
+    assert new_args[1].shape == (20, 20)
+
+
+def test_field_thinning_converging_meridians():
+    args = _vector_arguments((100, 100), nglxThinSpacingF=0.1,
+            mpProjection='Stereographic')
+    _, new_args = modifiers.FieldThinning().prepare(Ngl.vector_map, args)
+    u, v = new_args[1:3]
+    # Points are removed from the same places in both components.
+    np.testing.assert_array_equal(np.ma.getmaskarray(u),
+            np.ma.getmaskarray(v))
+    assert not np.ma.getmaskarray(u)[0].any()
+    assert np.ma.getmaskarray(u)[-1].any()
+
+
+def test_field_thinning_parallel_meridians():
+    args = _vector_arguments((100, 100), nglxThinSpacingF=0.1)
+    _, new_args = modifiers.FieldThinning().prepare(Ngl.vector_map, args)
+    assert not np.ma.is_masked(new_args[1])
+
+
+def test_field_thinning_unknown_method():
+    args = _vector_arguments((100, 100), nglxThinMethod='median')
+    with pytest.raises(ValueError):
+        modifiers.FieldThinning().prepare(Ngl.vector, args)
+
+
+def _subset_resources(**resources):
+    return _resources(nglxSubset=True, nglxSubsetHalo=0,
+            sfXArray=np.arange(0., 360., 1.), sfYArray=np.arange(-90., 91.),
+            **resources)
+
+
+def test_domain_subsetting_memory_map(tmpdir):
+    path = str(tmpdir.join('field.dat'))
+    field = np.memmap(path, dtype=np.float64, mode='w+', shape=(181, 360))
+    field[:] = np.arange(360.)
+    res = _subset_resources(mpMinLatF=0., mpMaxLatF=10., mpMinLonF=-5.,
+            mpMaxLonF=5.)
+    plot_func, args = modifiers.DomainSubsetting().prepare(Ngl.contour_map,
+            [None, field, res])
+    assert plot_func is Ngl.contour_map
+    subset = args[1]
+    assert subset.shape == (11, 11)
+    np.testing.assert_array_equal(subset[0], np.mod(np.arange(355., 366.),
+            360.))
+    np.testing.assert_array_equal(res.sfXArray, np.arange(355., 366.))
+    np.testing.assert_array_equal(res.sfYArray, np.arange(0., 11.))
+
+
+def test_domain_subsetting_vectors():
+    u = np.zeros((181, 360))
+    v = np.ones((181, 360))
+    res = _resources(nglxSubset=True, vfXArray=np.arange(0., 360., 1.),
+            vfYArray=np.arange(-90., 91.), mpMinLatF=0., mpMaxLatF=10.,
+            mpMinLonF=20., mpMaxLonF=30.)
+    _, args = modifiers.DomainSubsetting().prepare(Ngl.vector_map,
+            [None, u, v, res])
+    # The default halo is two rows and columns.
+    assert args[1].shape == args[2].shape == (15, 15)
+    assert res.vfXArray.shape == (15,)
+
+
+def test_domain_subsetting_other_limit_modes():
+    args = [None, np.zeros((181, 360)), _subset_resources(mpMinLatF=0.,
+            mpLimitMode='Corners')]
+    _, new_args = modifiers.DomainSubsetting().prepare(Ngl.contour_map, args)
+    assert new_args is args
+
+
+def test_domain_subsetting_without_limits():
+    args = [None, np.zeros((181, 360)), _subset_resources()]
+    _, new_args = modifiers.DomainSubsetting().prepare(Ngl.contour_map, args)
+    assert new_args is args
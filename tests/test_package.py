@@ -0,0 +1,50 @@
+"""tests for the lazy importing of the package contents"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+
+import pytest
+
+nglextras = pytest.importorskip('nglextras')
+
+
+@pytest.mark.parametrize('name', ['decimation', 'grids', 'quantiles'])
+def test_submodules_without_ngl(name):
+    module = getattr(nglextras, name)
+    assert module is sys.modules['nglextras.%s' % name]
+
+
+@pytest.mark.parametrize('name', ['plotting', 'resources', 'modification',
+        'modifiers', 'instrumentation', 'retained', 'batch', 'shared',
+        'workstations', 'server'])
+def test_submodules(name):
+    pytest.importorskip('Ngl')
+    module = getattr(nglextras, name)
+    assert module is sys.modules['nglextras.%s' % name]
+
+
+def test_objects():
+    pytest.importorskip('Ngl')
+    for name in nglextras.__all__:
+        assert getattr(nglextras, name) is not None
+
+
+def test_unknown_name():
+    with pytest.raises(AttributeError):
+        nglextras.no_such_thing
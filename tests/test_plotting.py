@@ -0,0 +1,361 @@
+"""tests for the plotting module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+import plotting
+from plotting import PanelLayout, PanelPlot
+
+
+class _Plot(object):
+    """Stands in for an Ngl plot, keeping its viewport resources."""
+
+    def __init__(self, width=0.4, height=0.3):
+        self.resources = dict(vpXF=0.2, vpYF=0.8, vpWidthF=width,
+                vpHeightF=height)
+        self.destroyed = False
+
+
+@pytest.fixture
+def ngl_calls(monkeypatch):
+    """Record the Ngl calls that change or draw plots."""
+    calls = []
+
+    def set_values(plot, res):
+        calls.append(('set_values', plot))
+        plot.resources.update(res.__dict__)
+
+    def destroy(plot):
+        calls.append(('destroy', plot))
+        plot.destroyed = True
+
+    monkeypatch.setattr(Ngl, 'get_float',
+            lambda plot, name: np.float32(plot.resources[name]))
+    monkeypatch.setattr(Ngl, 'set_values', set_values)
+    monkeypatch.setattr(Ngl, 'destroy', destroy)
+    monkeypatch.setattr(Ngl, 'draw', lambda plot: calls.append(('draw', plot)))
+    monkeypatch.setattr(Ngl, 'frame', lambda wks: calls.append(('frame', wks)))
+    monkeypatch.setattr(Ngl, 'text_ndc', lambda *args: None)
+    return calls
+
+
+def _calls(calls, name):
+    return [plot for call, plot in calls if call == name]
+
+
+def test_layout_grid():
+    layout = PanelLayout((2, 3), 0.2, 0.1)
+    assert layout.number_panels == 6
+    assert layout.x.shape == layout.y.shape == (6,)
+    # Rows are evenly spaced and the panel is centered.
+    np.testing.assert_allclose(np.diff(layout.x[:3]), 0.2 + layout.delta_x)
+    np.testing.assert_allclose(layout.y[3:] - layout.y[:3],
+            -(0.1 + layout.delta_y))
+    assert abs(layout.panel_center_x - 0.5) < 1e-12
+    np.testing.assert_allclose(layout.x[0] + layout.total_width / 2., 0.5)
+
+
+def test_layout_row_spec_centers_short_rows():
+    res = Ngl.Resources()
+    res.nglPanelRowSpec = True
+    layout = PanelLayout((3, 2), 0.2, 0.1, res)
+    assert layout.number_panels == 5
+    # The short second row is centered under the first.
+    row_width = 2 * 0.2 + layout.delta_x
+    np.testing.assert_allclose(layout.x[3] + row_width / 2., 0.5)
+
+
+def test_layout_is_cached():
+    assert PanelLayout.cached((2, 2), 0.3, 0.2) is \
+            PanelLayout.cached((2, 2), 0.3, 0.2)
+
+
+def test_panel_positions_plots(ngl_calls):
+    plots = [_Plot(), _Plot()]
+    PanelPlot()(None, plots, (1, 2))
+    layout = PanelLayout.cached((1, 2), 0.4, 0.3)
+    for plot, x, y in zip(plots, layout.x, layout.y):
+        assert abs(plot.resources['vpXF'] - x) < 1e-6
+        assert abs(plot.resources['vpYF'] - y) < 1e-6
+    assert _calls(ngl_calls, 'draw') == plots
+    assert len(_calls(ngl_calls, 'frame')) == 1
+
+
+def test_panel_skips_plots_in_position(ngl_calls):
+    plots = [_Plot(), _Plot()]
+    panel = PanelPlot()
+    panel(None, plots, (1, 2))
+    del ngl_calls[:]
+    panel(None, plots, (1, 2))
+    assert _calls(ngl_calls, 'set_values') == []
+
+
+def test_panel_repositions_moved_plots(ngl_calls):
+    plots = [_Plot(), _Plot()]
+    panel = PanelPlot()
+    panel(None, plots, (1, 2))
+    position = dict(plots[1].resources)
+    # The plot is used elsewhere between panels.
+    plots[1].resources['vpXF'] = 0.1
+    del ngl_calls[:]
+    panel(None, plots, (1, 2))
+    assert _calls(ngl_calls, 'set_values') == [plots[1]]
+    assert plots[1].resources == position
+
+
+def test_panel_factories_are_built_and_destroyed(ngl_calls):
+    built = []
+
+    def factory(wks):
+        plot = _Plot()
+        built.append(plot)
+        return plot
+
+    PanelPlot()(None, [factory, factory, None], (1, 3))
+    # The template plot is reused for its own panel.
+    assert len(built) == 2
+    assert _calls(ngl_calls, 'draw') == built
+    assert all(plot.destroyed for plot in built)
+
+
+class _Primitives(object):
+    """Records the base plot and primitives drawn for a histogram."""
+
+    def __init__(self):
+        self.base = None
+        self.polygons = []
+        self.polylines = []
+
+
+@pytest.fixture
+def primitives(monkeypatch):
+    primitives = _Primitives()
+
+    def xy(wks, x, y, res):
+        primitives.base = (x, y)
+        return _Plot()
+
+    def add_polygon(wks, plot, x, y, res):
+        primitives.polygons.append((x, y, res.gsSegments))
+        return len(primitives.polygons)
+
+    def add_polyline(wks, plot, x, y, res):
+        primitives.polylines.append((x, y, res.gsSegments))
+        return len(primitives.polylines)
+
+    monkeypatch.setattr(plotting, 'xy', xy)
+    monkeypatch.setattr(Ngl, 'add_polygon', add_polygon)
+    monkeypatch.setattr(Ngl, 'add_polyline', add_polyline)
+    monkeypatch.setattr(Ngl, 'draw', lambda plot: None)
+    monkeypatch.setattr(Ngl, 'frame', lambda wks: None)
+    return primitives
+
+
+def _histogram_resources(**resources):
+    res = Ngl.Resources()
+    for name, value in resources.items():
+        setattr(res, name, value)
+    return res
+
+
+def _bar_heights(primitives, series=0):
+    """Heights of the bars drawn for a series."""
+    y = primitives.polygons[series][1]
+    return y.reshape(-1, 5)[:, 2]
+
+
+def test_bar_vertices():
+    xbars, ybars = plotting._bar_vertices([0., 1.], 1., [2., 3.], 0., 0.5)
+    np.testing.assert_array_equal(xbars, [[0., .5, .5, 0., 0.],
+            [1., 1.5, 1.5, 1., 1.]])
+    np.testing.assert_array_equal(ybars, [[0., 0., 2., 2., 0.],
+            [0., 0., 3., 3., 0.]])
+
+
+@pytest.mark.parametrize('nbins', [1, 10, 1000])
+def test_histogram_draws_one_polygon_and_polyline(primitives, nbins):
+    data = np.random.RandomState(0).normal(size=5000)
+    res = _histogram_resources(nglHistogramNumberOfBins=nbins,
+            nglxHistogramDensity=False)
+    plotting.histogram(None, data, res)
+    assert len(primitives.polygons) == len(primitives.polylines) == 1
+    x, y, segments = primitives.polygons[0]
+    assert x.shape == y.shape == (5 * nbins,)
+    np.testing.assert_array_equal(segments, np.arange(0, 5 * nbins, 5))
+    np.testing.assert_array_equal(_bar_heights(primitives),
+            np.histogram(data, nbins)[0])
+    # The resources passed in are not modified.
+    assert not hasattr(res, 'nglDraw')
+
+
+def test_chunked_counts_match_in_memory(tmpdir):
+    data = np.random.RandomState(1).normal(size=10000)
+    expected, edges = np.histogram(data, 20)
+    path = str(tmpdir.join('data.npy'))
+    np.save(path, data)
+    mapped = np.load(path, mmap_mode='r')
+    hist, binedges = plotting._histogram_counts(mapped, 20, None, False, 999)
+    np.testing.assert_array_equal(hist, expected)
+    np.testing.assert_allclose(binedges, edges)
+
+
+def test_generator_of_chunks():
+    data = np.random.RandomState(2).uniform(size=(10, 100))
+    chunks = (row for row in data)
+    hist, _ = plotting._histogram_counts(chunks, 5, (0., 1.), False, None)
+    np.testing.assert_array_equal(hist, np.histogram(data, 5, (0., 1.))[0])
+
+
+def test_generator_of_chunks_needs_range():
+    chunks = (row for row in np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        plotting._histogram_counts(chunks, 5, None, False, None)
+
+
+def test_chunked_density():
+    data = np.random.RandomState(3).normal(size=1000)
+    chunks = iter(np.array_split(data, 7))
+    hist, _ = plotting._histogram_counts(chunks, 10, (-4., 4.), True,
+            None)
+    np.testing.assert_allclose(hist,
+            np.histogram(data, 10, (-4., 4.), density=True)[0])
+
+
+def test_histogram_from_counts(primitives):
+    counts = np.array([3., 1., 4.])
+    edges = np.array([0., 1., 2., 4.])
+    plotting.histogram_from_counts(None, counts, edges,
+            _histogram_resources(nglHistogramNumberOfBins=50))
+    np.testing.assert_array_equal(_bar_heights(primitives), counts)
+    x = primitives.polygons[0][0]
+    np.testing.assert_array_equal(x.reshape(-1, 5)[:, 1], edges[1:])
+
+
+def test_histogram_from_counts_checks_edges(primitives):
+    with pytest.raises(ValueError):
+        plotting.histogram_from_counts(None, [1., 2.], [0., 1.],
+                _histogram_resources())
+
+
+def test_multi_histogram_counts_match_numpy():
+    data = np.random.RandomState(4).normal(size=(3, 500))
+    hist, edges = plotting._multi_histogram_counts(data, 8, (-3., 3.),
+            False)
+    assert hist.shape == (3, 8)
+    for row, counts in zip(data, hist):
+        np.testing.assert_array_equal(counts,
+                np.histogram(row, edges)[0])
+
+
+def test_multi_histogram_includes_last_edge():
+    data = np.array([[0., 1., 2.], [2., 2., 3.]])
+    hist, _ = plotting._multi_histogram_counts(data, [0., 1., 2.],
+            None, False)
+    np.testing.assert_array_equal(hist, [[1, 2], [0, 2]])
+
+
+def test_multi_histogram_stacked(primitives):
+    data = np.array([[0.5, 1.5, 1.5], [0.5, 0.5, 1.5]])
+    res = _histogram_resources(nglHistogramBinIntervals=[0., 1., 2.],
+            nglxHistogramDensity=False, nglxHistogramStyle='stacked',
+            nglxHistogramBarColor=[2, 3])
+    plotting.multi_histogram(None, data, res)
+    assert len(primitives.polygons) == 2
+    np.testing.assert_array_equal(_bar_heights(primitives, 0), [1, 2])
+    np.testing.assert_array_equal(_bar_heights(primitives, 1), [3, 3])
+
+
+def test_multi_histogram_grouped(primitives):
+    data = np.array([[0.5, 1.5, 1.5], [0.5, 0.5, 1.5]])
+    res = _histogram_resources(nglHistogramBinIntervals=[0., 1., 2.],
+            nglxHistogramDensity=False)
+    plotting.multi_histogram(None, data, res)
+    x0 = primitives.polygons[0][0].reshape(-1, 5)
+    x1 = primitives.polygons[1][0].reshape(-1, 5)
+    # The series share each bin side by side.
+    np.testing.assert_array_equal(x0[:, 0], [0., 1.])
+    np.testing.assert_array_equal(x1[:, 0], [0.5, 1.5])
+    np.testing.assert_array_equal(_bar_heights(primitives, 1), [2, 1])
+
+
+def test_quantile_bins_of_chunked_data():
+    data = np.random.RandomState(5).exponential(size=20000)
+    chunks = iter(np.array_split(data, 9))
+    hist, edges = plotting._histogram_counts(chunks, 4, None, False, None,
+            'quantile')
+    assert len(edges) == 5
+    # Each bin holds about a quarter of the values.
+    np.testing.assert_allclose(hist, 5000., rtol=0.1)
+
+
+def test_panel_builds_one_factory_plot_at_a_time(ngl_calls):
+    alive = []
+
+    def factory(wks):
+        # Every earlier plot has been destroyed by the time the next one is
+        # built, apart from the template.
+        assert sum(not plot.destroyed for plot in alive) <= 1
+        plot = _Plot()
+        alive.append(plot)
+        return plot
+
+    PanelPlot()(None, [factory] * 4, (2, 2))
+    assert len(alive) == 4
+    assert all(plot.destroyed for plot in alive)
+
+
+def test_panel_destroys_undrawn_template(ngl_calls):
+    built = []
+
+    def factory(wks):
+        plot = _Plot()
+        built.append(plot)
+        return plot
+
+    res = Ngl.Resources()
+    res.nglPanelScalePlotIndex = 2
+    # The template is the third plot, which does not fit in the panel.
+    PanelPlot()(None, [_Plot(), _Plot(), factory], (1, 2), res)
+    assert len(built) == 1
+    assert built[0].destroyed
+    assert built[0] not in _calls(ngl_calls, 'draw')
+
+
+def test_panel_destroys_factory_plots_when_drawing_fails(ngl_calls,
+        monkeypatch):
+    built = []
+
+    def factory(wks):
+        plot = _Plot()
+        built.append(plot)
+        return plot
+
+    def draw(plot):
+        raise RuntimeError('drawing failed')
+    monkeypatch.setattr(Ngl, 'draw', draw)
+    res = Ngl.Resources()
+    res.nglPanelScalePlotIndex = 2
+    with pytest.raises(RuntimeError):
+        PanelPlot()(None, [factory] * 3, (1, 3), res)
+    # The plot being drawn and the template built for the plot size.
+    assert len(built) == 2
+    assert all(plot.destroyed for plot in built)
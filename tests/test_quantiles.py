@@ -0,0 +1,132 @@
+"""tests for the quantiles module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+from quantiles import QuantileSketch, bin_edges
+
+
+# Largest error allowed in an estimated rank, as a fraction of the number of
+# values, for sketches with the default accuracy.
+_rank_tolerance = 0.03
+
+
+def _rank_error(sketch, data):
+    """Largest error in the ranks estimated by a sketch."""
+    data = np.sort(data)
+    points = data[::max(data.size // 200, 1)]
+    exact = np.searchsorted(data, points, side='right')
+    return np.abs(sketch.rank(points) - exact).max() / float(data.size)
+
+
+@pytest.fixture
+def data():
+    return np.random.RandomState(0).normal(size=100000)
+
+
+def test_small_data_is_exact():
+    data = np.arange(50.)
+    sketch = QuantileSketch().update(data)
+    np.testing.assert_array_equal(sketch.rank(data), np.arange(1., 51.))
+    np.testing.assert_array_equal(sketch.quantiles([0., 0.5, 1.]),
+            [0., 24., 49.])
+
+
+def test_rank_error_is_bounded(data):
+    sketch = QuantileSketch(seed=1)
+    for chunk in np.array_split(data, 37):
+        sketch.update(chunk)
+    assert sketch.count == data.size
+    assert _rank_error(sketch, data) < _rank_tolerance
+
+
+def test_memory_is_bounded(data):
+    sketch = QuantileSketch(k=100, seed=1).update(data)
+    assert sum(level.size for level in sketch._levels) < 3 * 100
+
+
+def test_extremes_are_exact(data):
+    sketch = QuantileSketch(seed=1).update(data)
+    assert sketch.min == data.min()
+    assert sketch.max == data.max()
+    np.testing.assert_array_equal(sketch.quantiles([0., 1.]),
+            [data.min(), data.max()])
+
+
+def test_non_finite_values_are_ignored():
+    sketch = QuantileSketch().update([1., np.nan, np.inf, 2.])
+    assert sketch.count == 2
+    assert sketch.max == 2.
+
+
+def test_merge(data):
+    first = QuantileSketch(seed=1).update(data[:60000])
+    second = QuantileSketch(seed=2).update(data[60000:])
+    merged = first.merge(second)
+    assert merged.count == data.size
+    assert merged.min == data.min()
+    assert merged.max == data.max()
+    assert _rank_error(merged, data) < _rank_tolerance
+
+
+def test_histogram(data):
+    sketch = QuantileSketch(seed=1).update(data)
+    edges = np.linspace(-5., 5., 11)
+    hist = sketch.histogram(edges)
+    exact = np.histogram(data, edges)[0]
+    assert hist.sum() == pytest.approx(data.size)
+    assert np.abs(hist - exact).max() < 2 * _rank_tolerance * data.size
+    density = sketch.histogram(edges, density=True)
+    assert (density * np.diff(edges)).sum() == pytest.approx(1.)
+
+
+def test_quantile_bin_edges(data):
+    sketch = QuantileSketch(seed=1).update(data)
+    edges = sketch.bin_edges(10, 'quantile')
+    counts = np.histogram(data, edges)[0]
+    assert np.abs(counts - data.size / 10.).max() < \
+            2 * _rank_tolerance * data.size
+
+
+def test_empty_sketch():
+    with pytest.raises(ValueError):
+        QuantileSketch().quantiles(0.5)
+    with pytest.raises(ValueError):
+        QuantileSketch().bin_edges(10)
+
+
+def test_linear_bin_edges():
+    np.testing.assert_array_equal(bin_edges(2, 'linear', None, 0., 1., 1.),
+            [0., 0.5, 1.])
+    # Constant data gets bins of unit width, as with numpy.histogram.
+    np.testing.assert_array_equal(bin_edges(1, 'linear', None, 3., 3., 3.),
+            [2.5, 3.5])
+
+
+def test_log_bin_edges():
+    edges = bin_edges(3, 'log', None, -1., 1000., 1.)
+    np.testing.assert_allclose(edges, [1., 10., 100., 1000.])
+    with pytest.raises(ValueError):
+        bin_edges(3, 'log', None, -2., -1., np.inf)
+
+
+def test_unknown_bin_spacing():
+    with pytest.raises(ValueError):
+        bin_edges(3, 'cubic', None, 0., 1., 1.)
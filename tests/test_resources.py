@@ -0,0 +1,61 @@
+"""tests for the resources module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+from defaults import ngldefaults
+from resources import MapResources, Resources
+
+
+@pytest.fixture
+def defaults():
+    """The defaults, restored after the test."""
+    ngldefaults.freeze()
+    yield ngldefaults
+    ngldefaults.reload()
+
+
+def test_resources_defaults(defaults):
+    res = Resources()
+    assert res.nglDraw is False
+    assert res.tiMainFontHeightF == defaults['fontheight']['title']
+
+
+def test_resources_are_independent(defaults):
+    res = Resources()
+    res.tiMainFontHeightF = 1.
+    assert Resources().tiMainFontHeightF == defaults['fontheight']['title']
+
+
+def test_in_place_edit_of_defaults(defaults):
+    Resources()
+    defaults['fontheight']['title'] = 0.05
+    assert Resources().tiMainFontHeightF == 0.05
+    assert MapResources().tiMainFontHeightF == 0.05
+
+
+def test_map_resources_orientation(defaults):
+    res = MapResources(dims=(0.8, 0.4))
+    assert res.lbOrientation == 'Horizontal'
+    res.lbOrientation = 'Vertical'
+    assert res.lbOrientation == 'Vertical'
+    assert res.pmLabelBarHeightF == 0.6
+    assert res.pmLabelBarWidthF == pytest.approx(0.02 / 0.8)
@@ -0,0 +1,250 @@
+"""tests for the retained module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+import plotting
+from modification import ModificationManager
+from modifiers import FieldCoarsening
+from retained import MapBase, RetainedPlot
+
+
+class _Plot(object):
+    """Stands in for the PlotIds of a contour map."""
+    base = 'base'
+    sffield = 'sffield'
+    contour = 'contour'
+    map = 'map'
+
+
+@pytest.fixture
+def ngl_calls(monkeypatch):
+    """Record the resources set on each member of a plot."""
+    calls = []
+    monkeypatch.setattr(Ngl, 'set_values',
+            lambda member, res: calls.append((member, dict(res.__dict__))))
+    for name in ('draw', 'frame', 'destroy'):
+        monkeypatch.setattr(Ngl, name, lambda *args: None)
+    return calls
+
+
+@pytest.fixture
+def built():
+    """The data and resources each plot was built with."""
+    return []
+
+
+@pytest.fixture
+def contour_map(built):
+    def contour_map(wks, data, res):
+        built.append((data, res))
+        return _Plot()
+    return ModificationManager(contour_map, [FieldCoarsening()])
+
+
+def _resources(**resources):
+    res = Ngl.Resources()
+    res.nglDraw = False
+    res.nglFrame = False
+    for name, value in resources.items():
+        setattr(res, name, value)
+    return res
+
+
+def _field(value=1.):
+    return np.full((8, 8), value)
+
+
+def test_new_data_is_pushed(contour_map, built, ngl_calls):
+    res = _resources(cnFillOn=True)
+    plot = RetainedPlot(contour_map, None, _field(), res)
+    new = _field(2.)
+    plot.update(new, res)
+    assert len(built) == 1
+    assert len(ngl_calls) == 1
+    member, resources = ngl_calls[0]
+    assert member == 'sffield'
+    assert list(resources) == ['sfDataArray']
+    assert resources['sfDataArray'] is new
+
+
+def test_unchanged_resources_are_not_pushed(contour_map, ngl_calls):
+    field = _field()
+    res = _resources(cnFillOn=True)
+    plot = RetainedPlot(contour_map, None, field, res)
+    plot.update(field, res)
+    assert ngl_calls == [('sffield', dict(sfDataArray=field))]
+
+
+def test_refilled_buffer_is_pushed(contour_map, ngl_calls):
+    buffer = _field()
+    res = _resources()
+    plot = RetainedPlot(contour_map, None, buffer, res)
+    for value in (2., 3.):
+        buffer[:] = value
+        plot.update(buffer, res)
+    assert len(ngl_calls) == 2
+    for member, resources in ngl_calls:
+        assert member == 'sffield'
+        assert resources['sfDataArray'] is buffer
+
+
+def test_ngl_function(built, ngl_calls):
+    def contour_map(wks, data, res):
+        # Ngl reads the resources from the attributes of the object.
+        built.append(dict((name, getattr(res, name)) for name in dir(res)
+                if not name.startswith('__')))
+        return _Plot()
+    res = _resources(cnFillOn=True)
+    plot = RetainedPlot(contour_map, None, _field(), res)
+    plot.update(_field(), _resources(cnFillOn=True, cnLinesOn=False))
+    assert len(built) == 1
+    assert built[0] == dict(cnFillOn=True, nglDraw=False, nglFrame=False)
+    assert ('contour', dict(cnLinesOn=False)) in ngl_calls
+
+
+def test_changed_resources_are_pushed(contour_map, ngl_calls):
+    field = _field()
+    res = _resources(cnLevelSpacingF=1.)
+    plot = RetainedPlot(contour_map, None, field, res)
+    res.cnLevelSpacingF = 2.
+    plot.update(field, res)
+    assert len(ngl_calls) == 2
+    assert ('sffield', dict(sfDataArray=field)) in ngl_calls
+    assert ('contour', dict(cnLevelSpacingF=2.)) in ngl_calls
+
+
+def test_missing_data_is_filled(contour_map, ngl_calls):
+    res = _resources()
+    plot = RetainedPlot(contour_map, None, _field(), res)
+    new = np.ma.masked_greater(np.arange(64.).reshape(8, 8), 60.)
+    new[0, 0] = np.nan
+    plot.update(new, res)
+    (member, resources), = ngl_calls
+    assert member == 'sffield'
+    data = resources['sfDataArray']
+    missing = resources['sfMissingValueV']
+    assert not np.ma.isMaskedArray(data)
+    assert data[0, 0] == missing
+    assert (data[7, 5:] == missing).all()
+    assert data[1, 1] == 9.
+
+
+def test_modifiers_apply_to_updates(contour_map, built, ngl_calls):
+    x = np.arange(8.)
+    res = _resources(nglxCoarsen=True, nglxCoarsenFactor=2, sfXArray=x)
+    plot = RetainedPlot(contour_map, None, _field(), res)
+    assert built[0][0].shape == (4, 4)
+    plot.update(_field(2.), res)
+    resources = dict()
+    for member, pushed in ngl_calls:
+        assert member == 'sffield'
+        resources.update(pushed)
+    assert resources['sfDataArray'].shape == (4, 4)
+    np.testing.assert_array_equal(resources['sfDataArray'], 2.)
+    np.testing.assert_array_equal(resources['sfXArray'], [.5, 2.5, 4.5, 6.5])
+    assert not any(name.startswith('nglx') for name in resources)
+
+
+def test_special_resource_change_rebuilds(contour_map, built, ngl_calls):
+    field = _field()
+    res = _resources(nglxCoarsen=True, nglxCoarsenFactor=2)
+    plot = RetainedPlot(contour_map, None, field, res)
+    res.nglxCoarsenFactor = 4
+    plot.update(field, res)
+    assert len(built) == 2
+    assert built[1][0].shape == (2, 2)
+    assert ngl_calls == []
+
+
+class _MapPlot(object):
+    """Stands in for the plot made by plotting.map."""
+    pass
+
+
+@pytest.fixture
+def map_calls(monkeypatch):
+    """Record the Ngl calls that change a map and its overlays."""
+    calls = []
+
+    def record(name, result=None):
+        def function(*args):
+            calls.append((name,) + args)
+            return result
+        return function
+
+    monkeypatch.setattr(plotting, 'map', lambda wks, res: _MapPlot())
+    monkeypatch.setattr(Ngl, 'text_ndc',
+            lambda wks, text, x, y, res: 'text:' + text)
+    monkeypatch.setattr(Ngl, 'add_annotation',
+            lambda plot, text, res: 'annotation:' + text)
+    for name in ('overlay', 'remove_overlay', 'remove_annotation',
+            'destroy', 'draw', 'frame'):
+        monkeypatch.setattr(Ngl, name, record(name))
+    return calls
+
+
+def _contour(wks, data, res):
+    """A plotting function recording the resources it was given."""
+    plot = _MapPlot()
+    plot.res = res
+    return plot
+
+
+def test_map_base_overlay_and_remove(map_calls):
+    base = MapBase(None)
+    plot = base.overlay(_contour, _field(), _resources(nglLeftString='t2m',
+            cnFillOn=True))
+    # The title string is attached to the map, not the data plot.
+    assert not hasattr(plot.res, 'nglLeftString')
+    # An Ngl function is given real resources rather than a view.
+    assert type(plot.res) is Ngl.Resources
+    assert 'cnFillOn' in dir(plot.res)
+    assert plot.res.cnFillOn is True
+    assert ('overlay', base.plot, plot) in map_calls
+    assert base.plot._nglstrings['left'] == [('text:t2m',
+            'annotation:text:t2m')]
+    base.remove(plot)
+    assert ('remove_overlay', base.plot, plot, 0) in map_calls
+    assert ('remove_annotation', base.plot, 'annotation:text:t2m') in \
+            map_calls
+    assert ('destroy', plot) in map_calls
+    assert ('destroy', 'text:t2m') in map_calls
+    assert base.plot._nglstrings['left'] == []
+
+
+def test_map_base_keeps_other_annotations(map_calls):
+    base = MapBase(None)
+    first = base.overlay(_contour, _field(), _resources(nglLeftString='a'))
+    second = base.overlay(_contour, _field(), _resources(nglLeftString='b'))
+    base.remove(first, destroy=False)
+    assert base.plot._nglstrings['left'] == [('text:b', 'annotation:text:b')]
+    assert ('destroy', first) not in map_calls
+    assert ('destroy', 'text:a') not in map_calls
+    base.remove(second)
+    assert base.plot._nglstrings['left'] == []
+
+
+def test_map_base_draw(map_calls):
+    base = MapBase(None)
+    base.draw(frame=True)
+    assert [call[0] for call in map_calls] == ['draw', 'frame']
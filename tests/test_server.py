@@ -0,0 +1,120 @@
+"""tests for the server module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import socket
+import stat
+import threading
+import time
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+import server
+from instrumentation import stats
+from server import RenderClient, RenderServer
+
+
+def _blank(wks):
+    Ngl.frame(wks)
+
+
+def _slow(wks):
+    time.sleep(2.)
+    Ngl.frame(wks)
+
+
+def test_messages_are_framed():
+    a, b = socket.socketpair()
+    try:
+        message = ('render', np.arange(1000.))
+        server._send(a, message)
+        server._send(a, 'ping')
+        command, array = server._receive(b)
+        assert command == 'render'
+        np.testing.assert_array_equal(array, message[1])
+        assert server._receive(b) == 'ping'
+        a.close()
+        with pytest.raises(EOFError):
+            server._receive(b)
+    finally:
+        a.close()
+        b.close()
+
+
+@pytest.fixture
+def render_server(tmpdir):
+    address = str(tmpdir.join('ngl.sock'))
+    render_server = RenderServer(address, directory=str(tmpdir),
+            processes=1)
+    thread = threading.Thread(target=render_server.serve_forever)
+    thread.start()
+    yield render_server
+    render_server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def recording():
+    stats.reset()
+    stats.enable()
+    yield stats
+    stats.disable()
+    stats.reset()
+
+
+def test_render(render_server, recording, tmpdir):
+    with RenderClient(render_server.address) as client:
+        client.ping()
+        result = client.render(_blank, name='plot')
+        assert result.error is None
+        assert os.path.exists(str(tmpdir.join('plot.png')))
+        assert client.stats()['counts']['server_frames'] == 1
+
+
+def test_unknown_command(render_server):
+    with RenderClient(render_server.address) as client:
+        with pytest.raises(ValueError):
+            client._request('explode')
+
+
+def test_socket_is_private(render_server):
+    mode = os.stat(render_server.address).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+
+
+def test_timed_out_frame_keeps_its_place(tmpdir):
+    address = str(tmpdir.join('ngl.sock'))
+    render_server = RenderServer(address, directory=str(tmpdir),
+            processes=1, max_queued=0, timeout=0.5)
+    thread = threading.Thread(target=render_server.serve_forever)
+    thread.start()
+    try:
+        with RenderClient(address) as client:
+            assert 'within' in client.render(_slow).error
+            # The worker is still rendering the frame.
+            with pytest.raises(server.ServerBusy):
+                client.render(_blank)
+            time.sleep(3.)
+            assert client.render(_blank).error is None
+    finally:
+        render_server.shutdown()
+        thread.join()
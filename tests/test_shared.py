@@ -0,0 +1,105 @@
+"""tests for the shared module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+from modification import _normalize_data
+from resources import MapResources
+import shared as shared_module
+from shared import SharedArray, SharedArrays, resolve
+
+
+@pytest.fixture
+def shared(tmpdir):
+    arrays = SharedArrays(directory=str(tmpdir))
+    yield arrays
+    arrays.close()
+
+
+def test_publish_and_attach(shared):
+    array = np.arange(12.).reshape(3, 4)
+    handle = shared.publish(array)
+    assert shared.publish(array) is handle
+    attached = handle.attach()
+    assert attached.shape == (3, 4)
+    np.testing.assert_array_equal(attached, array)
+
+
+def test_publish_masked_array(shared):
+    array = np.ma.masked_equal([1., 2., 3.], 2.)
+    attached = shared.publish(array).attach()
+    # Masked points are missing values once they are normalized for Ngl.
+    np.testing.assert_array_equal(np.isnan(attached), [False, True, False])
+    data, missing = _normalize_data(attached)
+    assert missing is not None
+    np.testing.assert_array_equal(data, [1., missing, 3.])
+
+
+def test_publish_masked_integer_array(shared):
+    array = np.ma.masked_equal([1, 2, 3], 2)
+    handle = shared.publish(array)
+    assert handle.fill_value == array.fill_value
+    attached = handle.attach()
+    assert np.ma.isMaskedArray(attached)
+    np.testing.assert_array_equal(attached.mask, [False, True, False])
+    np.testing.assert_array_equal(attached.compressed(), [1, 3])
+
+
+def test_resolve_sequences(shared):
+    array = np.arange(4.)
+    args = resolve((shared.publish(array), 'x', [shared.publish(array)]))
+    assert isinstance(args, tuple)
+    np.testing.assert_array_equal(args[0], array)
+    assert args[1] == 'x'
+    np.testing.assert_array_equal(args[2][0], array)
+
+
+def test_resolve_resources_keeps_class(shared):
+    lons = np.arange(0., 360., 90.)
+    res = MapResources()
+    res.lbOrientation = 'Vertical'
+    res.sfXArray = shared.publish(lons)
+    resolved = resolve(res)
+    assert type(resolved) is MapResources
+    assert resolved.lbOrientation == 'Vertical'
+    np.testing.assert_array_equal(resolved.sfXArray, lons)
+    # The resources passed in are not modified.
+    assert isinstance(res.sfXArray, SharedArray)
+
+
+def test_resolve_without_handles_returns_resources(shared):
+    res = MapResources()
+    assert resolve(res) is res
+
+
+def test_attached_arrays_are_bounded(shared, monkeypatch):
+    monkeypatch.setattr(shared_module, '_max_attached', 2)
+    handles = [shared.publish(np.arange(n + 1.)) for n in range(4)]
+    first = handles[0].attach()
+    for handle in handles[1:]:
+        handle.attach()
+    assert len(shared_module._attached) == 2
+    # Recently used arrays are kept, others are attached again.
+    assert handles[3].attach() is handles[3].attach()
+    np.testing.assert_array_equal(handles[0].attach(), first)
+    assert list(shared_module._attached) == [handles[3].filename,
+            handles[0].filename]
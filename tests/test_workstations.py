@@ -0,0 +1,121 @@
+"""tests for the workstations module"""
+# (c) Copyright 2012 Andrew Dawson. All Rights Reserved.
+#
+# This file is part of nglextras.
+#
+# nglextras is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# nglextras is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with nglextras.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import pytest
+
+Ngl = pytest.importorskip('Ngl')
+
+from workstations import WorkstationPool
+
+
+class _Workstation(object):
+    """Stands in for an Ngl workstation, drawing frames writes files."""
+
+    def __init__(self, wks_type, basename):
+        self.wks_type = wks_type
+        self.basename = basename
+        self.frames = 0
+
+    def draw_frame(self):
+        self.frames += 1
+        with open('%s.%06d.%s' % (self.basename, self.frames,
+                self.wks_type), 'w') as output:
+            output.write('frame')
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    opened = []
+
+    def open_wks(wks_type, basename, res=None):
+        wks = _Workstation(wks_type, basename)
+        opened.append(wks)
+        return wks
+
+    def clear_workstation(wks):
+        wks.frames = 0
+
+    monkeypatch.setattr(Ngl, 'open_wks', open_wks)
+    monkeypatch.setattr(Ngl, 'clear_workstation', clear_workstation)
+    monkeypatch.setattr(Ngl, 'delete_wks', lambda wks: None)
+    monkeypatch.setattr(Ngl, 'set_values', lambda wks, res: None)
+    return opened
+
+
+@pytest.fixture
+def pool(tmpdir):
+    pool = WorkstationPool(max_open=2, directory=str(tmpdir))
+    yield pool
+    pool.close()
+
+
+def test_output_is_moved_to_target(opened, pool, tmpdir):
+    target = str(tmpdir.join('plot'))
+    with pool.workstation(target) as wks:
+        wks.draw_frame()
+    assert os.path.exists(target + '.png')
+
+
+def test_frames_are_numbered(opened, pool, tmpdir):
+    target = str(tmpdir.join('plot'))
+    with pool.workstation(target) as wks:
+        wks.draw_frame()
+        wks.draw_frame()
+    assert os.path.exists(target + '.000001.png')
+    assert os.path.exists(target + '.000002.png')
+
+
+def test_workstation_is_reused(opened, pool, tmpdir):
+    for name in ('a', 'b', 'c'):
+        with pool.workstation(str(tmpdir.join(name))) as wks:
+            wks.draw_frame()
+    assert len(opened) == 1
+    assert len(pool) == 1
+
+
+def test_no_output_raises(opened, pool, tmpdir):
+    with pytest.raises(IOError):
+        with pool.workstation(str(tmpdir.join('empty'))):
+            pass
+    # The workstation is returned to the pool and can be used again.
+    with pool.workstation(str(tmpdir.join('plot'))) as wks:
+        wks.draw_frame()
+    assert len(opened) == 1
+    assert os.path.exists(str(tmpdir.join('plot.png')))
+
+
+def test_error_discards_workstation(opened, pool, tmpdir):
+    with pytest.raises(ValueError):
+        with pool.workstation(str(tmpdir.join('plot'))) as wks:
+            wks.draw_frame()
+            raise ValueError('drawing failed')
+    assert len(pool) == 0
+    assert not os.path.exists(str(tmpdir.join('plot.png')))
+
+
+def test_least_recently_used_is_closed(opened, pool, tmpdir):
+    res = Ngl.Resources()
+    for width in (500, 600, 700):
+        res.wkWidth = width
+        with pool.workstation(str(tmpdir.join('w%d' % width)), res=res) as wks:
+            wks.draw_frame()
+    assert len(opened) == 3
+    assert len(pool) == 2